@@ -0,0 +1,92 @@
+"""
+Đo độ trễ mỗi lần tương tác của trang tối ưu kho hàng.
+
+So sánh cách cũ (tính lại to_datetime / Month / Quarter / Year / Revenue trên dữ liệu dùng chung
+ở mỗi lần chạy lại) với cách mới (cột lịch số nguyên tính sẵn khi nạp dữ liệu), đồng thời kiểm tra
+dữ liệu dùng chung không bị sửa sau các lần tương tác.
+
+Ví dụ:
+    python benchmarks/warehouse_latency.py --data online_retail.csv --repeat 5
+    python benchmarks/warehouse_latency.py --rows 500000   # dữ liệu giả lập khi không có file CSV
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.data_model import prepare_data  # noqa: E402
+from views.warehouse_view import inventory_optimize  # noqa: E402
+
+
+def synthetic_data(rows, n_products=4000, seed=0):
+    rng = np.random.default_rng(seed)
+    product = rng.integers(0, n_products, rows)
+    dates = pd.Timestamp("2010-12-01") + pd.to_timedelta(rng.integers(0, 373 * 24 * 60, rows), unit="m")
+    return pd.DataFrame({
+        "InvoiceNo": rng.integers(500000, 600000, rows).astype(str),
+        "StockCode": np.char.add("SKU", product.astype(str)),
+        "Description": np.char.add("PRODUCT ", product.astype(str)),
+        "Quantity": rng.poisson(6, rows) + 1,
+        "InvoiceDate": dates.strftime("%m/%d/%Y %H:%M"),
+        "UnitPrice": np.round(rng.uniform(0.5, 10, n_products)[product], 2),
+        "CustomerID": rng.integers(12000, 18000, rows).astype(float),
+        "Country": "United Kingdom",
+    })
+
+
+def legacy_recompute(df):
+    """Phần việc mà mỗi lần chạy lại trước đây làm trên dữ liệu dùng chung (ở đây làm trên bản sao)"""
+    df = df.copy()
+    df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'], errors='coerce')
+    df['Month'] = df['InvoiceDate'].dt.month
+    df['Quarter'] = df['InvoiceDate'].dt.quarter
+    df['Year'] = df['InvoiceDate'].dt.year
+    df['Revenue'] = df['Quantity'] * df['UnitPrice']
+    return df
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return np.median(samples) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo độ trễ mỗi lần tương tác của trang tối ưu kho hàng")
+    parser.add_argument("--data", default="online_retail.csv", help="File CSV giao dịch")
+    parser.add_argument("--rows", type=int, default=0, help="Dùng dữ liệu giả lập với số dòng này thay cho file CSV")
+    parser.add_argument("--repeat", type=int, default=5, help="Số lần lặp cho mỗi phép đo (lấy trung vị)")
+    args = parser.parse_args(argv)
+
+    raw = synthetic_data(args.rows) if args.rows else pd.read_csv(args.data, encoding="ISO-8859-1")
+    started = time.perf_counter()
+    df = prepare_data(raw)
+    print(f"Nạp dữ liệu (một lần): {len(df):,} dòng, {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    fingerprint = pd.util.hash_pandas_object(df, index=False).sum()
+    columns = list(df.columns)
+    params = dict(product_id=None, avg_demand=100, holding_cost=5.0, ordering_cost=100.0, lead_time=7)
+    windows = [("Tháng", 12), ("Quý", 4), ("Năm", int(df["Year"].max()))]
+
+    # Cách cũ = tính lại cột lịch trên dữ liệu dùng chung + phần tính toán của lần tương tác
+    print(f"{'Khoảng thời gian':<18}{'cũ':>12}{'mới':>12}")
+    for time_filter, value in windows:
+        legacy_ms = timed(lambda: inventory_optimize(legacy_recompute(df), time_filter, value, **params), args.repeat)
+        new_ms = timed(lambda: inventory_optimize(df, time_filter, value, **params), args.repeat)
+        print(f"{time_filter + ' ' + str(value):<18}{legacy_ms:>9.1f} ms{new_ms:>9.1f} ms")
+
+    unchanged = list(df.columns) == columns and pd.util.hash_pandas_object(df, index=False).sum() == fingerprint
+    print("Dữ liệu dùng chung không bị sửa:", "có" if unchanged else "KHÔNG")
+    return 0 if unchanged else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
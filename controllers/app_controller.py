@@ -4,6 +4,7 @@ import streamlit.components.v1 as components
 from controllers.main_controller import MainController
 from views.price_quantity_view import render_price_quantity_analysis
 from views.warehouse_view import render_warehouse_analysis
+from views.basket_view import render_basket_analysis
 
 # Global flags for optional module availability
 CAUSALIMPACT_AVAILABLE = True
@@ -78,6 +79,12 @@ def home():
                     st.session_state.modal_type = "causal_impact"
                 st.markdown("</div>", unsafe_allow_html=True)
 
+            with st.container():
+                st.markdown("<div class='model-card'><div class='model-title'>🧺 Phân tích Giỏ hàng</div>", unsafe_allow_html=True)
+                if st.button("Bắt đầu", key="basket"):
+                    st.session_state.modal_type = "basket"
+                st.markdown("</div>", unsafe_allow_html=True)
+
         with col2:
             with st.container():
                 st.markdown("<div class='model-card'><div class='model-title'>👥 Phân tích RFM</div>", unsafe_allow_html=True)
@@ -109,12 +116,14 @@ def show_modal(modal_type, df):
         "price_quantity": "💰 Phân tích Giá & Số lượng",
         "warehouse": "📦 Tối ưu Kho hàng",
         "causal_impact": "📉 Phân tích Tác động",
-        "product_forecast": "📈 Dự báo Doanh thu Sản phẩm"
+        "product_forecast": "📈 Dự báo Doanh thu Sản phẩm",
+        "basket": "🧺 Phân tích Giỏ hàng"
     }
 
     modal_func = {
         "price_quantity": render_price_quantity_analysis,
         "warehouse": render_warehouse_analysis,
+        "basket": render_basket_analysis,
     }
     
     if CAUSALIMPACT_AVAILABLE:
@@ -2,8 +2,44 @@ import streamlit as st
 import pandas as pd
 import os
 from models.rfm_model import RFMModel
+from models.lookalike_model import LookalikeIndex
+from models.clv_model import CLVModel
+from models.churn_model import ChurnModel
+from models.data_model import data_version
 from views.ui import UIView
 
+
+@st.cache_resource(show_spinner="Đang dựng chỉ mục khách hàng tương tự...", max_entries=4)
+def build_lookalike_index(_df, _rfm, dataset_version):
+    """Chỉ mục lookalike được dựng một lần cho mỗi phiên bản dữ liệu (bộ lọc + dữ liệu), dùng chung giữa các phiên"""
+    return LookalikeIndex(_df, _rfm)
+
+
+@st.cache_data(show_spinner="Đang tính ma trận cohort...", max_entries=4)
+def cohort_matrix(_df, dataset_version):
+    """Ma trận giữ chân theo cohort, tính một lần cho mỗi phiên bản dữ liệu và dùng chung giữa các phiên"""
+    return RFMModel().cohort_retention(_df)
+
+
+@st.cache_resource(show_spinner="Đang chuẩn bị mô hình nguy cơ rời bỏ...", max_entries=4)
+def load_churn_model(_df, dataset_version):
+    """
+    Mô hình rời bỏ cho mỗi phiên bản dữ liệu: đọc lại pipeline đã lưu trong file của phiên bản đó,
+    ngược lại huấn luyện và lưu lại; các lần chạy lại chỉ chấm điểm, không huấn luyện lại
+    """
+    path = ChurnModel.versioned_path(dataset_version)
+    model = ChurnModel.load(path)
+    if model is not None and model.dataset_version == dataset_version:
+        return model
+    model = ChurnModel().fit(_df, dataset_version)
+    try:
+        model.save(path)
+        ChurnModel.prune_saved()
+    except OSError:
+        # Không ghi được file thì vẫn dùng mô hình trong bộ nhớ đệm
+        pass
+    return model
+
 class MainController:
     """Controller class for application flow control"""
     
@@ -23,8 +59,23 @@ class MainController:
         # Nút phân tích dữ liệu
         analyze_button = st.button("🔍 Phân tích dữ liệu", type="primary")
         
+        config = (k, ref_date, country)
         if analyze_button:
             self.analyze_data(k, ref_date, country, revenue_target)
+        elif st.session_state.get("rfm_result", {}).get("config") == config:
+            # Hiển thị lại kết quả đã lưu, không tính lại phân cụm và dự báo
+            self.show_result(st.session_state.rfm_result, revenue_target)
+    
+    def show_result(self, result, revenue_target):
+        """
+        Hiển thị kết quả phân tích đã lưu trong session state
+        """
+        st.markdown("---")
+        st.subheader("📈 Kết quả phân tích")
+        self.view.analysis_page(result["clustered"], result["summary"], revenue_target,
+                                result["latest_date"], result["monthly_revenue"], result["cluster_forecast"])
+        self.view.cohort_page(result.get("cohorts"))
+        self.view.lookalike_page(result.get("lookalike"), result["clustered"])
     
     def analyze_data(self, k, ref_date, country, revenue_target):
         """
@@ -60,13 +111,53 @@ class MainController:
                         st.error("❌ Không thể phân cụm khách hàng. Vui lòng kiểm tra lại dữ liệu.")
                         return
                     
+                    # CLV dự báo 12 tháng của từng khách hàng (BG/NBD + Gamma-Gamma)
+                    try:
+                        clv = CLVModel().fit_predict(df, observation_end=df['InvoiceDate'].max())
+                        clustered = clustered.merge(clv[['CustomerID', 'P_Alive', 'CLV']], on='CustomerID', how='left')
+                    except ValueError as e:
+                        st.warning(f"⚠️ Không ước lượng được CLV theo mô hình xác suất, dùng CLV đơn giản hóa: {e}")
+                    
+                    # Phiên bản theo nội dung dữ liệu đã lọc (quốc gia, ngày tham chiếu đã nằm trong dữ liệu)
+                    dataset_version = data_version(df)
+                    
+                    # Nguy cơ rời bỏ của từng khách hàng (mô hình đã khớp được lưu lại, chỉ chấm điểm)
+                    try:
+                        churn = load_churn_model(df, dataset_version).score(df)
+                        clustered = clustered.merge(churn, on='CustomerID', how='left')
+                    except ValueError as e:
+                        st.warning(f"⚠️ Không tính được nguy cơ rời bỏ: {e}")
+                    
                     summary = self.model.cluster_summary(clustered)
                     
                     # Calculate monthly revenue for each cluster
                     monthly_revenue = self.model.calculate_monthly_revenue(df, clustered)
                     
-                    # Pass revenue_target, latest_date and monthly_revenue to the view
-                    self.view.analysis_page(clustered, summary, revenue_target, latest_date, monthly_revenue)
+                    # Dự báo 3 tháng cho tất cả các cụm trong một lần khớp
+                    cluster_forecast = self.model.forecast_monthly_revenue(monthly_revenue, periods=3)
+                    
+                    # Ma trận giữ chân theo cohort (một lần groupby), lưu cùng kết quả phân tích
+                    cohorts = cohort_matrix(df, dataset_version)
+                    
+                    # Chỉ mục tìm khách hàng tương tự theo RFM + cơ cấu sản phẩm
+                    lookalike = build_lookalike_index(df, rfm, dataset_version)
+                    
+                    # Lưu kết quả cùng cấu hình để các lần chạy lại không phải tính lại
+                    st.session_state.rfm_result = {
+                        "config": (k, ref_date, country),
+                        "clustered": clustered,
+                        "summary": summary,
+                        "latest_date": latest_date,
+                        "monthly_revenue": monthly_revenue,
+                        "cluster_forecast": cluster_forecast,
+                        "lookalike": lookalike,
+                        "cohorts": cohorts,
+                    }
+                    
+                    # Pass revenue_target, latest_date, monthly_revenue and forecasts to the view
+                    self.view.analysis_page(clustered, summary, revenue_target, latest_date, monthly_revenue, cluster_forecast)
+                    self.view.cohort_page(cohorts)
+                    self.view.lookalike_page(lookalike, clustered)
                     
                 except Exception as e:
                     st.error(f"❌ Lỗi khi xử lý dữ liệu: {str(e)}")
@@ -1,11 +1,14 @@
 from models.revenue_forecast_model import RevenueForecastModel
+from models.forecast_store import ForecastStore
 import pandas as pd
 
 class RevenueForecastController:
-    def __init__(self, df):
+    def __init__(self, df, store=None):
         self.df = df
         self.model = RevenueForecastModel(df)
         self.model.process_data()
+        # Controller được cache và dùng chung giữa các phiên: không lưu trạng thái của từng yêu cầu
+        self.store = store if store is not None else ForecastStore()
 
     def load_data(self, file):
         df = pd.read_csv(file, encoding="ISO-8859-1")
@@ -13,7 +16,47 @@ class RevenueForecastController:
         self.model.process_data()
 
     def get_forecast(self, stock_code, country, forecast_months):
+        # Trả về (dự báo, lịch sử, nguồn) với nguồn là "store" (kho dự báo) hoặc "live" (khớp trực tiếp)
         if self.model:
-            return self.model.forecast(stock_code, country, forecast_months)
+            stored = self.get_stored_forecast(stock_code, country, forecast_months)
+            if stored is not None:
+                return (*stored, "store")
+            return (*self.model.forecast(stock_code, country, forecast_months), "live")
         else:
+            return None, None, None
+
+    def get_stored_forecast(self, stock_code, country, forecast_months):
+        # Chỉ dùng kho khi dự báo của chuỗi còn khớp với dữ liệu hiện tại
+        if not self.store.exists():
+            return None
+        cube = self.model.monthly_cube()
+        row = cube.row_index(stock_code, country)
+        if row is None:
+            return None
+        forecast = self.store.lookup(stock_code, country, cube.series_hashes()[row], cube.months[-1], forecast_months)
+        if forecast is None:
+            return None
+        return forecast[["ds", "yhat", "delta", "pct_change"]].reset_index(drop=True), self.model.series_history(row)
+
+    def scan_alerts(self, forecast_months, threshold):
+        # Trả về (bảng cảnh báo, nguồn dự báo "store" hoặc "live")
+        if not self.model:
             return None, None
+        # Dùng kho dự báo nếu khớp phiên bản dữ liệu hiện tại, nếu không thì dự báo hàng loạt
+        forecasts = None
+        manifest = self.store.manifest() if self.store.exists() else None
+        if manifest and manifest.get("dataset_version") == self.model.monthly_cube().version():
+            stored = self.store.load()
+            if manifest.get("periods", 0) >= forecast_months:
+                forecasts = stored[stored.groupby(["StockCode", "Country"]).cumcount() < forecast_months]
+        source = "store"
+        if forecasts is None:
+            source = "live"
+            forecasts, _ = self.model.forecast_all(forecast_months)
+        return self.model.scan_alerts(forecasts, threshold), source
+
+    def get_hierarchy_forecast(self, forecast_months, method="mint"):
+        if self.model:
+            return self.model.forecast_hierarchy(forecast_months, method)
+        else:
+            return None
@@ -0,0 +1,219 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from models.data_model import build_product_catalog
+
+# Số byte ước tính cho một phần tử khác 0 của ma trận thưa (giá trị + chỉ số + chi phí khung)
+BYTES_PER_ENTRY = 16
+
+
+def invoice_item_matrix(df, product_ids):
+    """
+    Ma trận nhị phân CSR (số hóa đơn x số sản phẩm): 1 nếu sản phẩm có trong hóa đơn
+
+    Parameters:
+    -----------
+    df : DataFrame
+        Giao dịch có cột InvoiceNo
+    product_ids : ndarray
+        Chỉ số sản phẩm (0..số sản phẩm-1) của từng dòng giao dịch
+
+    Returns:
+    --------
+    tuple: (ma trận CSR, các mã hóa đơn theo thứ tự dòng)
+    """
+    invoice_ids, invoices = pd.factorize(df["InvoiceNo"])
+    n_items = int(product_ids.max()) + 1 if len(product_ids) else 0
+    matrix = sparse.csr_matrix(
+        (np.ones(len(invoice_ids), dtype=np.int32), (invoice_ids, product_ids)),
+        shape=(len(invoices), n_items),
+    )
+    # Một sản phẩm xuất hiện nhiều dòng trong cùng hóa đơn vẫn chỉ tính một lần
+    matrix.data[:] = 1
+    return matrix, invoices
+
+
+def triple_chunks(pairs, basket, max_entries):
+    """
+    Chia các cột của ma trận cặp P thành khối để nhân P' B trong giới hạn bộ nhớ
+
+    Cận trên số phần tử của cột k trong P' B (tính trước khi nhân) là tổng số sản phẩm của các
+    hóa đơn chứa cặp k, không vượt quá số cột của B.
+
+    Parameters:
+    -----------
+    pairs : sparse matrix (CSC)
+        Ma trận chỉ báo (số hóa đơn x số cặp)
+    basket : sparse matrix
+        Ma trận hóa đơn x sản phẩm
+    max_entries : float
+        Số phần tử tối đa của mỗi khối kết quả
+
+    Returns:
+    --------
+    tuple: (ndarray cận trên theo từng cột, list các khoảng cột (start, end)); một cột có cận trên
+    vượt max_entries vẫn là một khối riêng, nơi gọi tự kiểm tra bound.max()
+    """
+    n_pairs = pairs.shape[1]
+    basket_sizes = np.diff(basket.tocsr().indptr)
+    pair_columns = np.repeat(np.arange(n_pairs), np.diff(pairs.indptr))
+    bound = np.minimum(
+        np.bincount(pair_columns, weights=basket_sizes[pairs.indices], minlength=n_pairs),
+        basket.shape[1],
+    )
+    cumulative = np.cumsum(bound)
+    chunks = []
+    start = 0
+    while start < n_pairs:
+        offset = cumulative[start - 1] if start else 0
+        end = max(int(np.searchsorted(cumulative, offset + max_entries, side="right")), start + 1)
+        chunks.append((start, end))
+        start = end
+    return bound, chunks
+
+
+class BasketModel:
+    """
+    Phân tích giỏ hàng: tập sản phẩm thường mua cùng nhau và luật kết hợp
+
+    Ma trận hóa đơn x sản phẩm được dựng một lần. Độ hỗ trợ của cặp là tích ma trận thưa B' B;
+    độ hỗ trợ của bộ ba được đếm bằng tích giữa ma trận chỉ báo các cặp phổ biến và B
+    (nguyên lý Apriori: chỉ mở rộng từ sản phẩm / cặp đã phổ biến).
+    """
+
+    def __init__(self, df):
+        df = df.dropna(subset=["InvoiceNo", "StockCode"])
+        # Bỏ hóa đơn hủy (mã bắt đầu bằng C) nếu dữ liệu chưa được làm sạch
+        df = df[~df["InvoiceNo"].astype(str).str.startswith("C")]
+        if df.empty:
+            raise ValueError("Không có hóa đơn hợp lệ để phân tích giỏ hàng")
+        self.catalog = build_product_catalog(df)
+        product_ids = pd.Index(self.catalog["StockCode"]).get_indexer(df["StockCode"])
+        self.matrix, self.invoices = invoice_item_matrix(df, product_ids)
+        self.matrix = self.matrix.tocsc()
+
+    @property
+    def n_invoices(self):
+        return self.matrix.shape[0]
+
+    def frequent_itemsets(self, min_support=0.01, max_size=3, max_memory_mb=256):
+        """
+        Các tập sản phẩm (1 đến max_size sản phẩm) có độ hỗ trợ >= min_support
+
+        Parameters:
+        -----------
+        min_support : float
+            Tỷ lệ hóa đơn tối thiểu chứa tập sản phẩm
+        max_size : int
+            Số sản phẩm tối đa của một tập (1, 2 hoặc 3)
+        max_memory_mb : float
+            Giới hạn bộ nhớ cho các ma trận đếm trung gian
+
+        Returns:
+        --------
+        DataFrame: items (tuple ProductID tăng dần), size, count, support
+        """
+        if not 0 < min_support <= 1:
+            raise ValueError("Độ hỗ trợ tối thiểu phải nằm trong khoảng (0, 1]")
+        if max_size not in (1, 2, 3):
+            raise ValueError("Số sản phẩm tối đa của một tập phải là 1, 2 hoặc 3")
+
+        budget = max_memory_mb * 1024 ** 2
+        min_count = max(int(np.ceil(min_support * self.n_invoices)), 1)
+
+        def check_memory(nnz, stage):
+            if nnz * BYTES_PER_ENTRY > budget:
+                raise ValueError(
+                    f"Vượt giới hạn bộ nhớ {max_memory_mb} MB khi đếm {stage}; hãy tăng độ hỗ trợ tối thiểu"
+                )
+
+        counts = np.asarray(self.matrix.sum(axis=0)).ravel()
+        frequent = np.flatnonzero(counts >= min_count)
+        itemsets = [pd.DataFrame({"items": [(int(i),) for i in frequent], "size": 1, "count": counts[frequent]})]
+
+        if max_size >= 2 and len(frequent) > 1:
+            basket = self.matrix[:, frequent]
+            # Số phần tử của B' B không vượt quá số cặp sản phẩm phổ biến
+            check_memory(min(len(frequent) ** 2 // 2, basket.nnz * len(frequent)), "cặp sản phẩm")
+            co = sparse.triu(basket.T @ basket, k=1).tocoo()
+            keep = co.data >= min_count
+            pair_a, pair_b, pair_count = co.row[keep], co.col[keep], co.data[keep]
+            itemsets.append(pd.DataFrame({
+                "items": list(zip(frequent[pair_a].tolist(), frequent[pair_b].tolist())),
+                "size": 2,
+                "count": pair_count,
+            }))
+
+            if max_size >= 3 and len(pair_a):
+                # Cột thứ k của P đánh dấu các hóa đơn chứa cặp phổ biến thứ k
+                pairs = basket[:, pair_a].multiply(basket[:, pair_b]).tocsc()
+                check_memory(pairs.nnz, "bộ ba sản phẩm")
+                bound, chunks = triple_chunks(pairs, basket, budget / BYTES_PER_ENTRY)
+                check_memory(bound.max(), "bộ ba sản phẩm")
+                rows, third, triple_count = [], [], []
+                for start, end in chunks:
+                    triple = (pairs[:, start:end].T @ basket).tocoo()
+                    chunk_rows = triple.row + start
+                    # Mỗi bộ ba a < b < c chỉ được đếm một lần: sản phẩm thứ ba phải đứng sau b
+                    keep = (triple.data >= min_count) & (triple.col > pair_b[chunk_rows])
+                    rows.append(chunk_rows[keep])
+                    third.append(triple.col[keep])
+                    triple_count.append(triple.data[keep])
+                rows, third = np.concatenate(rows), np.concatenate(third)
+                itemsets.append(pd.DataFrame({
+                    "items": list(zip(frequent[pair_a[rows]].tolist(), frequent[pair_b[rows]].tolist(),
+                                      frequent[third].tolist())),
+                    "size": 3,
+                    "count": np.concatenate(triple_count),
+                }))
+
+        result = pd.concat(itemsets, ignore_index=True)
+        result["count"] = result["count"].astype(np.int64)
+        result["support"] = result["count"] / self.n_invoices
+        return result.sort_values(["size", "support"], ascending=[True, False]).reset_index(drop=True)
+
+    def association_rules(self, min_support=0.01, min_confidence=0.2, min_lift=1.0, max_size=3, max_memory_mb=256):
+        """
+        Luật kết hợp {tiền đề} -> {một sản phẩm hệ quả} từ các tập sản phẩm phổ biến
+
+        Returns:
+        --------
+        DataFrame: antecedent, consequent (tuple ProductID), Antecedent, Consequent (mô tả),
+        support, confidence, lift, count; sắp xếp theo lift giảm dần
+        """
+        itemsets = self.frequent_itemsets(min_support, max(max_size, 2), max_memory_mb)
+        support = dict(zip(itemsets["items"], itemsets["support"]))
+
+        # Mỗi tập k sản phẩm sinh k luật, mỗi luật lấy một sản phẩm làm hệ quả
+        candidates = itemsets[itemsets["size"] >= 2]
+        antecedents, consequents, rule_support, counts = [], [], [], []
+        for items, items_support, count in zip(candidates["items"], candidates["support"], candidates["count"]):
+            for k, consequent in enumerate(items):
+                antecedents.append(items[:k] + items[k + 1:])
+                consequents.append((consequent,))
+                rule_support.append(items_support)
+                counts.append(count)
+
+        rules = pd.DataFrame({
+            "antecedent": antecedents,
+            "consequent": consequents,
+            "support": np.asarray(rule_support, dtype=float),
+            "count": np.asarray(counts, dtype=np.int64),
+        })
+        columns = ["antecedent", "consequent", "Antecedent", "Consequent", "support", "confidence", "lift", "count"]
+        if rules.empty:
+            return pd.DataFrame(columns=columns)
+
+        antecedent_support = np.array([support[items] for items in rules["antecedent"]])
+        consequent_support = np.array([support[items] for items in rules["consequent"]])
+        rules["confidence"] = rules["support"] / antecedent_support
+        rules["lift"] = rules["confidence"] / consequent_support
+        rules = rules[(rules["confidence"] >= min_confidence) & (rules["lift"] >= min_lift)]
+
+        labels = self.catalog["Description"].to_numpy()
+        rules = rules.assign(
+            Antecedent=[" + ".join(labels[list(items)]) for items in rules["antecedent"]],
+            Consequent=[labels[items[0]] for items in rules["consequent"]],
+        )
+        return rules.sort_values(["lift", "confidence"], ascending=False).reset_index(drop=True)[columns]
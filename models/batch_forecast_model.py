@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+from statistics import NormalDist
+
+
+class BatchForecastModel:
+    """
+    Dự báo hàng loạt bằng san bằng mũ Holt (xu hướng tắt dần), vector hóa trên toàn bộ chuỗi
+
+    Mọi chuỗi được khớp cùng lúc: vòng lặp chỉ chạy theo thời gian (vài chục tháng),
+    còn các phép tính trên chuỗi và trên lưới tham số đều là phép toán mảng.
+    """
+
+    ALPHAS = (0.1, 0.3, 0.5, 0.7, 0.9)
+    BETAS = (0.01, 0.1, 0.2, 0.3)
+    PHIS = (0.8, 0.9, 0.98)
+    STATE_COLUMNS = ("level", "trend", "alpha", "beta", "phi", "sse", "n_obs")
+
+    def __init__(self):
+        self.level = None
+        self.trend = None
+        self.alpha = None
+        self.beta = None
+        self.phi = None
+        self.sse = None
+        self.n_obs = None
+
+    @property
+    def sigma2(self):
+        return self.sse / np.maximum(self.n_obs, 1)
+
+    def fit(self, y):
+        """
+        Khớp mô hình cho ma trận chuỗi thời gian
+
+        Parameters:
+        -----------
+        y : ndarray
+            Ma trận (số chuỗi x số tháng)
+
+        Returns:
+        --------
+        BatchForecastModel: Chính mô hình đã khớp
+        """
+        y = np.asarray(y, dtype=float)
+        if y.ndim != 2 or y.shape[1] < 2:
+            raise ValueError("Cần ma trận chuỗi có ít nhất 2 tháng dữ liệu")
+
+        # Lưới tham số có dạng (số tổ hợp, 1) để broadcast với (1, số chuỗi)
+        grid = np.array(np.meshgrid(self.ALPHAS, self.BETAS, self.PHIS, indexing="ij")).reshape(3, -1)
+        alpha, beta, phi = (g[:, None] for g in grid)
+
+        level = np.broadcast_to(y[:, 0], (len(alpha), y.shape[0])).copy()
+        trend = np.broadcast_to(y[:, 1] - y[:, 0], level.shape).copy()
+        sse = np.zeros(level.shape)
+
+        for t in range(1, y.shape[1]):
+            level, trend, err = self._step(level, trend, y[:, t], alpha, beta, phi)
+            sse += err ** 2
+
+        # Chọn bộ tham số có SSE nhỏ nhất cho từng chuỗi
+        best = np.argmin(sse, axis=0)
+        cols = np.arange(y.shape[0])
+        self.level = level[best, cols]
+        self.trend = trend[best, cols]
+        self.alpha = alpha[best, 0]
+        self.beta = beta[best, 0]
+        self.phi = phi[best, 0]
+        self.sse = sse[best, cols]
+        self.n_obs = np.full(y.shape[0], y.shape[1] - 1)
+        return self
+
+    def update(self, y_new):
+        """
+        Khởi động ấm: tiếp tục đệ quy Holt với các tháng mới, giữ nguyên tham số đã khớp
+
+        Parameters:
+        -----------
+        y_new : ndarray
+            Ma trận (số chuỗi x số tháng mới), theo cùng thứ tự chuỗi với trạng thái hiện tại
+
+        Returns:
+        --------
+        BatchForecastModel: Chính mô hình đã cập nhật
+        """
+        if self.level is None:
+            raise ValueError("Mô hình chưa được khớp")
+
+        y_new = np.asarray(y_new, dtype=float)
+        for t in range(y_new.shape[1]):
+            self.level, self.trend, err = self._step(self.level, self.trend, y_new[:, t], self.alpha, self.beta, self.phi)
+            self.sse = self.sse + err ** 2
+            self.n_obs = self.n_obs + 1
+        return self
+
+    def to_frame(self):
+        """Trạng thái đã khớp của từng chuỗi dưới dạng DataFrame để lưu trữ"""
+        return pd.DataFrame({col: getattr(self, col) for col in self.STATE_COLUMNS})
+
+    @classmethod
+    def from_frame(cls, state):
+        """Khôi phục mô hình từ trạng thái đã lưu bằng to_frame"""
+        model = cls()
+        for col in cls.STATE_COLUMNS:
+            setattr(model, col, state[col].to_numpy(dtype=float))
+        return model
+
+    @staticmethod
+    def _step(level, trend, y_t, alpha, beta, phi):
+        """Một bước cập nhật Holt ở dạng hiệu chỉnh sai số"""
+        pred = level + phi * trend
+        err = y_t - pred
+        new_level = pred + alpha * err
+        new_trend = phi * trend + alpha * beta * err
+        return new_level, new_trend, err
+
+    def forecast(self, periods, interval=0.95):
+        """
+        Dự báo cho tất cả các chuỗi
+
+        Parameters:
+        -----------
+        periods : int
+            Số tháng cần dự báo
+        interval : float
+            Mức tin cậy của khoảng dự báo
+
+        Returns:
+        --------
+        tuple: (yhat, lower, upper), mỗi phần tử là ma trận (số chuỗi x periods)
+        """
+        if self.level is None:
+            raise ValueError("Mô hình chưa được khớp")
+
+        h = np.arange(1, periods + 1)
+        phi = self.phi[:, None]
+        # Tổng phi + phi^2 + ... + phi^h cho từng bước dự báo
+        damp = np.cumsum(phi ** h, axis=1)
+        yhat = self.level[:, None] + damp * self.trend[:, None]
+
+        # Phương sai dự báo h bước của Holt tắt dần
+        alpha = self.alpha[:, None]
+        beta = self.beta[:, None]
+        j = h[:-1]
+        c = alpha + alpha * beta * phi * (1 - phi ** j) / (1 - phi)
+        var_factor = 1 + np.concatenate([np.zeros((len(yhat), 1)), np.cumsum(c ** 2, axis=1)], axis=1)
+        std = np.sqrt(self.sigma2[:, None] * var_factor)
+
+        z = NormalDist().inv_cdf(0.5 + interval / 2)
+        return yhat, yhat - z * std, yhat + z * std
@@ -0,0 +1,255 @@
+import glob
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.metrics import roc_auc_score
+from sklearn.pipeline import Pipeline
+
+
+class ChurnModel:
+    """
+    Mô hình nguy cơ rời bỏ: xác suất khách hàng không mua thêm trong horizon_days ngày tới
+
+    Dữ liệu huấn luyện là các ảnh chụp RFM trong quá khứ: tại mỗi mốc cắt, đặc trưng được tính
+    từ giao dịch trước mốc và nhãn là "không có giao dịch trong horizon_days ngày sau mốc".
+    Pipeline đã khớp được lưu bằng joblib để dùng lại mà không huấn luyện lại.
+    """
+
+    DEFAULT_PATH = os.environ.get("CHURN_MODEL_PATH", "churn_model.joblib")
+    # Số file mô hình theo phiên bản dữ liệu được giữ lại trên đĩa
+    MAX_SAVED_MODELS = 8
+    FEATURES = ['Recency', 'Frequency', 'Monetary', 'Tenure', 'Avg_Order_Value', 'Avg_Gap',
+                'Overdue_Ratio', 'Recent_Frequency', 'Recent_Monetary']
+
+    def __init__(self, horizon_days=90, n_snapshots=6, snapshot_step_days=30, random_state=42):
+        """
+        Parameters:
+        -----------
+        horizon_days : int
+            Số ngày không mua hàng để coi là rời bỏ (cũng là cửa sổ đặc trưng "gần đây")
+        n_snapshots : int
+            Số mốc cắt lịch sử dùng để huấn luyện
+        snapshot_step_days : int
+            Khoảng cách giữa hai mốc cắt liên tiếp
+        """
+        self.horizon_days = horizon_days
+        self.n_snapshots = n_snapshots
+        self.snapshot_step_days = snapshot_step_days
+        self.random_state = random_state
+        self.pipeline = None
+        self.metrics = {}
+        self.dataset_version = None
+
+    @staticmethod
+    def invoices(df):
+        """
+        Gộp giao dịch thành hóa đơn (một lần groupby); các ảnh chụp chỉ lọc trên bảng này
+
+        Returns:
+        --------
+        DataFrame: CustomerID, Day (số ngày kể từ 1970-01-01), Revenue
+        """
+        dates = pd.to_datetime(df['InvoiceDate'], errors='coerce')
+        valid = dates.notna() & df['CustomerID'].notna()
+        frame = pd.DataFrame({
+            'CustomerID': df.loc[valid, 'CustomerID'].to_numpy(),
+            'InvoiceNo': df.loc[valid, 'InvoiceNo'].to_numpy(),
+            'Day': (dates[valid].dt.normalize() - pd.Timestamp(0)).dt.days.to_numpy(),
+            'Revenue': df.loc[valid, 'Revenue'].to_numpy(dtype=float),
+        })
+        return (
+            frame.groupby(['CustomerID', 'InvoiceNo'], sort=False)
+            .agg(Day=('Day', 'min'), Revenue=('Revenue', 'sum'))
+            .reset_index()
+            .drop(columns='InvoiceNo')
+        )
+
+    def snapshot_features(self, invoices, cutoff_day):
+        """
+        Đặc trưng RFM mở rộng của mọi khách hàng có hóa đơn trước mốc cắt
+
+        Parameters:
+        -----------
+        invoices : DataFrame
+            Kết quả invoices()
+        cutoff_day : int
+            Mốc cắt (số ngày kể từ 1970-01-01); chỉ dùng hóa đơn có Day < cutoff_day
+
+        Returns:
+        --------
+        DataFrame: đặc trưng theo FEATURES, chỉ mục CustomerID
+        """
+        history = invoices[invoices['Day'] < cutoff_day]
+        recent = history['Day'] >= cutoff_day - self.horizon_days
+        stats = history.assign(
+            Recent=recent.astype(np.int64),
+            Recent_Revenue=np.where(recent, history['Revenue'], 0.0),
+        ).groupby('CustomerID').agg(
+            First=('Day', 'min'), Last=('Day', 'max'), Frequency=('Day', 'size'),
+            Monetary=('Revenue', 'sum'), Recent_Frequency=('Recent', 'sum'),
+            Recent_Monetary=('Recent_Revenue', 'sum'),
+        )
+
+        features = pd.DataFrame(index=stats.index)
+        features['Recency'] = cutoff_day - stats['Last']
+        features['Frequency'] = stats['Frequency']
+        features['Monetary'] = stats['Monetary']
+        features['Tenure'] = cutoff_day - stats['First']
+        features['Avg_Order_Value'] = stats['Monetary'] / stats['Frequency']
+        # Khoảng cách trung bình giữa hai lần mua; khách mua một lần để trống (mô hình xử lý được NaN)
+        features['Avg_Gap'] = ((stats['Last'] - stats['First']) / (stats['Frequency'] - 1)).where(stats['Frequency'] > 1)
+        features['Overdue_Ratio'] = features['Recency'] / features['Avg_Gap'].where(features['Avg_Gap'] > 0)
+        features['Recent_Frequency'] = stats['Recent_Frequency']
+        features['Recent_Monetary'] = stats['Recent_Monetary']
+        return features[self.FEATURES].astype(float)
+
+    def training_set(self, invoices):
+        """
+        Ghép các ảnh chụp lịch sử thành tập huấn luyện
+
+        Mốc cắt gần nhất cách ngày cuối của dữ liệu đúng horizon_days ngày để nhãn được quan sát đầy đủ.
+
+        Returns:
+        --------
+        tuple: (DataFrame đặc trưng, ndarray nhãn 0/1, ndarray chỉ số ảnh chụp - 0 là mốc gần nhất)
+        """
+        end_day = int(invoices['Day'].max()) + 1
+        first_day = int(invoices['Day'].min())
+        frames, labels, snapshot = [], [], []
+        for i in range(self.n_snapshots):
+            cutoff = end_day - self.horizon_days - i * self.snapshot_step_days
+            if cutoff <= first_day:
+                break
+            features = self.snapshot_features(invoices, cutoff)
+            window = invoices[(invoices['Day'] >= cutoff) & (invoices['Day'] < cutoff + self.horizon_days)]
+            frames.append(features)
+            labels.append((~features.index.isin(window['CustomerID'].unique())).astype(np.int8))
+            snapshot.append(np.full(len(features), i))
+
+        if not frames:
+            raise ValueError(f"Dữ liệu ngắn hơn {self.horizon_days} ngày, không đủ để tạo nhãn rời bỏ")
+        return pd.concat(frames), np.concatenate(labels), np.concatenate(snapshot)
+
+    def _new_pipeline(self):
+        return Pipeline([
+            ('model', HistGradientBoostingClassifier(
+                learning_rate=0.1, max_iter=200, max_leaf_nodes=31, early_stopping=True,
+                validation_fraction=0.1, random_state=self.random_state,
+            )),
+        ])
+
+    def fit(self, df, dataset_version=None):
+        """
+        Huấn luyện pipeline gradient boosting trên các ảnh chụp RFM lịch sử
+
+        Ảnh chụp gần nhất được giữ lại để đánh giá (AUC theo thời gian) trước khi khớp lại trên
+        toàn bộ ảnh chụp. Mô hình đánh giá chỉ học từ các ảnh chụp có cửa sổ nhãn kết thúc trước mốc
+        cắt của ảnh chụp giữ lại (i * snapshot_step_days >= horizon_days), tránh rò rỉ thông tin
+        từ giai đoạn đánh giá.
+
+        Parameters:
+        -----------
+        df : DataFrame
+            Giao dịch đã tiền xử lý (CustomerID, InvoiceNo, InvoiceDate, Revenue)
+        dataset_version : hashable, optional
+            Phiên bản bộ dữ liệu, lưu kèm mô hình để biết khi nào cần huấn luyện lại
+        """
+        X, y, snapshot = self.training_set(self.invoices(df))
+        if len(np.unique(y)) < 2:
+            raise ValueError("Nhãn rời bỏ chỉ có một lớp, không thể huấn luyện mô hình")
+
+        self.metrics = {'n_samples': int(len(y)), 'churn_rate': float(y.mean()),
+                        'n_snapshots': int(snapshot.max()) + 1}
+        holdout = snapshot == 0
+        # Nhãn của ảnh chụp i quan sát đến cutoff_i + horizon_days, phải không vượt quá mốc cắt giữ lại
+        train = snapshot * self.snapshot_step_days >= self.horizon_days
+        if train.any() and len(np.unique(y[train])) == 2 and len(np.unique(y[holdout])) == 2:
+            pipeline = self._new_pipeline().fit(X[train], y[train])
+            self.metrics['holdout_auc'] = float(roc_auc_score(y[holdout], pipeline.predict_proba(X[holdout])[:, 1]))
+
+        self.pipeline = self._new_pipeline().fit(X, y)
+        self.dataset_version = dataset_version
+        return self
+
+    def score(self, df, cutoff=None, batch_size=100000):
+        """
+        Xác suất rời bỏ của mọi khách hàng, tính theo khối
+
+        Parameters:
+        -----------
+        df : DataFrame
+            Giao dịch đã tiền xử lý
+        cutoff : datetime, optional
+            Thời điểm chấm điểm; mặc định là ngày sau giao dịch cuối cùng
+        batch_size : int
+            Số khách hàng mỗi khối khi dự đoán
+
+        Returns:
+        --------
+        DataFrame: CustomerID, Churn_Risk (0-1)
+        """
+        if self.pipeline is None:
+            raise ValueError("Mô hình rời bỏ chưa được huấn luyện")
+
+        invoices = self.invoices(df)
+        if cutoff is None:
+            cutoff_day = int(invoices['Day'].max()) + 1
+        else:
+            cutoff_day = (pd.to_datetime(cutoff).normalize() - pd.Timestamp(0)).days + 1
+        features = self.snapshot_features(invoices, cutoff_day)
+
+        risk = np.empty(len(features))
+        for start in range(0, len(features), batch_size):
+            risk[start:start + batch_size] = self.pipeline.predict_proba(features.iloc[start:start + batch_size])[:, 1]
+        return pd.DataFrame({'CustomerID': features.index, 'Churn_Risk': risk})
+
+    def save(self, path=None):
+        """Lưu pipeline đã khớp cùng cấu hình và phiên bản dữ liệu (ghi file tạm rồi thay thế)"""
+        path = path or self.DEFAULT_PATH
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        joblib.dump({
+            'pipeline': self.pipeline,
+            'features': self.FEATURES,
+            'horizon_days': self.horizon_days,
+            'n_snapshots': self.n_snapshots,
+            'snapshot_step_days': self.snapshot_step_days,
+            'metrics': self.metrics,
+            'dataset_version': self.dataset_version,
+        }, path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def versioned_path(cls, dataset_version, path=None):
+        """File riêng của một phiên bản dữ liệu (churn_model-<phiên bản>.joblib), để các bộ lọc không ghi đè nhau"""
+        root, ext = os.path.splitext(path or cls.DEFAULT_PATH)
+        return f"{root}-{dataset_version}{ext}"
+
+    @classmethod
+    def prune_saved(cls, keep=MAX_SAVED_MODELS, path=None):
+        """Xóa các file mô hình theo phiên bản cũ nhất, chỉ giữ lại keep file mới nhất"""
+        root, ext = os.path.splitext(path or cls.DEFAULT_PATH)
+        saved = sorted(glob.glob(f"{glob.escape(root)}-*{ext}"), key=os.path.getmtime, reverse=True)
+        for stale in saved[keep:]:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+    @classmethod
+    def load(cls, path=None):
+        """Đọc mô hình đã lưu, trả về None nếu chưa có file"""
+        path = path or cls.DEFAULT_PATH
+        if not os.path.exists(path):
+            return None
+        bundle = joblib.load(path)
+        if bundle.get('features') != cls.FEATURES:
+            return None
+        model = cls(bundle['horizon_days'], bundle['n_snapshots'], bundle['snapshot_step_days'])
+        model.pipeline = bundle['pipeline']
+        model.metrics = bundle['metrics']
+        model.dataset_version = bundle['dataset_version']
+        return model
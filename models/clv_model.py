@@ -0,0 +1,223 @@
+import numpy as np
+import pandas as pd
+from scipy import optimize
+from scipy.special import gammaln, hyp2f1
+
+
+class CLVModel:
+    """
+    Giá trị vòng đời khách hàng (CLV) theo mô hình xác suất BG/NBD + Gamma-Gamma
+
+    BG/NBD mô tả số lần mua và khả năng khách hàng còn "sống"; Gamma-Gamma mô tả giá trị
+    trung bình mỗi lần mua. Thống kê khách hàng tính theo ngày (các lần mua trong cùng ngày tính
+    là một); khi ước lượng, thời gian được đổi sang tuần và giá trị đơn hàng được chia cho giá trị
+    trung bình, để các tham số tỷ lệ (alpha, v) không bị đẩy tới biên của miền tìm kiếm.
+    """
+
+    # Số ngày của một đơn vị thời gian khi ước lượng BG/NBD
+    TIME_UNIT_DAYS = 7
+    # Biên của log tham số khi tối ưu hóa
+    LOG_PARAM_BOUND = 10
+
+    def __init__(self):
+        self.bgnbd_params = None
+        self.gamma_gamma_params = None
+        self.monetary_scale = 1.0
+
+    @staticmethod
+    def summary_statistics(df, observation_end=None):
+        """
+        Thống kê đủ của từng khách hàng trong một lần groupby
+
+        Parameters:
+        -----------
+        df : DataFrame
+            Giao dịch đã tiền xử lý (CustomerID, InvoiceDate, Revenue)
+        observation_end : datetime, optional
+            Ngày kết thúc quan sát; mặc định là ngày giao dịch cuối cùng
+
+        Returns:
+        --------
+        DataFrame: CustomerID, frequency (số lần mua lặp lại), recency (ngày từ lần mua đầu tới
+        lần mua cuối), T (ngày từ lần mua đầu tới cuối kỳ quan sát), monetary_value (giá trị
+        trung bình của các lần mua lặp lại, 0 nếu không có)
+        """
+        dates = pd.to_datetime(df['InvoiceDate'], errors='coerce')
+        observation_end = dates.max() if observation_end is None else pd.to_datetime(observation_end)
+        valid = dates.notna() & df['CustomerID'].notna()
+
+        # Số ngày (nguyên) tính từ cuối kỳ quan sát, để gộp các lần mua trong cùng ngày
+        day = (dates[valid].dt.normalize() - observation_end.normalize()).dt.days.to_numpy()
+        purchases = (
+            pd.DataFrame({'CustomerID': df.loc[valid, 'CustomerID'].to_numpy(), 'Day': day,
+                          'Revenue': df.loc[valid, 'Revenue'].to_numpy(dtype=float)})
+            .groupby(['CustomerID', 'Day'], sort=True)['Revenue'].sum()
+            .reset_index()
+        )
+        stats = purchases.groupby('CustomerID').agg(
+            first_day=('Day', 'min'), last_day=('Day', 'max'), n=('Day', 'size'),
+            total=('Revenue', 'sum'), first_revenue=('Revenue', 'first'),
+        )
+
+        frequency = stats['n'].to_numpy() - 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            monetary = np.where(frequency > 0, (stats['total'] - stats['first_revenue']).to_numpy() / frequency, 0.0)
+        return pd.DataFrame({
+            'CustomerID': stats.index,
+            'frequency': frequency,
+            'recency': (stats['last_day'] - stats['first_day']).to_numpy(dtype=float),
+            'T': (-stats['first_day']).to_numpy(dtype=float),
+            'monetary_value': monetary,
+        })
+
+    @staticmethod
+    def _bgnbd_log_likelihood(params, x, t_x, T):
+        """Log-likelihood BG/NBD của từng khách hàng (vector hóa)"""
+        r, alpha, a, b = params
+        a1 = gammaln(r + x) - gammaln(r) + r * np.log(alpha)
+        a2 = gammaln(a + b) + gammaln(b + x) - gammaln(b) - gammaln(a + b + x)
+        a3 = -(r + x) * np.log(alpha + T)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a4 = np.where(
+                x > 0,
+                np.log(a) - np.log(np.maximum(b + x - 1, 1e-12)) - (r + x) * np.log(alpha + t_x),
+                -np.inf,
+            )
+        return a1 + a2 + np.logaddexp(a3, a4)
+
+    @staticmethod
+    def _gamma_gamma_log_likelihood(params, x, m):
+        """Log-likelihood Gamma-Gamma của giá trị trung bình mỗi lần mua (chỉ khách mua lặp lại)"""
+        p, q, v = params
+        return (
+            gammaln(p * x + q) - gammaln(p * x) - gammaln(q) + q * np.log(v)
+            + (p * x - 1) * np.log(m) + p * x * np.log(x) - (p * x + q) * np.log(x * m + v)
+        )
+
+    @classmethod
+    def _fit(cls, log_likelihood, data, weights, n_params, name):
+        """
+        Cực đại hóa tổng log-likelihood theo log tham số (tham số luôn dương)
+
+        Log tham số bị giới hạn trong +-LOG_PARAM_BOUND để tránh nghiệm suy biến; nghiệm nằm trên
+        biên nghĩa là mô hình không hội tụ thật sự (bị cắt), nên cũng được báo lỗi như khi tối ưu
+        hóa thất bại, để nơi gọi dùng CLV đơn giản thay thế.
+        """
+        def objective(log_params):
+            value = log_likelihood(np.exp(log_params), *data)
+            return -np.sum(weights * value) / weights.sum()
+
+        bound = cls.LOG_PARAM_BOUND
+        result = optimize.minimize(objective, np.zeros(n_params), method='L-BFGS-B',
+                                   bounds=[(-bound, bound)] * n_params)
+        if not result.success or not np.isfinite(result.fun):
+            raise ValueError(f"Không hội tụ khi ước lượng tham số {name}: {result.message}")
+        if np.any(np.abs(result.x) >= bound - 1e-3):
+            raise ValueError(f"Tham số {name} chạm biên của miền tìm kiếm (exp(+-{bound})), "
+                             f"dữ liệu không đủ để ước lượng mô hình")
+        return np.exp(result.x)
+
+    def fit(self, summary):
+        """
+        Ước lượng tham số BG/NBD (r, alpha, a, b) và Gamma-Gamma (p, q, v)
+
+        Khách hàng có cùng (frequency, recency, T) được gộp lại với trọng số, nên mỗi lần
+        tính likelihood chỉ duyệt các bộ giá trị khác nhau.
+        """
+        if summary.empty:
+            raise ValueError("Không có khách hàng để ước lượng CLV")
+
+        triples, counts = np.unique(summary[['frequency', 'recency', 'T']].to_numpy(dtype=float), axis=0,
+                                    return_counts=True)
+        triples[:, 1:] /= self.TIME_UNIT_DAYS
+        self.bgnbd_params = self._fit(self._bgnbd_log_likelihood, tuple(triples.T), counts, 4, "BG/NBD")
+
+        repeat = summary[(summary['frequency'] > 0) & (summary['monetary_value'] > 0)]
+        if len(repeat) < 2:
+            raise ValueError("Cần ít nhất 2 khách hàng mua lặp lại để ước lượng giá trị đơn hàng")
+        monetary = repeat['monetary_value'].to_numpy(dtype=float)
+        self.monetary_scale = float(monetary.mean())
+        self.gamma_gamma_params = self._fit(
+            self._gamma_gamma_log_likelihood,
+            (repeat['frequency'].to_numpy(dtype=float), monetary / self.monetary_scale),
+            np.ones(len(repeat)),
+            3,
+            "Gamma-Gamma",
+        )
+        return self
+
+    def _dropout_odds(self, x, t_x, T):
+        """Tỷ số giữa khả năng khách hàng đã rời bỏ và còn hoạt động; P(còn hoạt động) = 1 / (1 + tỷ số)"""
+        r, alpha, a, b = self.bgnbd_params
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            return np.where(x > 0, a / np.maximum(b + x - 1, 1e-12) * ((alpha + T) / (alpha + t_x)) ** (r + x), 0.0)
+
+    def _expected_purchases(self, t, x, t_x, T):
+        """Số lần mua kỳ vọng trong t đơn vị thời gian tới (ma trận khi t là cột / x là dòng)"""
+        r, alpha, a, b = self.bgnbd_params
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            hyp = hyp2f1(r + x, b + x, a + b + x - 1, t / (alpha + T + t))
+            numerator = (a + b + x - 1) / (a - 1) * (1 - ((alpha + T) / (alpha + T + t)) ** (r + x) * hyp)
+        return numerator / (1 + self._dropout_odds(x, t_x, T))
+
+    def predict(self, summary, horizon_months=12, discount_rate=0.01, margin=1.0, batch_size=50000):
+        """
+        Dự báo CLV của mọi khách hàng, tính theo khối khách hàng
+
+        Parameters:
+        -----------
+        summary : DataFrame
+            Kết quả summary_statistics
+        horizon_months : int
+            Số tháng dự báo
+        discount_rate : float
+            Lãi suất chiết khấu mỗi tháng
+        margin : float
+            Tỷ suất lợi nhuận áp dụng lên doanh thu dự báo
+        batch_size : int
+            Số khách hàng mỗi khối
+
+        Returns:
+        --------
+        DataFrame: summary kèm P_Alive, Expected_Purchases, Expected_Value, CLV
+        """
+        if self.bgnbd_params is None:
+            raise ValueError("Mô hình CLV chưa được ước lượng")
+        p, q, v = self.gamma_gamma_params
+        if q <= 1:
+            raise ValueError("Tham số Gamma-Gamma không cho giá trị kỳ vọng hữu hạn (cần q > 1)")
+
+        # Mốc cuối mỗi tháng (đơn vị thời gian của mô hình) và hệ số chiết khấu tương ứng
+        steps = np.arange(horizon_months + 1) * 30.0 / self.TIME_UNIT_DAYS
+        discount = 1 / (1 + discount_rate) ** np.arange(1, horizon_months + 1)
+
+        n = len(summary)
+        p_alive = np.empty(n)
+        purchases = np.empty(n)
+        clv_purchases = np.empty(n)
+        for start in range(0, n, batch_size):
+            part = summary.iloc[start:start + batch_size]
+            x = part['frequency'].to_numpy(dtype=float)[:, None]
+            t_x = part['recency'].to_numpy(dtype=float)[:, None] / self.TIME_UNIT_DAYS
+            T = part['T'].to_numpy(dtype=float)[:, None] / self.TIME_UNIT_DAYS
+            cumulative = self._expected_purchases(steps[None, :], x, t_x, T)
+            monthly = np.diff(cumulative, axis=1)
+            purchases[start:start + batch_size] = cumulative[:, -1]
+            clv_purchases[start:start + batch_size] = monthly @ discount
+            p_alive[start:start + batch_size] = (1 / (1 + self._dropout_odds(x, t_x, T))).ravel()
+
+        x = summary['frequency'].to_numpy(dtype=float)
+        m = summary['monetary_value'].to_numpy(dtype=float) / self.monetary_scale
+        expected_value = (p * (v + x * m)) / (p * x + q - 1) * self.monetary_scale
+
+        result = summary.copy()
+        result['P_Alive'] = p_alive
+        result['Expected_Purchases'] = purchases
+        result['Expected_Value'] = expected_value
+        result['CLV'] = clv_purchases * expected_value * margin
+        return result
+
+    def fit_predict(self, df, observation_end=None, **kwargs):
+        """Tính thống kê, ước lượng và dự báo CLV trong một bước"""
+        summary = self.summary_statistics(df, observation_end)
+        return self.fit(summary).predict(summary, **kwargs)
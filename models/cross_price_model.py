@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse, stats
+
+from models.basket_model import invoice_item_matrix
+from models.data_model import add_calendar_columns, build_product_catalog
+
+
+class CrossPriceModel:
+    """
+    Độ co giãn chéo theo giá giữa các cặp sản phẩm thường được mua cùng nhau
+
+    Với cặp (i, j), hồi quy log(số lượng tháng của i) theo log(giá của i) và log(giá của j)
+    trên các tháng cả hai cùng có giá. Hệ số của log(giá j) là độ co giãn chéo: dương là sản phẩm
+    thay thế (j tăng giá thì i bán thêm), âm là sản phẩm bổ sung.
+    """
+
+    def __init__(self, df):
+        df = add_calendar_columns(df.dropna(subset=["InvoiceNo", "StockCode", "UnitPrice", "Quantity"]))
+        self.df = df[(df["Quantity"] > 0) & (df["UnitPrice"] > 0)]
+        self.catalog = build_product_catalog(self.df)
+        self.product_ids = pd.Index(self.catalog["StockCode"]).get_indexer(self.df["StockCode"])
+
+    def panels(self):
+        """
+        Ma trận thưa (số sản phẩm x số tháng) của số lượng bán và giá bình quân (doanh thu / số lượng)
+
+        Returns:
+        --------
+        tuple: (quantity CSR, price CSR, DatetimeIndex các tháng); ô trống là tháng không bán
+        """
+        month_ordinal = self.df["Year"].to_numpy(dtype=np.int64) * 12 + self.df["Month"].to_numpy(dtype=np.int64) - 1
+        first = month_ordinal.min()
+        months = pd.period_range(
+            pd.Period(year=int(first // 12), month=int(first % 12) + 1, freq="M"),
+            periods=int(month_ordinal.max() - first) + 1,
+        ).to_timestamp()
+
+        shape = (len(self.catalog), len(months))
+        coords = (self.product_ids, month_ordinal - first)
+        # Trùng tọa độ được cộng dồn khi chuyển sang CSR
+        quantity = sparse.csr_matrix((self.df["Quantity"].to_numpy(dtype=float), coords), shape=shape)
+        revenue = sparse.csr_matrix((self.df["Revenue"].to_numpy(dtype=float), coords), shape=shape)
+        price = quantity.copy()
+        price.data = revenue.data / quantity.data
+        return quantity, price, months
+
+    def candidate_pairs(self, min_cooccurrence=20, max_pairs=20000):
+        """
+        Các cặp sản phẩm cùng xuất hiện trong ít nhất min_cooccurrence hóa đơn
+
+        Đồng xuất hiện được tính bằng tích ma trận thưa B' B của ma trận hóa đơn x sản phẩm;
+        chỉ giữ tam giác trên và tối đa max_pairs cặp phổ biến nhất.
+
+        Returns:
+        --------
+        DataFrame: item_a, item_b (ProductID, item_a < item_b), co_occurrence
+        """
+        basket, _ = invoice_item_matrix(self.df, self.product_ids)
+        co = sparse.triu(basket.T.tocsr() @ basket, k=1).tocoo()
+        keep = co.data >= min_cooccurrence
+        pairs = pd.DataFrame({
+            "item_a": co.row[keep],
+            "item_b": co.col[keep],
+            "co_occurrence": co.data[keep].astype(np.int64),
+        })
+        return pairs.nlargest(max_pairs, "co_occurrence").reset_index(drop=True)
+
+    def estimate(self, min_cooccurrence=20, max_pairs=20000, min_months=6, interval=0.95):
+        """
+        Độ co giãn chéo theo giá cho mọi cặp ứng viên, theo cả hai chiều
+
+        Hồi quy hai biến của mọi cặp được giải bằng nghiệm đóng trên ma trận (số cặp x số tháng):
+        các tổng bình phương / tích chéo là tổng theo dòng, không có vòng lặp theo cặp.
+
+        Parameters:
+        -----------
+        min_cooccurrence : int
+            Số hóa đơn tối thiểu hai sản phẩm cùng xuất hiện
+        max_pairs : int
+            Số cặp ứng viên tối đa (theo đồng xuất hiện giảm dần)
+        min_months : int
+            Số tháng tối thiểu cả hai sản phẩm cùng có giá
+        interval : float
+            Mức tin cậy của khoảng tin cậy
+
+        Returns:
+        --------
+        DataFrame: StockCode, Description, Related_StockCode, Related_Description, Co_Occurrence,
+        Own_Elasticity, Cross_Elasticity, Std_Error, CI_Lower, CI_Upper, P_Value, N_Months, Relationship
+        """
+        if min_months < 4:
+            raise ValueError("Cần ít nhất 4 tháng để ước lượng hồi quy hai biến")
+
+        pairs = self.candidate_pairs(min_cooccurrence, max_pairs)
+        columns = ["StockCode", "Description", "Related_StockCode", "Related_Description", "Co_Occurrence",
+                   "Own_Elasticity", "Cross_Elasticity", "Std_Error", "CI_Lower", "CI_Upper", "P_Value",
+                   "N_Months", "Relationship"]
+        if pairs.empty:
+            return pd.DataFrame(columns=columns)
+
+        quantity, price, _ = self.panels()
+        # Mỗi cặp được xét theo cả hai chiều: ảnh hưởng của giá b lên a và của giá a lên b
+        target = np.concatenate([pairs["item_a"].to_numpy(), pairs["item_b"].to_numpy()])
+        related = np.concatenate([pairs["item_b"].to_numpy(), pairs["item_a"].to_numpy()])
+        co_occurrence = np.tile(pairs["co_occurrence"].to_numpy(), 2)
+
+        # Chỉ lấy các dòng của sản phẩm trong cặp ra dạng đặc (số cặp x số tháng)
+        q = quantity[target].toarray()
+        own_price = price[target].toarray()
+        cross_price = price[related].toarray()
+        mask = (q > 0) & (own_price > 0) & (cross_price > 0)
+        n = mask.sum(axis=1)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            y = np.where(mask, np.log(np.where(mask, q, 1)), 0)
+            x1 = np.where(mask, np.log(np.where(mask, own_price, 1)), 0)
+            x2 = np.where(mask, np.log(np.where(mask, cross_price, 1)), 0)
+
+            def centered(values):
+                return np.where(mask, values - values.sum(axis=1, keepdims=True) / np.maximum(n, 1)[:, None], 0)
+
+            y, x1, x2 = centered(y), centered(x1), centered(x2)
+            s11, s22, s12 = (x1 * x1).sum(axis=1), (x2 * x2).sum(axis=1), (x1 * x2).sum(axis=1)
+            s1y, s2y, syy = (x1 * y).sum(axis=1), (x2 * y).sum(axis=1), (y * y).sum(axis=1)
+            det = s11 * s22 - s12 ** 2
+            dof = n - 3
+            # Ngưỡng nhỏ loại cặp có giá không biến động hoặc hai giá gần như đồng tuyến
+            valid = (n >= min_months) & (det > 1e-12 * np.maximum(s11 * s22, 1e-300)) & (s11 > 1e-12) & (s22 > 1e-12)
+
+            own = np.where(valid, (s22 * s1y - s12 * s2y) / det, np.nan)
+            cross = np.where(valid, (s11 * s2y - s12 * s1y) / det, np.nan)
+            rss = np.maximum(syy - own * s1y - cross * s2y, 0)
+            std_error = np.where(valid, np.sqrt(rss / np.maximum(dof, 1) * s11 / det), np.nan)
+            t_stat = cross / std_error
+
+        t_crit = stats.t.ppf(0.5 + interval / 2, np.maximum(dof, 1))
+        p_value = np.where(valid, 2 * stats.t.sf(np.abs(t_stat), np.maximum(dof, 1)), np.nan)
+        significant = p_value < 1 - interval
+
+        codes = self.catalog["StockCode"].to_numpy()
+        descriptions = self.catalog["Description"].to_numpy()
+        result = pd.DataFrame({
+            "StockCode": codes[target],
+            "Description": descriptions[target],
+            "Related_StockCode": codes[related],
+            "Related_Description": descriptions[related],
+            "Co_Occurrence": co_occurrence,
+            "Own_Elasticity": own,
+            "Cross_Elasticity": cross,
+            "Std_Error": std_error,
+            "CI_Lower": cross - t_crit * std_error,
+            "CI_Upper": cross + t_crit * std_error,
+            "P_Value": p_value,
+            "N_Months": n,
+            "Relationship": np.select(
+                [significant & (cross > 0), significant & (cross < 0)], ["Thay thế", "Bổ sung"], "Không rõ"
+            ),
+        })
+        return result[valid].sort_values(["StockCode", "P_Value"]).reset_index(drop=True)[columns]
@@ -0,0 +1,115 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+class MonthlyCube:
+    """Khối dữ liệu theo tháng: mỗi dòng là một chuỗi (StockCode, Country), mỗi cột là một tháng"""
+
+    def __init__(self, keys, months, revenue, quantity=None, price=None):
+        # keys: DataFrame các khóa của chuỗi, theo đúng thứ tự dòng của ma trận
+        self.keys = keys
+        # months: DatetimeIndex các tháng liên tục (đầu tháng)
+        self.months = months
+        # Ma trận (số chuỗi x số tháng); tháng không có giao dịch = 0
+        self.revenue = revenue
+        self.quantity = quantity
+        # Giá trung bình theo tháng; tháng không có giao dịch = NaN
+        self.price = price
+        # Phiên bản được tính một lần: khối không bị sửa sau khi dựng
+        self._version = None
+
+    @classmethod
+    def from_frame(cls, df, keys=("StockCode", "Country"), month_col="Month"):
+        """
+        Tổng hợp dữ liệu giao dịch thành khối theo tháng chỉ với một lần groupby
+
+        Parameters:
+        -----------
+        df : DataFrame
+            Dữ liệu giao dịch đã có cột Revenue và cột tháng (đầu tháng)
+        keys : tuple
+            Các cột xác định một chuỗi
+        month_col : str
+            Tên cột tháng
+
+        Returns:
+        --------
+        MonthlyCube: Khối dữ liệu theo tháng
+        """
+        keys = list(keys)
+        aggregations = {"Revenue": ("Revenue", "sum")}
+        if "Quantity" in df.columns:
+            aggregations["Quantity"] = ("Quantity", "sum")
+        if "UnitPrice" in df.columns:
+            aggregations["UnitPrice"] = ("UnitPrice", "mean")
+
+        data = df.dropna(subset=keys + [month_col])
+        if data.empty:
+            raise ValueError("Không có dữ liệu để tổng hợp theo tháng")
+
+        grouped = data.groupby(keys + [month_col], sort=False, observed=True).agg(**aggregations).reset_index()
+
+        # Mã hóa chuỗi và tháng thành chỉ số nguyên
+        series_codes, series_keys = pd.MultiIndex.from_frame(grouped[keys]).factorize(sort=True)
+        month_ts = pd.to_datetime(grouped[month_col])
+        month_ordinal = (month_ts.dt.year * 12 + month_ts.dt.month).to_numpy()
+        first_ordinal = month_ordinal.min()
+        month_codes = month_ordinal - first_ordinal
+        n_months = int(month_codes.max()) + 1
+        months = pd.date_range(start=month_ts.min().to_period("M").to_timestamp(), periods=n_months, freq="MS")
+
+        shape = (len(series_keys), n_months)
+        revenue = np.zeros(shape)
+        revenue[series_codes, month_codes] = grouped["Revenue"].to_numpy(dtype=float)
+
+        quantity = None
+        if "Quantity" in grouped.columns:
+            quantity = np.zeros(shape)
+            quantity[series_codes, month_codes] = grouped["Quantity"].to_numpy(dtype=float)
+
+        price = None
+        if "UnitPrice" in grouped.columns:
+            price = np.full(shape, np.nan)
+            price[series_codes, month_codes] = grouped["UnitPrice"].to_numpy(dtype=float)
+
+        key_frame = series_keys.to_frame(index=False)
+        key_frame.columns = keys
+        return cls(key_frame, months, revenue, quantity, price)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def series_hashes(self, n_months=None):
+        """
+        Mã băm của từng chuỗi (khóa + doanh thu theo tháng), dùng để nhận biết chuỗi đã thay đổi
+
+        n_months giới hạn mã băm trên các tháng đầu tiên, để so với mã băm đã lưu
+        khi bộ dữ liệu mới chỉ được nối thêm tháng.
+        """
+        key_hash = pd.util.hash_pandas_object(self.keys, index=False).to_numpy()
+        values = self.revenue if n_months is None else self.revenue[:, :n_months]
+        value_hash = pd.util.hash_pandas_object(pd.DataFrame(values), index=False).to_numpy()
+        return key_hash ^ value_hash
+
+    def version(self):
+        """Phiên bản của bộ dữ liệu: thay đổi khi bất kỳ chuỗi hoặc khoảng tháng nào thay đổi"""
+        if self._version is None:
+            digest = hashlib.sha1()
+            digest.update(str((self.months[0], self.months[-1])).encode())
+            digest.update(np.sort(self.series_hashes()).tobytes())
+            self._version = digest.hexdigest()[:12]
+        return self._version
+
+    def row_index(self, stock_code, country):
+        """Trả về chỉ số dòng của chuỗi (stock_code, country), hoặc None nếu không có"""
+        mask = (self.keys["StockCode"] == stock_code) & (self.keys["Country"] == country)
+        rows = np.flatnonzero(mask.to_numpy())
+        return int(rows[0]) if len(rows) else None
+
+    def month_index(self, month):
+        """Trả về chỉ số cột của tháng, hoặc None nếu nằm ngoài khối"""
+        month = pd.Timestamp(month).to_period("M").to_timestamp()
+        loc = self.months.get_indexer([month])[0]
+        return int(loc) if loc >= 0 else None
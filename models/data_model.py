@@ -1,18 +1,125 @@
 # models/data_models.py
+import hashlib
+
 import pandas as pd
 import streamlit as st
 
-@st.cache_data
-def get_cached_data():
-    df = pd.read_csv("online_retail.csv", encoding='ISO-8859-1')
-    df.dropna(inplace=True)
+# Các cột lịch được tính sẵn một lần khi nạp dữ liệu, lưu dưới dạng số nguyên nhỏ
+CALENDAR_COLUMNS = {"Year": "int16", "Quarter": "int8", "Month": "int8", "Day": "int8", "Hour": "int8"}
+
+# Các cột giao dịch gốc; mọi cột khác do prepare_data tính ra từ chúng
+SOURCE_COLUMNS = ["InvoiceNo", "StockCode", "Description", "Quantity", "InvoiceDate", "UnitPrice", "CustomerID", "Country"]
+
+
+def add_calendar_columns(df):
+    """
+    Bảo đảm dữ liệu có InvoiceDate dạng datetime, các cột lịch số nguyên và Revenue
+
+    Không sửa DataFrame đầu vào: nếu đã đủ cột thì trả về chính nó, ngược lại trả về bản mới.
+    """
+    has_dates = pd.api.types.is_datetime64_any_dtype(df["InvoiceDate"])
+    has_calendar = all(
+        col in df.columns and pd.api.types.is_integer_dtype(df[col]) for col in CALENDAR_COLUMNS
+    )
+    if has_dates and has_calendar and "Revenue" in df.columns:
+        return df
+
+    dates = df["InvoiceDate"] if has_dates else pd.to_datetime(df["InvoiceDate"], errors="coerce")
+    valid = dates.notna()
+    df = df[valid]
+    dates = dates[valid]
+    return df.assign(
+        InvoiceDate=dates,
+        Revenue=df["Quantity"] * df["UnitPrice"],
+        Year=dates.dt.year.astype(CALENDAR_COLUMNS["Year"]),
+        Quarter=dates.dt.quarter.astype(CALENDAR_COLUMNS["Quarter"]),
+        Month=dates.dt.month.astype(CALENDAR_COLUMNS["Month"]),
+        Day=dates.dt.day.astype(CALENDAR_COLUMNS["Day"]),
+        Hour=dates.dt.hour.astype(CALENDAR_COLUMNS["Hour"]),
+    )
+
+
+def build_product_catalog(df):
+    """
+    Danh mục sản phẩm: mỗi StockCode một dòng, chỉ số là ProductID (số nguyên liên tục)
+
+    Mô tả chuẩn của một sản phẩm là mô tả xuất hiện nhiều nhất trong các giao dịch của nó.
+
+    Returns:
+    --------
+    DataFrame: Chỉ số ProductID, các cột StockCode, Description, Label
+    """
+    ids, codes = pd.factorize(df["StockCode"], sort=True)
+    counts = (
+        pd.DataFrame({"ProductID": ids, "Description": df["Description"].to_numpy()})
+        .dropna()
+        .value_counts(sort=True)
+        .reset_index()
+        .drop_duplicates("ProductID")
+        .set_index("ProductID")["Description"]
+    )
+    catalog = pd.DataFrame({"StockCode": codes}, index=pd.RangeIndex(len(codes), name="ProductID"))
+    catalog["Description"] = counts.reindex(catalog.index).fillna("").astype(str).to_numpy()
+    catalog["Label"] = catalog["Description"] + " (" + catalog["StockCode"].astype(str) + ")"
+    return catalog
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _cached_catalog(_df, dataset_key):
+    return build_product_catalog(_df)
+
+
+def product_catalog(df, version=None):
+    """Danh mục sản phẩm của bộ dữ liệu, chỉ xây một lần cho mỗi phiên bản dữ liệu (data_version)"""
+    return _cached_catalog(df, data_version(df) if version is None else version)
+
+
+def select_product(df, catalog, product_id):
+    """Các giao dịch của một sản phẩm theo ProductID (dùng cột ProductID đã mã hóa sẵn nếu có)"""
+    if "ProductID" in df.columns:
+        return df[df["ProductID"].to_numpy() == product_id]
+    return df[df["StockCode"] == catalog.at[product_id, "StockCode"]]
+
+
+def prepare_data(df):
+    """Làm sạch dữ liệu giao dịch thô và tính sẵn các cột dùng chung (chỉ chạy một lần khi nạp)"""
+    df = df.dropna()
     df = df[~df['InvoiceNo'].astype(str).str.startswith('C')]
     df = df[(df['Quantity'] > 0) & (df['UnitPrice'] > 0)]
-    df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
-    df['TotalPrice'] = df['Quantity'] * df['UnitPrice']
-    df['Year'] = df['InvoiceDate'].dt.year
-    df['Month'] = df['InvoiceDate'].dt.month
-    df['Day'] = df['InvoiceDate'].dt.day
-    df['Hour'] = df['InvoiceDate'].dt.hour
-    df['Date'] = df['InvoiceDate'].dt.date
+    df = add_calendar_columns(df)
+    # ProductID trùng với chỉ số của build_product_catalog (StockCode đã sắp xếp)
+    product_id, _ = pd.factorize(df['StockCode'], sort=True)
+    df = df.assign(TotalPrice=df['Revenue'], Date=df['InvoiceDate'].dt.date, ProductID=product_id.astype("int32"))
     return df
+
+
+def data_version(df, columns=None):
+    """
+    Phiên bản theo nội dung của bộ dữ liệu, dùng làm khóa cache chung cho mọi màn hình
+
+    Hai bộ dữ liệu cùng số dòng và cùng ngày cuối nhưng khác nội dung (ví dụ file tải lên đã sửa)
+    cho phiên bản khác nhau.
+
+    Parameters:
+    -----------
+    df : DataFrame
+        Dữ liệu giao dịch
+    columns : list, optional
+        Các cột đưa vào mã băm; mặc định là các cột gốc (SOURCE_COLUMNS) có trong df
+
+    Returns:
+    --------
+    str: 12 ký tự đầu của mã băm SHA-1
+    """
+    if columns is None:
+        columns = [col for col in SOURCE_COLUMNS if col in df.columns] or list(df.columns)
+    digest = hashlib.sha1()
+    digest.update(str((len(df), list(columns))).encode())
+    digest.update(pd.util.hash_pandas_object(df[columns], index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:12]
+
+
+@st.cache_data
+def get_cached_data():
+    df = pd.read_csv("online_retail.csv", encoding='ISO-8859-1')
+    return prepare_data(df)
@@ -0,0 +1,125 @@
+import json
+import os
+
+import pandas as pd
+
+
+class ForecastStore:
+    """Kho lưu dự báo đã tính trước, gắn nhãn phiên bản bộ dữ liệu"""
+
+    DEFAULT_PATH = os.environ.get("FORECAST_STORE_DIR", "forecast_store")
+    FORECAST_FILE = "forecasts.pkl"
+    STATE_FILE = "state.pkl"
+    MANIFEST_FILE = "manifest.json"
+
+    def __init__(self, path=None):
+        self.path = path or self.DEFAULT_PATH
+        self._forecasts = None
+        self._state = None
+        self._manifest = None
+
+    @property
+    def forecast_path(self):
+        return os.path.join(self.path, self.FORECAST_FILE)
+
+    @property
+    def state_path(self):
+        return os.path.join(self.path, self.STATE_FILE)
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.path, self.MANIFEST_FILE)
+
+    def exists(self):
+        return os.path.exists(self.forecast_path) and os.path.exists(self.manifest_path)
+
+    def modified_at(self):
+        """Thời điểm kho được ghi lần cuối (theo manifest), None nếu kho chưa được tạo"""
+        return os.path.getmtime(self.manifest_path) if self.exists() else None
+
+    def save(self, forecasts, dataset_version, state=None, **metadata):
+        """
+        Ghi toàn bộ dự báo vào kho (ghi ra file tạm rồi thay thế để không làm hỏng kho đang đọc)
+
+        Parameters:
+        -----------
+        forecasts : DataFrame
+            Kết quả của RevenueForecastModel.forecast_all
+        dataset_version : str
+            Phiên bản bộ dữ liệu dùng để tính dự báo
+        state : DataFrame, optional
+            Tham số đã khớp của từng chuỗi, dùng để khởi động ấm ở lần làm mới sau
+        metadata : dict
+            Thông tin bổ sung ghi vào manifest (engine, periods, ...)
+        """
+        os.makedirs(self.path, exist_ok=True)
+        manifest = {
+            "dataset_version": dataset_version,
+            "created_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+            "n_series": int(forecasts[["StockCode", "Country"]].drop_duplicates().shape[0]),
+            **metadata,
+        }
+
+        tmp_forecast = self.forecast_path + ".tmp"
+        tmp_manifest = self.manifest_path + ".tmp"
+        forecasts.to_pickle(tmp_forecast)
+        if state is not None:
+            state.to_pickle(self.state_path + ".tmp")
+        with open(tmp_manifest, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_forecast, self.forecast_path)
+        if state is not None:
+            os.replace(self.state_path + ".tmp", self.state_path)
+        os.replace(tmp_manifest, self.manifest_path)
+
+        self._forecasts = forecasts
+        self._state = state
+        self._manifest = manifest
+
+    def manifest(self):
+        if self._manifest is None:
+            if not self.exists():
+                return None
+            with open(self.manifest_path, encoding="utf-8") as f:
+                self._manifest = json.load(f)
+        return self._manifest
+
+    def load(self):
+        """Đọc toàn bộ dự báo trong kho, trả về None nếu kho chưa được tạo"""
+        if self._forecasts is None:
+            if not self.exists():
+                return None
+            self._forecasts = pd.read_pickle(self.forecast_path)
+        return self._forecasts
+
+    def load_state(self):
+        """Đọc tham số đã khớp của lần làm mới trước, trả về None nếu chưa có"""
+        if self._state is None:
+            if not os.path.exists(self.state_path):
+                return None
+            self._state = pd.read_pickle(self.state_path)
+        return self._state
+
+    def lookup(self, stock_code, country, series_hash, last_month, periods):
+        """
+        Lấy dự báo của một chuỗi nếu còn mới
+
+        Dự báo được coi là cũ khi dữ liệu của chuỗi đã đổi (khác mã băm), khi đã có tháng
+        dữ liệu mới hơn, hoặc khi kho không có đủ số tháng dự báo được yêu cầu.
+
+        Returns:
+        --------
+        DataFrame hoặc None: Dự báo của chuỗi, None nếu thiếu hoặc đã cũ
+        """
+        forecasts = self.load()
+        if forecasts is None:
+            return None
+
+        series = forecasts[(forecasts["StockCode"] == stock_code) & (forecasts["Country"] == country)]
+        if len(series) < periods:
+            return None
+        if series["series_hash"].iloc[0] != series_hash:
+            return None
+        if pd.Timestamp(series["last_month"].iloc[0]) != pd.Timestamp(last_month):
+            return None
+        return series.sort_values("ds").head(periods)
@@ -0,0 +1,370 @@
+import numpy as np
+import pandas as pd
+
+from models.data_model import build_product_catalog
+from models.inventory_policy_model import optimize_policies
+
+
+def eoq_plan(demand, holding_cost, ordering_cost, lead_time, days_per_period=30):
+    """
+    Tính EOQ, điểm đặt hàng lại và tồn kho chu kỳ cho nhiều sản phẩm cùng lúc
+
+    Mọi tham số đều có thể là số vô hướng hoặc mảng theo từng sản phẩm (broadcast với demand).
+
+    Parameters:
+    -----------
+    demand : ndarray
+        Nhu cầu trung bình mỗi kỳ (đơn vị/tháng) của từng sản phẩm
+    holding_cost : float hoặc ndarray
+        Chi phí lưu kho / đơn vị / kỳ
+    ordering_cost : float hoặc ndarray
+        Chi phí đặt hàng / lần
+    lead_time : float hoặc ndarray
+        Thời gian giao hàng (ngày)
+    days_per_period : float
+        Số ngày của một kỳ
+
+    Returns:
+    --------
+    dict: Các mảng eoq, reorder_point, cycle_stock, orders_per_period, total_cost
+    """
+    demand = np.asarray(demand, dtype=float)
+    holding_cost, ordering_cost, lead_time = (
+        np.broadcast_to(np.asarray(x, dtype=float), demand.shape) for x in (holding_cost, ordering_cost, lead_time)
+    )
+    if np.any(holding_cost <= 0) or np.any(ordering_cost < 0) or np.any(lead_time < 0):
+        raise ValueError("Chi phí lưu kho phải dương, chi phí đặt hàng và thời gian giao hàng không được âm")
+
+    demand = np.maximum(demand, 0)
+    eoq = np.sqrt(2 * demand * ordering_cost / holding_cost)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        orders_per_period = np.where(eoq > 0, demand / eoq, 0.0)
+    return {
+        "eoq": eoq,
+        "reorder_point": demand / days_per_period * lead_time,
+        "cycle_stock": eoq / 2,
+        "orders_per_period": orders_per_period,
+        # Chi phí đặt hàng + lưu kho mỗi kỳ tại EOQ
+        "total_cost": ordering_cost * orders_per_period + holding_cost * eoq / 2,
+    }
+
+
+def simulate_safety_stock(daily_mean, daily_std, lead_time, service_level=0.95, lead_time_std=0.0,
+                          n_draws=10000, seed=None, max_elements=5_000_000):
+    """
+    Ước lượng tồn kho an toàn bằng mô phỏng Monte Carlo nhu cầu trong thời gian giao hàng
+
+    Thời gian giao hàng L ~ Gamma(trung bình lead_time, độ lệch lead_time_std) (cố định nếu độ lệch = 0).
+    Với L cho trước, tổng nhu cầu của L ngày ~ Gamma với trung bình daily_mean * L và phương sai
+    daily_std^2 * L. Mọi sản phẩm x lượt mô phỏng được rút cùng lúc thành một mảng, chia theo
+    khối sản phẩm để giới hạn bộ nhớ.
+
+    Parameters:
+    -----------
+    daily_mean, daily_std : ndarray
+        Trung bình và độ lệch chuẩn nhu cầu theo ngày của từng sản phẩm
+    lead_time : float hoặc ndarray
+        Thời gian giao hàng trung bình (ngày)
+    service_level : float hoặc ndarray
+        Xác suất không hết hàng trong một chu kỳ, cho từng sản phẩm hoặc chung
+    lead_time_std : float hoặc ndarray
+        Độ lệch chuẩn của thời gian giao hàng (ngày)
+    n_draws : int
+        Số lượt mô phỏng cho mỗi sản phẩm
+    seed : int, optional
+        Hạt giống ngẫu nhiên
+    max_elements : int
+        Số phần tử tối đa của một khối (số sản phẩm x n_draws)
+
+    Returns:
+    --------
+    dict: Các mảng lead_time_demand (trung bình), reorder_point (phân vị theo mức phục vụ), safety_stock
+    """
+    daily_mean = np.maximum(np.asarray(daily_mean, dtype=float), 0)
+    shape = daily_mean.shape
+    daily_std = np.broadcast_to(np.maximum(np.asarray(daily_std, dtype=float), 0), shape)
+    lead_time, service_level, lead_time_std = (
+        np.broadcast_to(np.asarray(x, dtype=float), shape) for x in (lead_time, service_level, lead_time_std)
+    )
+    if np.any((service_level <= 0) | (service_level >= 1)):
+        raise ValueError("Mức phục vụ phải nằm trong khoảng (0, 1)")
+    if np.any(lead_time <= 0) or np.any(lead_time_std < 0):
+        raise ValueError("Thời gian giao hàng phải dương và độ lệch không được âm")
+
+    rng = np.random.default_rng(seed)
+    quantile = np.zeros(shape)
+    chunk = max(1, max_elements // n_draws)
+    for start in range(0, len(daily_mean), chunk):
+        rows = slice(start, start + chunk)
+        mu, sigma = daily_mean[rows, None], daily_std[rows, None]
+        lt, lt_sd = lead_time[rows, None], lead_time_std[rows, None]
+        size = (len(mu), n_draws)
+
+        # Thời gian giao hàng ngẫu nhiên (Gamma theo trung bình / độ lệch), chỉ rút khi có biến động
+        if np.any(lt_sd > 0):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                lt_shape = np.where(lt_sd > 0, (lt / lt_sd) ** 2, 1.0)
+                lt_scale = np.where(lt_sd > 0, lt_sd ** 2 / lt, 0.0)
+            days = np.where(lt_sd > 0, rng.standard_gamma(np.broadcast_to(lt_shape, size)) * lt_scale, lt)
+        else:
+            days = lt
+
+        # Nhu cầu trong thời gian giao hàng: Gamma có cùng trung bình / phương sai với tổng nhu cầu
+        # các ngày; hệ số hình dạng = mu^2 * L / sigma^2 và tỷ lệ = sigma^2 / mu không phụ thuộc L
+        with np.errstate(divide="ignore", invalid="ignore"):
+            random = (mu > 0) & (sigma > 0)
+            d_shape = np.where(random, mu ** 2 / np.where(random, sigma ** 2, 1.0), 1.0) * days
+            d_scale = np.where(random, sigma ** 2 / np.where(random, mu, 1.0), 0.0)
+        demand = np.where(random, rng.standard_gamma(np.broadcast_to(d_shape, size)) * d_scale, mu * days)
+
+        # Phân vị theo mức phục vụ riêng của từng sản phẩm (partition cho từng mức khác nhau)
+        k = np.clip(np.ceil(service_level[rows] * n_draws).astype(int) - 1, 0, n_draws - 1)
+        chunk_quantile = np.empty(len(k))
+        for level in np.unique(k):
+            selected = k == level
+            chunk_quantile[selected] = np.partition(demand[selected], level, axis=1)[:, level]
+        quantile[rows] = chunk_quantile
+
+    lead_time_demand = daily_mean * lead_time
+    return {
+        "lead_time_demand": lead_time_demand,
+        "reorder_point": quantile,
+        "safety_stock": np.maximum(quantile - lead_time_demand, 0),
+    }
+
+
+def _month_key(df):
+    """Khóa tháng (năm * 12 + tháng), dùng cột Year/Month số nguyên có sẵn nếu có"""
+    if {"Year", "Month"} <= set(df.columns) and all(pd.api.types.is_integer_dtype(df[c]) for c in ("Year", "Month")):
+        return df["Year"].astype("int32") * 12 + df["Month"]
+    dates = pd.to_datetime(df["InvoiceDate"])
+    return dates.dt.year * 12 + dates.dt.month
+
+
+class InventoryModel:
+    """
+    Lập kế hoạch tồn kho theo từng sản phẩm từ nhu cầu quan sát được trong dữ liệu giao dịch
+
+    Mọi phép gộp theo sản phẩm dùng StockCode: một mã có nhiều mô tả trong dữ liệu vẫn là một
+    sản phẩm, mang mô tả chuẩn của danh mục sản phẩm.
+    """
+
+    # Ngưỡng tỷ trọng doanh thu tích lũy cho nhóm A / B và ngưỡng hệ số biến thiên cho nhóm X / Y
+    ABC_THRESHOLDS = (0.8, 0.95)
+    XYZ_THRESHOLDS = (0.5, 1.0)
+
+    def __init__(self, df, catalog=None):
+        """
+        Parameters:
+        -----------
+        df : DataFrame
+            Giao dịch (có thể đã lọc theo khoảng thời gian / sản phẩm)
+        catalog : DataFrame, optional
+            Danh mục sản phẩm (build_product_catalog) của toàn bộ dữ liệu, để mô tả thống nhất giữa
+            các khoảng thời gian; mặc định xây từ df
+        """
+        self.df = df
+        self.catalog = catalog
+
+    def _descriptions(self, codes):
+        """Mô tả chuẩn của các StockCode theo danh mục sản phẩm"""
+        if self.catalog is None:
+            self.catalog = build_product_catalog(self.df)
+        descriptions = pd.Series(self.catalog["Description"].to_numpy(), index=self.catalog["StockCode"].to_numpy())
+        return descriptions.reindex(np.asarray(codes)).fillna("").to_numpy()
+
+    def classify(self, abc_thresholds=ABC_THRESHOLDS, xyz_thresholds=XYZ_THRESHOLDS):
+        """
+        Phân loại ABC (Pareto doanh thu) x XYZ (hệ số biến thiên nhu cầu theo tháng) cho toàn danh mục
+
+        Dùng một lần groupby theo (StockCode, tháng), sau đó các tổng được gộp theo sản phẩm;
+        nhóm ABC lấy từ tổng tích lũy của doanh thu đã sắp xếp.
+
+        Parameters:
+        -----------
+        abc_thresholds : tuple
+            Tỷ trọng doanh thu tích lũy giới hạn nhóm A và nhóm B
+        xyz_thresholds : tuple
+            Hệ số biến thiên tối đa của nhóm X và nhóm Y
+
+        Returns:
+        --------
+        DataFrame: StockCode, Description, Revenue, Revenue_Share, Cumulative_Share,
+        Demand_CV, ABC, XYZ, Class (ví dụ "AX"), sắp xếp theo doanh thu giảm dần
+        """
+        df = self.df
+        month_key = _month_key(df)
+        revenue = df["Revenue"] if "Revenue" in df.columns else df["Quantity"] * df["UnitPrice"]
+        monthly = (
+            df.assign(Revenue=revenue, Month_Key=month_key)
+            .groupby(["StockCode", "Month_Key"], observed=True)
+            .agg(Quantity=("Quantity", "sum"), Revenue=("Revenue", "sum"))
+        )
+        per_sku = (
+            monthly.assign(Quantity_Sq=monthly["Quantity"] ** 2)
+            .groupby(level="StockCode", observed=True)[["Revenue", "Quantity", "Quantity_Sq"]].sum()
+            .reset_index()
+        )
+        if per_sku.empty:
+            return per_sku.assign(Description=pd.Series(dtype=object))
+        per_sku["Description"] = self._descriptions(per_sku["StockCode"])
+
+        # Thống kê nhu cầu theo tháng, tính cả các tháng không bán (số lượng = 0)
+        n_months = max(int(month_key.nunique()), 2)
+        mean = per_sku["Quantity"].to_numpy(dtype=float) / n_months
+        var = (per_sku["Quantity_Sq"].to_numpy(dtype=float) / n_months - mean ** 2) * n_months / (n_months - 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cv = np.where(mean > 0, np.sqrt(np.maximum(var, 0)) / mean, np.inf)
+
+        # Pareto: sản phẩm làm tổng tích lũy vượt ngưỡng vẫn thuộc nhóm trên
+        order = np.argsort(-per_sku["Revenue"].to_numpy(), kind="stable")
+        result = per_sku.iloc[order].reset_index(drop=True)
+        cv = cv[order]
+        revenue_sorted = result["Revenue"].to_numpy(dtype=float)
+        total = revenue_sorted.sum()
+        share = revenue_sorted / total if total > 0 else np.zeros(len(result))
+        cumulative = np.cumsum(share)
+        share_before = cumulative - share
+
+        result = result[["StockCode", "Description", "Revenue"]].copy()
+        result["Revenue_Share"] = share
+        result["Cumulative_Share"] = cumulative
+        result["Demand_CV"] = cv
+        result["ABC"] = np.select([share_before < abc_thresholds[0], share_before < abc_thresholds[1]], ["A", "B"], "C")
+        result["XYZ"] = np.select([cv <= xyz_thresholds[0], cv <= xyz_thresholds[1]], ["X", "Y"], "Z")
+        result["Class"] = result["ABC"] + result["XYZ"]
+        return result
+
+    def demand_summary(self):
+        """
+        Nhu cầu theo từng sản phẩm với một lần groupby
+
+        Nhu cầu mỗi tháng = tổng số lượng / số tháng của khoảng dữ liệu (tính cả tháng không bán).
+
+        Returns:
+        --------
+        DataFrame: StockCode, Description, Quantity, Revenue, Monthly_Demand
+        """
+        df = self.df
+        revenue = df["Revenue"] if "Revenue" in df.columns else df["Quantity"] * df["UnitPrice"]
+        summary = (
+            df.assign(Revenue=revenue)
+            .groupby("StockCode", observed=True)
+            .agg(Quantity=("Quantity", "sum"), Revenue=("Revenue", "sum"))
+            .reset_index()
+        )
+        summary.insert(1, "Description", self._descriptions(summary["StockCode"]))
+        n_months = max(int(_month_key(df).nunique()), 1)
+        summary["Monthly_Demand"] = summary["Quantity"] / n_months
+        return summary
+
+    def daily_demand_stats(self):
+        """
+        Trung bình và độ lệch chuẩn nhu cầu theo ngày của từng sản phẩm (tính cả ngày không bán)
+
+        Mẫu số là số ngày có giao dịch trong dữ liệu, giống daily_demand_matrix: khoảng trống
+        giữa các cửa sổ lọc (ví dụ cùng tháng của hai năm) không được tính là ngày không có nhu cầu.
+
+        Returns:
+        --------
+        DataFrame: StockCode, Description, Daily_Mean, Daily_Std
+        """
+        dates = pd.to_datetime(self.df["InvoiceDate"]).dt.normalize()
+        n_days = max(dates.nunique(), 2)
+        daily = (
+            self.df.assign(Day=dates)
+            .groupby(["StockCode", "Day"], observed=True)["Quantity"].sum()
+        )
+        stats = (
+            daily.to_frame("q").assign(q2=daily ** 2)
+            .groupby(level="StockCode", observed=True)[["q", "q2"]].sum()
+            .reset_index()
+        )
+        mean = stats["q"] / n_days
+        var = (stats["q2"] / n_days - mean ** 2) * n_days / (n_days - 1)
+        return pd.DataFrame({
+            "StockCode": stats["StockCode"],
+            "Description": self._descriptions(stats["StockCode"]),
+            "Daily_Mean": mean,
+            "Daily_Std": np.sqrt(np.maximum(var, 0)),
+        })
+
+    def daily_demand_matrix(self):
+        """
+        Ma trận nhu cầu theo ngày (số sản phẩm x số ngày có giao dịch), ngày sản phẩm không bán = 0
+
+        Chỉ giữ các ngày có giao dịch trong dữ liệu, để khoảng trống giữa các cửa sổ lọc
+        (ví dụ tháng 12 của hai năm) không bị mô phỏng như những ngày không có nhu cầu.
+
+        Returns:
+        --------
+        tuple: (DataFrame StockCode, Description - mỗi StockCode một dòng; ndarray nhu cầu)
+        """
+        days = pd.to_datetime(self.df["InvoiceDate"]).dt.normalize()
+        day_index, unique_days = pd.factorize(days, sort=True)
+        codes, keys = pd.factorize(self.df["StockCode"], sort=True)
+        n_days = len(unique_days)
+        demand = np.bincount(
+            codes * n_days + day_index, weights=self.df["Quantity"].to_numpy(dtype=float), minlength=len(keys) * n_days
+        ).reshape(len(keys), n_days)
+        key_frame = pd.DataFrame({"StockCode": np.asarray(keys), "Description": self._descriptions(keys)})
+        return key_frame, demand
+
+    def optimize_policies(self, holding_cost, ordering_cost, lead_time, stockout_cost, n_jobs=1):
+        """
+        Mô phỏng lại nhu cầu lịch sử và chọn chính sách (s, S) / (R, Q) tốt nhất cho từng sản phẩm
+
+        Returns:
+        --------
+        DataFrame: Kết quả của inventory_policy_model.optimize_policies
+        """
+        keys, demand = self.daily_demand_matrix()
+        return optimize_policies(keys, demand, lead_time, holding_cost, ordering_cost, stockout_cost, n_jobs=n_jobs)
+
+    def plan(self, holding_cost, ordering_cost, lead_time, default_demand=None, stochastic=False,
+             service_level=0.95, lead_time_std=0.0, n_draws=10000, seed=None):
+        """
+        Kế hoạch tồn kho cho toàn bộ sản phẩm trong dữ liệu
+
+        Parameters:
+        -----------
+        holding_cost, ordering_cost, lead_time : float hoặc ndarray
+            Như eoq_plan; mảng phải theo thứ tự dòng của demand_summary
+        default_demand : float, optional
+            Nhu cầu dùng cho sản phẩm không có nhu cầu dương trong dữ liệu
+        stochastic : bool
+            Tính tồn kho an toàn bằng mô phỏng Monte Carlo (simulate_safety_stock)
+        service_level, lead_time_std, n_draws, seed :
+            Tham số của simulate_safety_stock, chỉ dùng khi stochastic=True
+
+        Returns:
+        --------
+        DataFrame: demand_summary kèm EOQ, Reorder_Point, Cycle_Stock, Orders_Per_Month, Inventory_Cost
+        (thêm Daily_Mean, Daily_Std, Safety_Stock khi stochastic=True; Reorder_Point khi đó gồm cả tồn kho an toàn)
+        """
+        summary = self.demand_summary()
+        if summary.empty:
+            return summary
+
+        demand = summary["Monthly_Demand"].to_numpy(dtype=float)
+        if default_demand is not None:
+            demand = np.where(demand > 0, demand, default_demand)
+
+        result = eoq_plan(demand, holding_cost, ordering_cost, lead_time)
+        summary["EOQ"] = np.ceil(result["eoq"]).astype(int)
+        summary["Reorder_Point"] = np.ceil(result["reorder_point"]).astype(int)
+        summary["Cycle_Stock"] = result["cycle_stock"]
+        summary["Orders_Per_Month"] = result["orders_per_period"]
+        summary["Inventory_Cost"] = result["total_cost"]
+
+        if stochastic:
+            stats = self.daily_demand_stats()
+            summary = summary.merge(stats.drop(columns="Description"), on="StockCode", how="left")
+            simulated = simulate_safety_stock(
+                summary["Daily_Mean"].to_numpy(), summary["Daily_Std"].to_numpy(), lead_time,
+                service_level=service_level, lead_time_std=lead_time_std, n_draws=n_draws, seed=seed
+            )
+            summary["Safety_Stock"] = np.ceil(simulated["safety_stock"]).astype(int)
+            summary["Reorder_Point"] = np.ceil(simulated["reorder_point"]).astype(int)
+            summary["Inventory_Cost"] = summary["Inventory_Cost"] + np.asarray(holding_cost) * summary["Safety_Stock"]
+        return summary
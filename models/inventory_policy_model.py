@@ -0,0 +1,194 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Hệ số nhân của lưới chính sách: điểm đặt hàng theo nhu cầu trong thời gian giao hàng,
+# lượng đặt theo EOQ
+REORDER_FACTORS = (0.0, 0.5, 1.0, 1.25, 1.5, 2.0, 2.5, 3.0)
+QUANTITY_FACTORS = (0.5, 0.75, 1.0, 1.5, 2.0)
+POLICY_NAMES = ("(s, S)", "(R, Q)")
+
+
+def simulate_policies(demand, reorder_point, order_up_to, order_qty, lead_time, holding_cost, ordering_cost,
+                      stockout_cost, days_per_period=30):
+    """
+    Mô phỏng lại nhu cầu lịch sử theo ngày dưới nhiều chính sách tồn kho cùng lúc
+
+    Chính sách (s, S): khi vị thế tồn kho <= s thì đặt hàng lên tới S.
+    Chính sách (R, Q): khi vị thế tồn kho <= R thì đặt cố định Q đơn vị.
+    Hàng thiếu bị mất (không giao bù). Vòng lặp chỉ chạy theo ngày; mọi sản phẩm x chính sách
+    được cập nhật bằng phép toán mảng.
+
+    Parameters:
+    -----------
+    demand : ndarray
+        Nhu cầu theo ngày (số sản phẩm x số ngày)
+    reorder_point : ndarray
+        Điểm đặt hàng s hoặc R (số sản phẩm x số chính sách)
+    order_up_to : ndarray
+        Mức S; NaN với chính sách (R, Q)
+    order_qty : ndarray
+        Lượng đặt Q; bỏ qua với chính sách (s, S)
+    lead_time : int
+        Thời gian giao hàng (ngày)
+    holding_cost : float
+        Chi phí lưu kho / đơn vị / kỳ (days_per_period ngày)
+    ordering_cost : float
+        Chi phí đặt hàng / lần
+    stockout_cost : float
+        Chi phí thiếu hàng / đơn vị nhu cầu bị mất
+
+    Returns:
+    --------
+    dict: Các ma trận (số sản phẩm x số chính sách) holding, ordering, stockout, total, fill_rate, orders
+    """
+    demand = np.asarray(demand, dtype=float)
+    lead_time = max(int(round(lead_time)), 0)
+    fixed_qty = np.isnan(order_up_to)
+    shape = reorder_point.shape
+
+    # Bắt đầu với kho đầy (mức S, hoặc R + Q)
+    on_hand = np.where(fixed_qty, reorder_point + order_qty, order_up_to).astype(float)
+    on_order = np.zeros(shape)
+    pipeline = np.zeros(shape + (lead_time + 1,))
+    held = np.zeros(shape)
+    lost = np.zeros(shape)
+    orders = np.zeros(shape)
+
+    for t in range(demand.shape[1]):
+        slot = t % (lead_time + 1)
+        arriving = pipeline[..., slot]
+        on_hand += arriving
+        on_order -= arriving
+        pipeline[..., slot] = 0
+
+        day_demand = demand[:, t, None]
+        served = np.minimum(on_hand, day_demand)
+        lost += day_demand - served
+        on_hand -= served
+        held += on_hand
+
+        position = on_hand + on_order
+        qty = np.where(fixed_qty, order_qty, order_up_to - position)
+        qty = np.where((position <= reorder_point) & (qty > 0), qty, 0.0)
+        orders += qty > 0
+        pipeline[..., (t + lead_time) % (lead_time + 1)] += qty
+        on_order += qty
+
+    total_demand = demand.sum(axis=1)[:, None]
+    holding = held * holding_cost / days_per_period
+    ordering = orders * ordering_cost
+    stockout = lost * stockout_cost
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fill_rate = np.where(total_demand > 0, 1 - lost / total_demand, 1.0)
+    return {
+        "holding": holding,
+        "ordering": ordering,
+        "stockout": stockout,
+        "total": holding + ordering + stockout,
+        "fill_rate": fill_rate,
+        "orders": orders,
+    }
+
+
+def policy_grid(demand, lead_time, holding_cost, ordering_cost, days_per_period=30):
+    """
+    Lưới chính sách ứng viên cho từng sản phẩm, theo nhu cầu trong thời gian giao hàng và EOQ
+
+    Returns:
+    --------
+    tuple: (policy_type, reorder_point, order_up_to, order_qty); policy_type có dạng (số chính sách,),
+    các phần còn lại có dạng (số sản phẩm x số chính sách)
+    """
+    daily_mean = np.asarray(demand, dtype=float).mean(axis=1)
+    lead_time_demand = daily_mean * max(lead_time, 1)
+    eoq = np.sqrt(2 * daily_mean * days_per_period * ordering_cost / holding_cost)
+
+    reorder, quantity = np.meshgrid(REORDER_FACTORS, QUANTITY_FACTORS, indexing="ij")
+    reorder, quantity = reorder.ravel(), quantity.ravel()
+    s = np.ceil(lead_time_demand[:, None] * reorder)
+    q = np.maximum(np.ceil(eoq[:, None] * quantity), 1)
+
+    n = len(reorder)
+    policy_type = np.repeat(np.arange(len(POLICY_NAMES)), n)
+    reorder_point = np.concatenate([s, s], axis=1)
+    order_up_to = np.concatenate([s + q, np.full(s.shape, np.nan)], axis=1)
+    order_qty = np.concatenate([q, q], axis=1)
+    return policy_type, reorder_point, order_up_to, order_qty
+
+
+def _optimize_chunk(demand, lead_time, holding_cost, ordering_cost, stockout_cost):
+    """Chọn chính sách chi phí thấp nhất cho một khối sản phẩm"""
+    policy_type, reorder_point, order_up_to, order_qty = policy_grid(demand, lead_time, holding_cost, ordering_cost)
+    result = simulate_policies(demand, reorder_point, order_up_to, order_qty, lead_time,
+                               holding_cost, ordering_cost, stockout_cost)
+    best = np.argmin(result["total"], axis=1)
+    rows = np.arange(len(demand))
+
+    # Chính sách EOQ cơ bản (R = nhu cầu trong thời gian giao hàng, Q = EOQ) để so sánh
+    baseline = policy_type.size // 2 + REORDER_FACTORS.index(1.0) * len(QUANTITY_FACTORS) + QUANTITY_FACTORS.index(1.0)
+    return {
+        "policy": policy_type[best],
+        "reorder_point": reorder_point[rows, best],
+        "order_up_to": order_up_to[rows, best],
+        "order_qty": order_qty[rows, best],
+        "holding": result["holding"][rows, best],
+        "ordering": result["ordering"][rows, best],
+        "stockout": result["stockout"][rows, best],
+        "total": result["total"][rows, best],
+        "fill_rate": result["fill_rate"][rows, best],
+        "baseline_total": result["total"][:, baseline],
+    }
+
+
+def optimize_policies(keys, demand, lead_time, holding_cost, ordering_cost, stockout_cost, n_jobs=1, chunk_size=250):
+    """
+    Tìm chính sách (s, S) / (R, Q) có tổng chi phí lưu kho + đặt hàng + thiếu hàng thấp nhất cho từng sản phẩm
+
+    Parameters:
+    -----------
+    keys : DataFrame
+        Khóa sản phẩm, theo thứ tự dòng của demand
+    demand : ndarray
+        Nhu cầu theo ngày (số sản phẩm x số ngày)
+    lead_time, holding_cost, ordering_cost, stockout_cost :
+        Như simulate_policies
+    n_jobs : int
+        Số tiến trình song song (chia theo khối sản phẩm)
+    chunk_size : int
+        Số sản phẩm mỗi khối
+
+    Returns:
+    --------
+    DataFrame: keys kèm Policy, Reorder_Level, Order_Up_To, Order_Qty, Holding_Cost_Total,
+    Ordering_Cost_Total, Stockout_Cost_Total, Total_Cost, Fill_Rate, EOQ_Policy_Cost, Saving
+    """
+    if holding_cost <= 0 or ordering_cost < 0 or stockout_cost < 0:
+        raise ValueError("Chi phí lưu kho phải dương, chi phí đặt hàng và thiếu hàng không được âm")
+
+    demand = np.asarray(demand, dtype=float)
+    chunks = [demand[start:start + chunk_size] for start in range(0, len(demand), chunk_size)]
+    args = (lead_time, holding_cost, ordering_cost, stockout_cost)
+    if n_jobs > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            parts = list(executor.map(_optimize_chunk, chunks, *([a] * len(chunks) for a in args)))
+    else:
+        parts = [_optimize_chunk(chunk, *args) for chunk in chunks]
+
+    result = keys.reset_index(drop=True).copy()
+    if not parts:
+        return result
+    merged = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+    result["Policy"] = np.asarray(POLICY_NAMES)[merged["policy"]]
+    result["Reorder_Level"] = merged["reorder_point"]
+    result["Order_Up_To"] = merged["order_up_to"]
+    result["Order_Qty"] = np.where(np.isnan(merged["order_up_to"]), merged["order_qty"], np.nan)
+    result["Holding_Cost_Total"] = merged["holding"]
+    result["Ordering_Cost_Total"] = merged["ordering"]
+    result["Stockout_Cost_Total"] = merged["stockout"]
+    result["Total_Cost"] = merged["total"]
+    result["Fill_Rate"] = merged["fill_rate"]
+    result["EOQ_Policy_Cost"] = merged["baseline_total"]
+    result["Saving"] = merged["baseline_total"] - merged["total"]
+    return result
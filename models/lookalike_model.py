@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import StandardScaler
+
+
+class LookalikeIndex:
+    """
+    Chỉ mục tìm khách hàng tương tự (lookalike) theo RFM và cơ cấu sản phẩm đã mua
+
+    Mỗi khách hàng được biểu diễn bằng một vector đã chuẩn hóa độ dài gồm:
+    - RFM chuẩn hóa (Frequency, Monetary lấy log trước)
+    - Nhúng cơ cấu sản phẩm: tỷ trọng doanh thu theo sản phẩm, giảm chiều bằng TruncatedSVD
+    Độ tương tự là cosine, tính bằng tích ma trận theo khối (tìm kiếm chính xác, không xấp xỉ).
+    """
+
+    def __init__(self, df, rfm, n_components=16, mix_weight=1.0, random_state=42):
+        """
+        Parameters:
+        -----------
+        df : DataFrame
+            Giao dịch đã tiền xử lý (CustomerID, StockCode, Revenue)
+        rfm : DataFrame
+            Kết quả RFMModel.calculate_rfm
+        n_components : int
+            Số chiều nhúng cơ cấu sản phẩm
+        mix_weight : float
+            Trọng số của phần cơ cấu sản phẩm so với phần RFM
+        """
+        if rfm.empty:
+            raise ValueError("Dữ liệu RFM rỗng")
+
+        self.rfm = rfm.reset_index(drop=True)
+        customer_index = pd.Index(self.rfm["CustomerID"])
+
+        rfm_values = np.column_stack([
+            self.rfm["Recency"].to_numpy(dtype=float),
+            np.log1p(self.rfm["Frequency"].to_numpy(dtype=float)),
+            np.log1p(np.maximum(self.rfm["Monetary"].to_numpy(dtype=float), 0)),
+        ])
+        rfm_part = StandardScaler().fit_transform(rfm_values)
+        rfm_part /= np.sqrt(rfm_part.shape[1])
+
+        # Ma trận thưa khách hàng x sản phẩm của tỷ trọng doanh thu
+        data = df[df["CustomerID"].isin(customer_index)]
+        rows = customer_index.get_indexer(data["CustomerID"])
+        cols, _ = pd.factorize(data["StockCode"])
+        spend = sparse.csr_matrix(
+            (data["Revenue"].to_numpy(dtype=float), (rows, cols)),
+            shape=(len(customer_index), int(cols.max()) + 1 if len(cols) else 1),
+        )
+        totals = np.asarray(spend.sum(axis=1)).ravel()
+        share = sparse.diags(1 / np.where(totals > 0, totals, 1)) @ spend
+
+        n_components = min(n_components, max(min(share.shape) - 1, 1))
+        mix_part = TruncatedSVD(n_components=n_components, random_state=random_state).fit_transform(share)
+        norms = np.linalg.norm(mix_part, axis=1, keepdims=True)
+        mix_part = mix_part / np.where(norms > 0, norms, 1) * mix_weight
+
+        embedding = np.hstack([rfm_part, mix_part]).astype(np.float32)
+        norms = np.linalg.norm(embedding, axis=1, keepdims=True)
+        self.embedding = embedding / np.where(norms > 0, norms, 1)
+        self.customer_index = customer_index
+
+    def __len__(self):
+        return len(self.customer_index)
+
+    def query(self, seed_ids, k=20, exclude_seeds=True, block_size=50000):
+        """
+        k khách hàng giống nhất với một nhóm khách hàng mẫu
+
+        Độ tương tự của một khách hàng là cosine lớn nhất với bất kỳ khách hàng mẫu nào, nên
+        nhóm mẫu gồm nhiều kiểu khách hàng khác nhau vẫn được phản ánh đầy đủ.
+
+        Parameters:
+        -----------
+        seed_ids : list
+            Các CustomerID mẫu
+        k : int
+            Số khách hàng cần trả về
+        exclude_seeds : bool
+            Bỏ chính các khách hàng mẫu khỏi kết quả
+        block_size : int
+            Số khách hàng mỗi khối khi tính tích ma trận (giới hạn bộ nhớ)
+
+        Returns:
+        --------
+        DataFrame: CustomerID, Similarity, Nearest_Seed, Recency, Frequency, Monetary
+        """
+        seed_rows = self.customer_index.get_indexer(list(seed_ids))
+        seed_rows = seed_rows[seed_rows >= 0]
+        if len(seed_rows) == 0:
+            raise ValueError("Không tìm thấy khách hàng mẫu nào trong dữ liệu")
+
+        seeds = self.embedding[seed_rows]
+        best = np.empty(len(self), dtype=np.float32)
+        nearest = np.empty(len(self), dtype=np.int64)
+        for start in range(0, len(self), block_size):
+            scores = self.embedding[start:start + block_size] @ seeds.T
+            nearest[start:start + block_size] = np.argmax(scores, axis=1)
+            best[start:start + block_size] = scores[np.arange(len(scores)), nearest[start:start + block_size]]
+        if exclude_seeds:
+            best[seed_rows] = -np.inf
+
+        k = min(k, int(np.isfinite(best).sum()))
+        top = np.argpartition(-best, k - 1)[:k] if k > 0 else np.array([], dtype=np.int64)
+        top = top[np.argsort(-best[top], kind="stable")]
+
+        result = self.rfm.iloc[top][["CustomerID", "Recency", "Frequency", "Monetary"]].reset_index(drop=True)
+        result.insert(1, "Similarity", best[top])
+        result.insert(2, "Nearest_Seed", self.customer_index[seed_rows[nearest[top]]])
+        return result
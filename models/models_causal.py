@@ -1,18 +1,226 @@
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from scipy import stats
+from models.cube_model import MonthlyCube
+from models.synthetic_control_model import SyntheticControlModel
+from models.price_change_model import PriceChangeDetector
+
+
+def welch_ttest(pre, post):
+    """
+    Kiểm định Welch cho nhiều cặp (pre, post) cùng lúc
+
+    Parameters:
+    -----------
+    pre, post : ndarray
+        Ma trận (số cặp x số tháng), các ô không dùng được đệm bằng NaN
+
+    Returns:
+    --------
+    dict: Các mảng n_pre, n_post, pre_mean, post_mean, t_stat, df, p_value
+    (t_stat theo quy ước của stats.ttest_ind(pre, post))
+    """
+    n_pre = np.sum(~np.isnan(pre), axis=-1)
+    n_post = np.sum(~np.isnan(post), axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pre_mean = np.nansum(pre, axis=-1) / n_pre
+        post_mean = np.nansum(post, axis=-1) / n_post
+        pre_var = np.nansum((pre - pre_mean[..., None]) ** 2, axis=-1) / (n_pre - 1)
+        post_var = np.nansum((post - post_mean[..., None]) ** 2, axis=-1) / (n_post - 1)
+        se_pre = pre_var / n_pre
+        se_post = post_var / n_post
+        se = np.sqrt(se_pre + se_post)
+        t_stat = (pre_mean - post_mean) / se
+        dof = (se_pre + se_post) ** 2 / (se_pre ** 2 / (n_pre - 1) + se_post ** 2 / (n_post - 1))
+    p_value = 2 * stats.t.sf(np.abs(t_stat), dof)
+    return {
+        "n_pre": n_pre,
+        "n_post": n_post,
+        "pre_mean": pre_mean,
+        "post_mean": post_mean,
+        "t_stat": t_stat,
+        "df": dof,
+        "p_value": p_value,
+    }
+
+
+def _compact(values):
+    """Dồn các giá trị hợp lệ về đầu mỗi dòng (NaN ra cuối), trả về ma trận và số giá trị hợp lệ"""
+    order = np.argsort(np.isnan(values), axis=-1, kind="stable")
+    values = np.take_along_axis(values, order, axis=-1)
+    return values, np.sum(~np.isnan(values), axis=-1)
+
+
+def _placebo_matrix(n_pre, n_post, min_pre=2):
+    """
+    Ma trận trọng số (số mốc giả x n_pre) của kiểm định giả lập theo thời gian (placebo-in-time)
+
+    Mốc sự kiện giả được dời tới từng tháng j của giai đoạn trước (còn ít nhất min_pre tháng trước nó);
+    dòng j cho ra chênh lệch trung bình của tối đa n_post tháng từ j so với các tháng trước j,
+    chỉ dùng dữ liệu trước sự kiện thật.
+    """
+    events = np.arange(min_pre, n_pre)
+    weights = np.zeros((len(events), n_pre))
+    for row, j in enumerate(events):
+        length = min(n_post, n_pre - j)
+        weights[row, :j] = -1.0 / j
+        weights[row, j:j + length] = 1.0 / length
+    return weights
+
+
+def _block_bootstrap_matrix(rng, n_resamples, n, block_size):
+    """Ma trận đếm (số lần lấy mẫu x số tháng) của bootstrap khối dịch chuyển vòng trên n tháng"""
+    # Khối không dài quá nửa chuỗi, nếu không mọi mẫu lại đều chỉ là xoay vòng của chuỗi gốc
+    block = max(1, min(block_size, n // 2))
+    n_blocks = -(-n // block)
+    starts = rng.integers(0, n, (n_resamples, n_blocks, 1))
+    idx = ((starts + np.arange(block)) % n).reshape(n_resamples, -1)[:, :n]
+    counts = np.zeros((n_resamples, n))
+    np.add.at(counts, (np.arange(n_resamples)[:, None], idx), 1.0)
+    return counts
+
+
+def _resample_chunk(pre, post, n_resamples, block_size, interval, seed):
+    """
+    Kiểm định giả lập theo thời gian và bootstrap cho một khối cặp (pre, post)
+
+    Các cặp có cùng số tháng trước / sau dùng chung một tập mốc giả và mẫu bootstrap,
+    nên mọi lần lấy mẫu lại của cả nhóm là một phép nhân ma trận.
+    """
+    rng = np.random.default_rng(seed)
+    pre, n_pre = _compact(pre)
+    post, n_post = _compact(post)
+    n_pairs = len(pre)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        observed = np.nansum(post, axis=1) / n_post - np.nansum(pre, axis=1) / n_pre
+
+    placebo_p_value = np.full(n_pairs, np.nan)
+    n_placebo = np.zeros(n_pairs, dtype=int)
+    boot_p_value = np.full(n_pairs, np.nan)
+    boot_lower = np.full(n_pairs, np.nan)
+    boot_upper = np.full(n_pairs, np.nan)
+    tail = (1 - interval) / 2
+
+    groups = pd.DataFrame({"n_pre": n_pre, "n_post": n_post}).groupby(["n_pre", "n_post"]).indices
+    for (k_pre, k_post), rows in groups.items():
+        if k_pre < 2 or k_post < 1:
+            continue
+        pre_values = pre[rows, :k_pre]
+        post_values = post[rows, :k_post]
+
+        # Giả lập theo thời gian: so chênh lệch thật với chênh lệch tại các mốc giả trong giai đoạn trước
+        weights = _placebo_matrix(k_pre, k_post)
+        if len(weights):
+            placebo_stat = pre_values @ weights.T
+            exceed = np.sum(np.abs(placebo_stat) >= np.abs(observed[rows])[:, None] - 1e-9, axis=1)
+            placebo_p_value[rows] = (exceed + 1) / (len(weights) + 1)
+            n_placebo[rows] = len(weights)
+
+        # Bootstrap khối trong từng giai đoạn để giữ tương quan giữa các tháng liền kề
+        boot_stat = (post_values @ _block_bootstrap_matrix(rng, n_resamples, k_post, block_size).T / k_post
+                     - pre_values @ _block_bootstrap_matrix(rng, n_resamples, k_pre, block_size).T / k_pre)
+        boot_lower[rows], boot_upper[rows] = np.quantile(boot_stat, [tail, 1 - tail], axis=1)
+        below = (np.sum(boot_stat <= 0, axis=1) + 1) / (n_resamples + 1)
+        above = (np.sum(boot_stat >= 0, axis=1) + 1) / (n_resamples + 1)
+        boot_p_value[rows] = np.minimum(1.0, 2 * np.minimum(below, above))
+
+    return {
+        "impact": observed,
+        "placebo_p_value": placebo_p_value,
+        "n_placebo": n_placebo,
+        "boot_p_value": boot_p_value,
+        "boot_lower": boot_lower,
+        "boot_upper": boot_upper,
+    }
+
+
+def resampling_test(pre, post, n_resamples=10000, block_size=2, interval=0.95, seed=None, n_jobs=1,
+                    max_elements=5_000_000):
+    """
+    Kiểm định ý nghĩa bằng lấy mẫu lại cho nhiều cặp (pre, post) cùng lúc
+
+    Với 3-6 điểm tháng, p-value của t-test phụ thuộc mạnh vào giả định phân phối chuẩn.
+    Hàm này tính p-value giả lập theo thời gian (placebo-in-time: dời mốc sự kiện qua từng tháng
+    của giai đoạn trước và so chênh lệch thật với các chênh lệch giả) và khoảng tin cậy bootstrap
+    khối cho chênh lệch trung bình, không cần giả định đó.
+
+    p-value giả lập nhỏ nhất đạt được là 1 / (số mốc giả + 1): với 6 tháng trước sự kiện chỉ có
+    4 mốc giả (p >= 0.2), nên cần giai đoạn trước dài hơn nếu muốn kiểm định này có sức mạnh.
+
+    Parameters:
+    -----------
+    pre, post : ndarray
+        Ma trận (số cặp x số tháng) hoặc vector một chuỗi, các ô không dùng được đệm bằng NaN
+    n_resamples : int
+        Số lần lấy mẫu lại bootstrap cho mỗi cặp
+    block_size : int
+        Độ dài khối của bootstrap khối dịch chuyển
+    interval : float
+        Mức tin cậy của khoảng bootstrap
+    seed : int, optional
+        Hạt giống ngẫu nhiên để tái lập kết quả
+    n_jobs : int
+        Số tiến trình song song khi có nhiều khối cặp
+    max_elements : int
+        Số phần tử tối đa của ma trận (số cặp x số lần lấy mẫu), quyết định kích thước mỗi khối cặp
+
+    Returns:
+    --------
+    dict: Các mảng impact, placebo_p_value, n_placebo, boot_p_value, boot_lower, boot_upper
+    (vô hướng nếu đầu vào là vector)
+    """
+    pre = np.asarray(pre, dtype=float)
+    post = np.asarray(post, dtype=float)
+    single = pre.ndim == 1
+    pre, post = np.atleast_2d(pre), np.atleast_2d(post)
+    if len(pre) != len(post):
+        raise ValueError("Số dòng của pre và post phải bằng nhau")
+    if n_resamples < 1 or block_size < 1:
+        raise ValueError("n_resamples và block_size phải lớn hơn 0")
+
+    chunk = max(1, max_elements // n_resamples)
+    bounds = [(start, min(start + chunk, len(pre))) for start in range(0, len(pre), chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(bounds))
+    args = [(pre[a:b], post[a:b], n_resamples, block_size, interval, s) for (a, b), s in zip(bounds, seeds)]
+
+    if n_jobs > 1 and len(args) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            parts = list(executor.map(_resample_chunk, *zip(*args)))
+    else:
+        parts = [_resample_chunk(*a) for a in args]
+
+    keys = ["impact", "placebo_p_value", "n_placebo", "boot_p_value", "boot_lower", "boot_upper"]
+    if not parts:
+        return {key: np.empty(0) for key in keys}
+    result = {key: np.concatenate([part[key] for part in parts]) for key in keys}
+    if single:
+        result = {key: float(value[0]) for key, value in result.items()}
+    return result
+
 
 class RevenueCausalImpactModel:
     def __init__(self, data):
         self.df = data
+        self._cube = None
+        self._synthetic = None
 
     def process_data(self):
         self.df["InvoiceDate"] = pd.to_datetime(self.df["InvoiceDate"], errors="coerce")
         self.df.dropna(subset=["InvoiceDate", "StockCode", "Quantity", "UnitPrice"], inplace=True)
         self.df["Month"] = self.df["InvoiceDate"].dt.to_period("M").dt.to_timestamp()
         self.df["Revenue"] = self.df["Quantity"] * self.df["UnitPrice"]
+        self._cube = None
+        self._synthetic = None
+
+    def monthly_cube(self):
+        """Khối doanh thu / số lượng / giá theo tháng của mọi cặp (StockCode, Country), chỉ tính một lần"""
+        if self._cube is None:
+            self._cube = MonthlyCube.from_frame(self.df)
+        return self._cube
 
-    def causal_impact(self, stock_code, country, event_date, pre_period_months=6, post_period_months=3):
+    def causal_impact(self, stock_code, country, event_date, pre_period_months=6, post_period_months=3,
+                      n_resamples=10000, seed=0):
         filtered_df = self.df[(self.df["StockCode"] == stock_code) & (self.df["Country"] == country)]
         if filtered_df.empty:
             return None
@@ -37,13 +245,16 @@ class RevenueCausalImpactModel:
         # Tạo dữ liệu pre và post
         pre_data = monthly.iloc[pre_start:event_idx]["Revenue"].values
         post_data = monthly.iloc[event_idx:post_end+1]["Revenue"].values
-        # Thực hiện t-test để so sánh
-        t_stat, p_value = stats.ttest_ind(pre_data, post_data)
+        # Kiểm định Welch, giống lưới kịch bản và phân tích hàng loạt
+        test = welch_ttest(pre_data.astype(float), post_data.astype(float))
+        t_stat, p_value = float(test["t_stat"]), float(test["p_value"])
         # Tính toán tác động
         pre_mean = np.mean(pre_data)
         post_mean = np.mean(post_data)
         impact = post_mean - pre_mean
         impact_pct = (impact / pre_mean) * 100 if pre_mean != 0 else 0
+        # Ý nghĩa thống kê bằng lấy mẫu lại, không dựa vào giả định phân phối chuẩn của t-test
+        resampled = resampling_test(pre_data, post_data, n_resamples=n_resamples, seed=seed)
         # Tạo kết quả mô phỏng CausalImpact
         result = {
             "pre_data": pre_data,
@@ -54,7 +265,178 @@ class RevenueCausalImpactModel:
             "t_stat": t_stat,
             "pre_mean": pre_mean,
             "post_mean": post_mean,
-            "is_significant": p_value < 0.05
+            "is_significant": p_value < 0.05,
+            "placebo_p_value": resampled["placebo_p_value"],
+            "n_placebo": int(resampled["n_placebo"]),
+            "boot_p_value": resampled["boot_p_value"],
+            "boot_lower": resampled["boot_lower"],
+            "boot_upper": resampled["boot_upper"],
         }
         return result, monthly.reset_index()
-    
\ No newline at end of file
+
+    def scenario_grid(self, stock_code, country, percent_options, pre_period_months=6, post_period_months=3,
+                      n_resamples=10000, seed=0):
+        """
+        Đánh giá mọi kịch bản (mức thay đổi giá x tháng thay đổi) của một chuỗi trong một lượt
+
+        Doanh thu sau sự kiện của kịch bản được nhân với hệ số giá (1 + % thay đổi), tức giả định
+        số lượng bán không đổi. Các giai đoạn trước / sau giống causal_impact (chỉ các tháng có giao dịch).
+
+        Parameters:
+        -----------
+        stock_code : str
+            Mã sản phẩm
+        country : str
+            Quốc gia
+        percent_options : list
+            Các mức thay đổi giá (%)
+        pre_period_months, post_period_months : int
+            Như causal_impact
+        n_resamples : int
+            Số lần lấy mẫu lại bootstrap
+        seed : int
+            Hạt giống ngẫu nhiên, cố định để kết quả tra cứu ổn định giữa các lần chạy
+
+        Returns:
+        --------
+        DataFrame: Mỗi dòng một kịch bản với percent_change, event_date, n_pre, n_post, pre_mean,
+        post_mean, impact, impact_pct, t_stat, p_value, placebo_p_value, boot_lower, boot_upper, is_significant
+        """
+        filtered_df = self.df[(self.df["StockCode"] == stock_code) & (self.df["Country"] == country)]
+        revenue = filtered_df.groupby("Month")["Revenue"].sum().sort_index()
+        n = len(revenue)
+        # Tháng sự kiện cần ít nhất 3 tháng trước và 2 tháng tính từ tháng sự kiện
+        # (Welch cần phương sai của giai đoạn sau), nên tháng cuối cùng không thể là tháng sự kiện
+        events = np.arange(3, n - 1)
+        if len(events) == 0 or len(percent_options) == 0:
+            return pd.DataFrame()
+
+        values = revenue.to_numpy(dtype=float)
+        pre_idx = events[:, None] + np.arange(-pre_period_months, 0)
+        post_idx = events[:, None] + np.arange(0, post_period_months + 1)
+        pre = np.where(pre_idx >= 0, values[np.clip(pre_idx, 0, n - 1)], np.nan)
+        post = np.where(post_idx < n, values[np.clip(post_idx, 0, n - 1)], np.nan)
+
+        # Trục kịch bản: (số mức giá, số tháng sự kiện, số tháng)
+        factors = 1 + np.asarray(percent_options, dtype=float) / 100
+        pre = np.broadcast_to(pre, (len(factors),) + pre.shape).reshape(-1, pre.shape[1])
+        post = (factors[:, None, None] * post).reshape(-1, post.shape[1])
+
+        test = welch_ttest(pre, post)
+        resampled = resampling_test(pre, post, n_resamples=n_resamples, seed=seed)
+        impact = test["post_mean"] - test["pre_mean"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            impact_pct = np.where(test["pre_mean"] != 0, impact / test["pre_mean"] * 100, 0.0)
+
+        return pd.DataFrame({
+            "percent_change": np.repeat(percent_options, len(events)),
+            "event_date": np.tile(revenue.index[events], len(factors)),
+            "n_pre": test["n_pre"],
+            "n_post": test["n_post"],
+            "pre_mean": test["pre_mean"],
+            "post_mean": test["post_mean"],
+            "impact": impact,
+            "impact_pct": impact_pct,
+            "t_stat": test["t_stat"],
+            "p_value": test["p_value"],
+            "placebo_p_value": resampled["placebo_p_value"],
+            "boot_lower": resampled["boot_lower"],
+            "boot_upper": resampled["boot_upper"],
+            "is_significant": test["p_value"] < 0.05,
+        })
+
+    def batch_causal_impact(self, events, pre_period_months=6, post_period_months=3, min_pre_points=3,
+                            n_resamples=0, n_jobs=1, seed=0):
+        """
+        Đánh giá tác động cho nhiều cặp (chuỗi, sự kiện) cùng lúc bằng kiểm định Welch vector hóa
+
+        Khác với causal_impact (chỉ dùng các tháng có giao dịch), bản hàng loạt dùng lưới tháng
+        liên tục của khối dữ liệu: tháng không bán được tính doanh thu bằng 0.
+
+        Parameters:
+        -----------
+        events : DataFrame
+            Các cột StockCode, Country, event_date
+        pre_period_months : int
+            Số tháng tối đa trước sự kiện
+        post_period_months : int
+            Số tháng sau sự kiện (không tính tháng sự kiện)
+        min_pre_points : int
+            Số tháng tối thiểu trước sự kiện để kết quả hợp lệ
+        n_resamples : int
+            Số lần lấy mẫu lại bootstrap (0 để bỏ qua cả kiểm định lấy mẫu lại)
+        n_jobs : int
+            Số tiến trình song song cho phần lấy mẫu lại
+        seed : int
+            Hạt giống ngẫu nhiên, cố định để kết quả giống nhau giữa các lần chạy lại
+
+        Returns:
+        --------
+        DataFrame: Mỗi dòng một sự kiện với n_pre, n_post, pre_mean, post_mean, impact,
+        impact_pct, t_stat, df, p_value, is_significant, valid
+        (thêm placebo_p_value, boot_p_value, boot_lower, boot_upper khi n_resamples > 0)
+        """
+        cube = self.monthly_cube()
+        events = events.reset_index(drop=True)
+
+        rows = pd.MultiIndex.from_frame(cube.keys).get_indexer(pd.MultiIndex.from_frame(events[["StockCode", "Country"]]))
+        event_months = pd.to_datetime(events["event_date"]).dt.to_period("M").dt.to_timestamp()
+        cols = cube.months.get_indexer(event_months)
+        found = (rows >= 0) & (cols >= 0)
+
+        # Ma trận chỉ số tháng cho giai đoạn trước / sau, các ô ngoài khối được đệm NaN
+        pre_idx = cols[:, None] + np.arange(-pre_period_months, 0)
+        post_idx = cols[:, None] + np.arange(0, post_period_months + 1)
+        n_months = len(cube.months)
+        safe_rows = np.where(found, rows, 0)[:, None]
+
+        pre = cube.revenue[safe_rows, np.clip(pre_idx, 0, n_months - 1)]
+        pre[(pre_idx < 0) | ~found[:, None]] = np.nan
+        post = cube.revenue[safe_rows, np.clip(post_idx, 0, n_months - 1)]
+        post[(post_idx >= n_months) | ~found[:, None]] = np.nan
+
+        test = welch_ttest(pre, post)
+        impact = test["post_mean"] - test["pre_mean"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            impact_pct = np.where(test["pre_mean"] != 0, impact / test["pre_mean"] * 100, 0.0)
+
+        result = events[["StockCode", "Country", "event_date"]].copy()
+        for key in ["n_pre", "n_post", "pre_mean", "post_mean"]:
+            result[key] = test[key]
+        result["impact"] = impact
+        result["impact_pct"] = impact_pct
+        result["t_stat"] = test["t_stat"]
+        result["df"] = test["df"]
+        result["p_value"] = test["p_value"]
+        result["valid"] = found & (test["n_pre"] >= min_pre_points) & (test["n_post"] >= 2)
+        result["is_significant"] = result["valid"] & (result["p_value"] < 0.05)
+
+        if n_resamples > 0:
+            resampled = resampling_test(pre, post, n_resamples=n_resamples, n_jobs=n_jobs, seed=seed)
+            for key in ["placebo_p_value", "boot_p_value", "boot_lower", "boot_upper"]:
+                result[key] = resampled[key]
+        return result
+
+    def synthetic_control(self, stock_code, country, event_date, treated_codes=None, max_donors=50):
+        """
+        Phân tích tác động bằng đối chứng tổng hợp từ các sản phẩm không bị thay đổi giá
+
+        Returns:
+        --------
+        dict hoặc None: Kết quả của SyntheticControlModel.estimate
+        """
+        # Giữ một đối tượng cho mỗi khối dữ liệu để ma trận ứng viên theo quốc gia được dùng lại
+        if self._synthetic is None or self._synthetic.cube is not self.monthly_cube():
+            self._synthetic = SyntheticControlModel(self.monthly_cube())
+        self._synthetic.max_donors = max_donors
+        return self._synthetic.estimate(stock_code, country, event_date, treated_codes)
+
+    def detect_price_events(self, window=3, min_change=0.1, min_obs=2):
+        """
+        Tự động tìm các lần thay đổi mức giá trên toàn danh mục
+
+        Returns:
+        --------
+        DataFrame: Kết quả của PriceChangeDetector.detect, có thể đưa thẳng vào batch_causal_impact
+        """
+        return PriceChangeDetector(self.monthly_cube()).detect(window=window, min_change=min_change, min_obs=min_obs)
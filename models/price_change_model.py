@@ -0,0 +1,94 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class PriceChangeDetector:
+    """
+    Phát hiện thay đổi mức giá (level shift) của mọi chuỗi (StockCode, Country) cùng lúc
+
+    Với mỗi tháng, so sánh trung vị giá của `window` tháng trước và `window` tháng sau
+    (kể cả tháng đang xét). Trung vị trượt ít bị ảnh hưởng bởi các tháng khuyến mãi lẻ tẻ,
+    và toàn bộ phép tính là phép toán mảng trên ma trận giá của khối dữ liệu.
+    """
+
+    def __init__(self, cube):
+        if cube.price is None:
+            raise ValueError("Khối dữ liệu không có cột UnitPrice để phát hiện thay đổi giá")
+        self.cube = cube
+
+    def shift_matrix(self, window=3, min_obs=2, statistic=np.nanmedian):
+        """
+        Trung vị (hoặc thống kê khác bỏ qua NaN) của giá trước / sau cho mọi chuỗi và mọi tháng
+
+        Returns:
+        --------
+        tuple: (before, after), mỗi phần tử là ma trận (số chuỗi x số tháng),
+        NaN khi một phía có ít hơn min_obs tháng có giá
+        """
+        price = self.cube.price
+        n_months = price.shape[1]
+        padded = np.pad(price, ((0, 0), (window, window)), constant_values=np.nan)
+        windows = sliding_window_view(padded, window, axis=1)
+        counts = np.sum(~np.isnan(windows), axis=2)
+        with warnings.catch_warnings():
+            # Cửa sổ toàn NaN (đầu / cuối chuỗi, tháng không bán) cho kết quả NaN là đúng ý
+            warnings.simplefilter("ignore", RuntimeWarning)
+            values = statistic(windows, axis=2)
+        values[counts < min_obs] = np.nan
+
+        # Cửa sổ bắt đầu tại cột t của mảng đã đệm là các tháng [t - window, t) của chuỗi gốc
+        before = values[:, :n_months]
+        after = values[:, window:window + n_months]
+        return before, after
+
+    def detect(self, window=3, min_change=0.1, min_obs=2):
+        """
+        Tìm các tháng có thay đổi mức giá
+
+        Parameters:
+        -----------
+        window : int
+            Số tháng mỗi phía dùng để tính trung vị
+        min_change : float
+            Thay đổi tương đối tối thiểu (0.1 = 10%)
+        min_obs : int
+            Số tháng có giá tối thiểu ở mỗi phía
+
+        Returns:
+        --------
+        DataFrame: Các cột StockCode, Country, event_date, old_price, new_price, magnitude
+        (thay đổi tương đối), sắp xếp theo độ lớn giảm dần; dùng trực tiếp cho batch_causal_impact
+        """
+        if window < 1 or min_obs < 1 or min_obs > window:
+            raise ValueError("Cần 1 <= min_obs <= window")
+
+        before, after = self.shift_matrix(window, min_obs)
+        mean_before, mean_after = self.shift_matrix(window, min_obs, statistic=np.nanmean)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            magnitude = after / before - 1
+            mean_magnitude = np.abs(mean_after / mean_before - 1)
+        candidate = np.abs(np.nan_to_num(magnitude)) >= min_change
+
+        # Trung vị không phân biệt được tháng đổi giá với tháng liền kề (lệch một tháng vẫn cho
+        # cùng trung vị), nên vị trí được chọn theo chênh lệch trung bình: chỉ giữ cực đại cục bộ
+        # trong khoảng +-(window - 1) tháng để mỗi lần đổi giá là một sự kiện
+        strength = np.where(candidate, np.nan_to_num(mean_magnitude), 0.0)
+        radius = window - 1
+        padded = np.pad(strength, ((0, 0), (radius, radius)))
+        local_max = sliding_window_view(padded, 2 * radius + 1, axis=1).max(axis=2)
+        # Khi nhiều tháng cùng đạt cực đại, lấy tháng đầu tiên
+        earlier = sliding_window_view(padded, radius + 1, axis=1)[:, :strength.shape[1], :radius]
+        first = ~np.any(earlier >= strength[..., None], axis=2) if radius > 0 else np.ones(strength.shape, dtype=bool)
+        is_event = candidate & (strength > 0) & (strength >= local_max) & first
+
+        rows, cols = np.nonzero(is_event)
+        events = self.cube.keys.iloc[rows].reset_index(drop=True)
+        events["event_date"] = self.cube.months[cols]
+        events["old_price"] = before[rows, cols]
+        events["new_price"] = after[rows, cols]
+        events["magnitude"] = magnitude[rows, cols]
+        order = np.argsort(-np.abs(events["magnitude"].to_numpy()), kind="stable")
+        return events.iloc[order].reset_index(drop=True)
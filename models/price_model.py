@@ -0,0 +1,320 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from models.data_model import add_calendar_columns, build_product_catalog
+
+
+def grouped_elasticity(groups, log_price, log_quantity, n_groups, fe_groups=None, n_fe=None, interval=0.95):
+    """
+    Hồi quy log(số lượng) theo log(giá) cho mọi nhóm cùng lúc bằng nghiệm đóng
+
+    Mọi tổng theo nhóm được tính bằng np.bincount (tổng theo đoạn), không có vòng lặp theo nhóm.
+    Nếu có fe_groups, log giá và log số lượng được khử trung bình theo hiệu ứng cố định
+    (ví dụ: từng sản phẩm x tháng) trước khi hồi quy, nên độ co giãn chỉ được xác định từ
+    biến động giá bên trong mỗi nhóm hiệu ứng cố định.
+
+    Parameters:
+    -----------
+    groups : ndarray
+        Chỉ số nhóm (0..n_groups-1) của từng quan sát
+    log_price, log_quantity : ndarray
+        log(giá) và log(số lượng) của từng quan sát
+    n_groups : int
+        Số nhóm
+    fe_groups : ndarray, optional
+        Chỉ số nhóm hiệu ứng cố định (lồng trong groups) của từng quan sát
+    n_fe : int, optional
+        Số nhóm hiệu ứng cố định
+    interval : float
+        Mức tin cậy của khoảng tin cậy
+
+    Returns:
+    --------
+    dict: Các mảng (n_groups,) elasticity, std_error, ci_lower, ci_upper, p_value, r_squared, n_obs, dof;
+    NaN khi nhóm không đủ quan sát hoặc giá không biến động
+    """
+    x = np.asarray(log_price, dtype=float)
+    y = np.asarray(log_quantity, dtype=float)
+
+    def demean(values, codes, size):
+        counts = np.bincount(codes, minlength=size)
+        means = np.bincount(codes, weights=values, minlength=size) / np.maximum(counts, 1)
+        return values - means[codes]
+
+    if fe_groups is None:
+        x, y = demean(x, groups, n_groups), demean(y, groups, n_groups)
+        n_params = np.bincount(groups, minlength=n_groups) > 0
+    else:
+        x, y = demean(x, fe_groups, n_fe), demean(y, fe_groups, n_fe)
+        # Mỗi nhóm hiệu ứng cố định tiêu tốn một bậc tự do của nhóm chứa nó
+        fe_owner = np.zeros(n_fe, dtype=np.int64)
+        fe_owner[fe_groups] = groups
+        n_params = np.bincount(fe_owner, minlength=n_groups)
+
+    n_obs = np.bincount(groups, minlength=n_groups)
+    sxx = np.bincount(groups, weights=x * x, minlength=n_groups)
+    sxy = np.bincount(groups, weights=x * y, minlength=n_groups)
+    syy = np.bincount(groups, weights=y * y, minlength=n_groups)
+    dof = n_obs - n_params - 1
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Ngưỡng nhỏ để loại nhóm có giá gần như không đổi (sai số làm tròn)
+        valid = (sxx > 1e-12) & (dof > 0)
+        beta = np.where(valid, sxy / sxx, np.nan)
+        rss = np.maximum(syy - beta * sxy, 0)
+        std_error = np.where(valid, np.sqrt(rss / np.maximum(dof, 1) / sxx), np.nan)
+        r_squared = np.where(valid & (syy > 0), 1 - rss / syy, np.nan)
+        t_stat = beta / std_error
+
+    t_crit = stats.t.ppf(0.5 + interval / 2, np.maximum(dof, 1))
+    p_value = 2 * stats.t.sf(np.abs(t_stat), np.maximum(dof, 1))
+    return {
+        "elasticity": beta,
+        "std_error": std_error,
+        "ci_lower": beta - t_crit * std_error,
+        "ci_upper": beta + t_crit * std_error,
+        "p_value": np.where(valid, p_value, np.nan),
+        "r_squared": r_squared,
+        "n_obs": n_obs,
+        "dof": dof,
+    }
+
+
+def optimal_prices(slope, current_price, base_quantity, unit_cost=None, max_change=0.2, n_grid=81):
+    """
+    Tìm giá tối ưu của mọi sản phẩm trên một lưới giá dày (số sản phẩm x số mức giá)
+
+    Đường cầu bán log: q(p) = base_quantity * exp(slope * (p - current_price)), slope < 0.
+    Với đường cầu co giãn không đổi, doanh thu tỷ lệ với p^(1 + e) nên luôn đơn điệu theo giá và
+    nghiệm luôn nằm ở biên; đường cầu bán log có cực đại doanh thu bên trong tại p = -1 / slope
+    (lợi nhuận gộp tại p = giá vốn - 1 / slope). Đường cầu chỉ đáng tin gần mức giá hiện tại, nên lưới
+    giá giới hạn trong +-max_change: nghiệm ở biên lưới nghĩa là điểm tối ưu nằm ngoài khoảng này.
+
+    Parameters:
+    -----------
+    slope, current_price, base_quantity : ndarray
+        Hệ số của giá trong hồi quy log(số lượng) theo giá, giá hiện tại và số lượng bán mỗi kỳ
+        tại giá hiện tại của từng sản phẩm
+    unit_cost : ndarray, optional
+        Giá vốn đơn vị; nếu có thì tối đa hóa lợi nhuận gộp, ngược lại tối đa hóa doanh thu
+    max_change : float
+        Mức thay đổi giá tối đa (0.2 = +-20%)
+    n_grid : int
+        Số mức giá trên lưới của mỗi sản phẩm
+
+    Returns:
+    --------
+    dict: Các mảng price, quantity, revenue, margin tại giá tối ưu và current_objective, objective
+    (giá trị mục tiêu tại giá hiện tại / giá tối ưu); NaN khi không có hệ số giá
+    """
+    if not 0 < max_change < 1:
+        raise ValueError("Mức thay đổi giá tối đa phải nằm trong khoảng (0, 1)")
+
+    slope = np.asarray(slope, dtype=float)
+    current_price = np.asarray(current_price, dtype=float)
+    base_quantity = np.asarray(base_quantity, dtype=float)
+    cost = np.zeros_like(current_price) if unit_cost is None else np.broadcast_to(np.asarray(unit_cost, dtype=float), current_price.shape)
+
+    # Lưới luôn chứa mức giá hiện tại (hệ số 1) để giá tối ưu không bao giờ kém giá hiện tại
+    ratios = np.union1d(np.linspace(1 - max_change, 1 + max_change, n_grid), [1.0])
+    prices = current_price[:, None] * ratios[None, :]
+    quantity = base_quantity[:, None] * np.exp(slope[:, None] * (prices - current_price[:, None]))
+    objective = (prices - cost[:, None]) * quantity
+
+    valid = np.isfinite(slope) & (current_price > 0)
+    best = np.argmax(np.where(valid[:, None], objective, -np.inf), axis=1)
+    rows = np.arange(len(best))
+    current = np.searchsorted(ratios, 1.0)
+
+    def pick(matrix):
+        return np.where(valid, matrix[rows, best], np.nan)
+
+    return {
+        "price": pick(prices),
+        "quantity": pick(quantity),
+        "revenue": pick(prices * quantity),
+        "margin": pick(objective) if unit_cost is not None else np.full(len(best), np.nan),
+        "current_objective": np.where(valid, objective[:, current], np.nan),
+        "objective": pick(objective),
+    }
+
+
+class PriceElasticityModel:
+    """
+    Ước lượng độ co giãn của cầu theo giá cho toàn bộ danh mục sản phẩm
+
+    Mỗi quan sát là tổng số lượng bán của một sản phẩm trong một ngày tại một mức giá.
+    Độ co giãn là hệ số của log(giá) trong hồi quy log(số lượng) của từng sản phẩm; hệ số giá
+    (Price_Slope) của hồi quy bán log log(số lượng) theo giá được dùng để tìm giá tối ưu.
+    """
+
+    def __init__(self, df):
+        df = add_calendar_columns(df.dropna(subset=["StockCode", "UnitPrice", "Quantity"]))
+        self.df = df[(df["Quantity"] > 0) & (df["UnitPrice"] > 0)]
+
+    def observations(self):
+        """Tổng số lượng theo (StockCode, ngày, giá) kèm năm / tháng để khử hiệu ứng cố định"""
+        day = self.df["InvoiceDate"].dt.normalize()
+        return (
+            self.df.assign(Day=day)
+            .groupby(["StockCode", "Year", "Month", "Day", "UnitPrice"], observed=True)["Quantity"]
+            .sum()
+            .reset_index()
+        )
+
+    def estimate(self, month_effects=False, interval=0.95, min_obs=5):
+        """
+        Độ co giãn giá của mọi sản phẩm trong một lần hồi quy theo nhóm
+
+        Parameters:
+        -----------
+        month_effects : bool
+            Thêm hiệu ứng cố định tháng (năm-tháng) riêng cho từng sản phẩm, loại bỏ xu hướng
+            và mùa vụ khỏi ước lượng
+        interval : float
+            Mức tin cậy của khoảng tin cậy
+        min_obs : int
+            Số quan sát tối thiểu để báo cáo độ co giãn
+
+        Returns:
+        --------
+        DataFrame: StockCode, Description, Elasticity, Std_Error, CI_Lower, CI_Upper, P_Value,
+        R_Squared, N_Obs, N_Prices, Price_Slope, Slope_P_Value; sắp xếp theo StockCode
+        """
+        if not 0 < interval < 1:
+            raise ValueError("Mức tin cậy phải nằm trong khoảng (0, 1)")
+
+        obs = self.observations()
+        if obs.empty:
+            raise ValueError("Không có dữ liệu giá và số lượng hợp lệ để ước lượng độ co giãn")
+
+        groups, codes = pd.factorize(obs["StockCode"], sort=True)
+        fe_groups, n_fe = None, None
+        if month_effects:
+            fe_groups, fe_keys = pd.MultiIndex.from_arrays(
+                [groups, obs["Year"].to_numpy(), obs["Month"].to_numpy()]
+            ).factorize()
+            n_fe = len(fe_keys)
+
+        price = obs["UnitPrice"].to_numpy(dtype=float)
+        log_quantity = np.log(obs["Quantity"].to_numpy(dtype=float))
+        fit = grouped_elasticity(groups, np.log(price), log_quantity, len(codes),
+                                 fe_groups=fe_groups, n_fe=n_fe, interval=interval)
+        # Cùng hồi quy theo nhóm nhưng với giá (không lấy log): đường cầu bán log cho tối ưu giá
+        semi_log = grouped_elasticity(groups, price, log_quantity, len(codes),
+                                      fe_groups=fe_groups, n_fe=n_fe, interval=interval)
+
+        n_prices = obs.drop_duplicates(["StockCode", "UnitPrice"]).groupby("StockCode", observed=True).size()
+        descriptions = pd.Series("", index=codes)
+        if "Description" in self.df.columns:
+            descriptions = build_product_catalog(self.df).set_index("StockCode")["Description"]
+
+        result = pd.DataFrame({
+            "StockCode": codes,
+            "Description": descriptions.reindex(codes).to_numpy(),
+            "Elasticity": fit["elasticity"],
+            "Std_Error": fit["std_error"],
+            "CI_Lower": fit["ci_lower"],
+            "CI_Upper": fit["ci_upper"],
+            "P_Value": fit["p_value"],
+            "R_Squared": fit["r_squared"],
+            "N_Obs": fit["n_obs"],
+            "N_Prices": n_prices.reindex(codes).to_numpy(),
+            "Price_Slope": semi_log["elasticity"],
+            "Slope_P_Value": semi_log["p_value"],
+        })
+        result.loc[result["N_Obs"] < min_obs, ["Elasticity", "Std_Error", "CI_Lower", "CI_Upper", "P_Value", "R_Squared",
+                                               "Price_Slope", "Slope_P_Value"]] = np.nan
+        return result
+
+    def reference_levels(self):
+        """
+        Giá hiện tại (giá trung bình của tháng bán gần nhất) và số lượng bán trung bình mỗi tháng
+
+        Returns:
+        --------
+        DataFrame: StockCode, Current_Price, Monthly_Quantity
+        """
+        monthly = (
+            self.df.groupby(["StockCode", "Year", "Month"], observed=True)
+            .agg(Quantity=("Quantity", "sum"), UnitPrice=("UnitPrice", "mean"))
+            .reset_index()
+        )
+        latest = monthly.drop_duplicates("StockCode", keep="last").set_index("StockCode")["UnitPrice"]
+        quantity = monthly.groupby("StockCode", observed=True)["Quantity"].mean()
+        return pd.DataFrame({
+            "StockCode": quantity.index,
+            "Current_Price": latest.reindex(quantity.index).to_numpy(),
+            "Monthly_Quantity": quantity.to_numpy(),
+        })
+
+    def recommend_prices(self, elasticity=None, cost_ratio=None, max_change=0.2, n_grid=81, alpha=0.05,
+                         month_effects=True):
+        """
+        Giá đề xuất cho toàn danh mục: tối đa hóa doanh thu (hoặc lợi nhuận gộp) theo đường cầu
+        bán log ước lượng của từng sản phẩm (xem optimal_prices)
+
+        Sản phẩm có hệ số giá không có ý nghĩa thống kê (p-value >= alpha) hoặc không âm (cầu tăng
+        theo giá, thường do yếu tố khác) được giữ giá hiện tại.
+
+        Parameters:
+        -----------
+        elasticity : DataFrame, optional
+            Kết quả estimate() đã tính sẵn (ví dụ lấy từ cache); None thì ước lượng lại
+        cost_ratio : float, optional
+            Giá vốn bằng cost_ratio x giá hiện tại; None thì tối đa hóa doanh thu
+        max_change, n_grid :
+            Như optimal_prices
+        alpha : float
+            Mức ý nghĩa của hệ số giá
+        month_effects : bool
+            Như estimate (chỉ dùng khi elasticity là None)
+
+        Returns:
+        --------
+        DataFrame: StockCode, Description, Elasticity, Price_Slope, Is_Significant, Current_Price,
+        Optimal_Price, Price_Change_Pct, At_Limit (giá tối ưu chạm biên +-max_change), Monthly_Quantity,
+        Expected_Quantity, Current_Revenue, Expected_Revenue, Revenue_Lift_Pct và (khi có cost_ratio)
+        Current_Margin, Expected_Margin, Margin_Lift_Pct
+        """
+        if cost_ratio is not None and not 0 <= cost_ratio < 1:
+            raise ValueError("Tỷ lệ giá vốn phải nằm trong khoảng [0, 1)")
+        if elasticity is None:
+            elasticity = self.estimate(month_effects=month_effects)
+
+        result = elasticity[["StockCode", "Description", "Elasticity", "Price_Slope", "Slope_P_Value"]].merge(
+            self.reference_levels(), on="StockCode", how="left"
+        )
+        significant = ((result["Slope_P_Value"] < alpha) & (result["Price_Slope"] < 0)).to_numpy()
+        price = result["Current_Price"].to_numpy(dtype=float)
+        quantity = result["Monthly_Quantity"].to_numpy(dtype=float)
+        fit = optimal_prices(
+            np.where(significant, result["Price_Slope"].to_numpy(dtype=float), np.nan),
+            price,
+            quantity,
+            unit_cost=None if cost_ratio is None else cost_ratio * price,
+            max_change=max_change,
+            n_grid=n_grid,
+        )
+
+        # Giữ giá hiện tại khi không có đường cầu đáng tin cậy
+        optimal = np.where(significant, fit["price"], price)
+        expected_quantity = np.where(significant, fit["quantity"], quantity)
+        result = result.drop(columns="Slope_P_Value").assign(Is_Significant=significant)
+        result["Optimal_Price"] = optimal
+        result["Price_Change_Pct"] = (optimal / price - 1) * 100
+        result["At_Limit"] = significant & (np.abs(optimal / price - 1) >= max_change - 1e-9)
+        result["Expected_Quantity"] = expected_quantity
+        result["Current_Revenue"] = price * quantity
+        result["Expected_Revenue"] = optimal * expected_quantity
+        result["Revenue_Lift_Pct"] = (result["Expected_Revenue"] / result["Current_Revenue"] - 1) * 100
+        if cost_ratio is not None:
+            cost = cost_ratio * price
+            result["Current_Margin"] = (price - cost) * quantity
+            result["Expected_Margin"] = (optimal - cost) * expected_quantity
+            result["Margin_Lift_Pct"] = (result["Expected_Margin"] / result["Current_Margin"] - 1) * 100
+        columns = ["StockCode", "Description", "Elasticity", "Price_Slope", "Is_Significant", "Current_Price",
+                   "Optimal_Price", "Price_Change_Pct", "At_Limit", "Monthly_Quantity", "Expected_Quantity", "Current_Revenue", "Expected_Revenue",
+                   "Revenue_Lift_Pct"]
+        return result[columns + [col for col in result.columns if col not in columns]]
@@ -1,4 +1,8 @@
+import numpy as np
 import pandas as pd
+from scipy import sparse
+from models.cube_model import MonthlyCube
+from models.batch_forecast_model import BatchForecastModel
 try:
     from prophet import Prophet
     PROPHET_AVAILABLE = True
@@ -6,9 +10,14 @@ except ImportError:
     PROPHET_AVAILABLE = False
 
 class RevenueForecastModel:
+    HIERARCHY_METHODS = ("bottom_up", "ols", "mint")
+    # Số tháng lịch gần nhất của khối dữ liệu dùng làm mốc so sánh (tháng không bán tính bằng 0)
+    RECENT_MONTHS = 3
+
     def __init__(self, df):
         self.df = df
         self.monthly_data = None
+        self._cube = None
 
     def process_data(self):
         # Chuyển cột ngày về datetime
@@ -23,36 +32,358 @@ class RevenueForecastModel:
 
         # Tạo cột tháng
         self.df['Month'] = self.df['Date'].dt.to_period('M').dt.to_timestamp()
+        self._cube = None
+
+    def monthly_cube(self):
+        """Khối doanh thu theo tháng của mọi cặp (StockCode, Country), chỉ tính một lần"""
+        if self._cube is None:
+            self._cube = MonthlyCube.from_frame(self.df)
+        return self._cube
+
+    def future_months(self, periods):
+        """Các tháng dự báo (đầu tháng) ngay sau tháng cuối cùng của khối dữ liệu"""
+        cube = self.monthly_cube()
+        return pd.date_range(start=cube.months[-1] + pd.DateOffset(months=1), periods=periods, freq="MS")
+
+    @classmethod
+    def recent_average(cls, revenue):
+        """Trung bình RECENT_MONTHS tháng lịch cuối của khối, cho một chuỗi hoặc ma trận chuỗi"""
+        return revenue[..., -cls.RECENT_MONTHS:].mean(axis=-1)
+
+    def series_history(self, row):
+        """Doanh thu theo tháng của một chuỗi từ lần bán đầu tiên (ds, y), tháng không bán = 0"""
+        cube = self.monthly_cube()
+        values = cube.revenue[row]
+        active = np.flatnonzero(values)
+        start = active[0] if len(active) else len(values)
+        return pd.DataFrame({"ds": cube.months[start:], "y": values[start:]})
 
     def forecast(self, stock_code, country, periods):
         if not PROPHET_AVAILABLE:
             return None, None
-            
-        # Lọc theo sản phẩm và quốc gia
-        df_filtered = self.df[(self.df['StockCode'] == stock_code) & (self.df['Country'] == country)]
 
-        if df_filtered.empty:
+        cube = self.monthly_cube()
+        row = cube.row_index(stock_code, country)
+        if row is None:
             return None, None
 
-        # Tổng hợp doanh thu theo tháng
-        monthly = df_filtered.groupby('Month')['Revenue'].sum().reset_index()
-        monthly.columns = ['ds', 'y']
-
-        if len(monthly) < 3:
+        # Cùng cách lấy lịch sử, tháng dự báo và mốc so sánh như forecast_all / kho dự báo
+        monthly = self.series_history(row)
+        if np.count_nonzero(monthly['y']) < 3:
             return None, None
 
         # Huấn luyện mô hình Prophet
         model = Prophet()
         model.fit(monthly)
+        forecast = model.predict(pd.DataFrame({'ds': self.future_months(periods)}))[['ds', 'yhat']]
 
-        # Tạo khoảng thời gian tương lai
-        future = model.make_future_dataframe(periods=periods, freq='M')
-        forecast = model.predict(future)
-
-        # Lấy các cột quan trọng và tính chênh lệch so với trung bình 3 tháng gần nhất
-        forecast = forecast[['ds', 'yhat']]
-        recent_avg = monthly['y'].tail(3).mean()
+        # Chênh lệch so với trung bình 3 tháng gần nhất
+        recent_avg = self.recent_average(cube.revenue[row])
         forecast['delta'] = forecast['yhat'] - recent_avg
-        forecast['pct_change'] = forecast['delta'] / recent_avg * 100
+        forecast['pct_change'] = forecast['delta'] / recent_avg * 100 if recent_avg != 0 else np.nan
+
+        return forecast, monthly
+
+    def forecast_all(self, periods, engine="holt", previous_state=None, previous_forecasts=None):
+        """
+        Dự báo cho toàn bộ các chuỗi (StockCode, Country), dùng cho tác vụ tính trước
+
+        Khi có trạng thái của lần chạy trước, mỗi chuỗi được xếp vào một trong ba nhóm:
+        - "unchanged": dữ liệu không đổi -> dùng lại trạng thái, không khớp lại
+        - "warm": chỉ được nối thêm tháng mới -> khởi động ấm từ tham số đã khớp
+        - "cold": chuỗi mới hoặc lịch sử bị sửa -> khớp lại từ đầu
+
+        Parameters:
+        -----------
+        periods : int
+            Số tháng cần dự báo
+        engine : str
+            "holt": mô hình Holt vector hóa, khớp mọi chuỗi trong một lần
+            "prophet": khớp Prophet cho từng chuỗi (chậm, chỉ nên chạy ngoài giao diện)
+        previous_state : DataFrame, optional
+            Trạng thái đã khớp của lần chạy trước (phần tử thứ hai của kết quả trả về)
+        previous_forecasts : DataFrame, optional
+            Dự báo của lần chạy trước, dùng lại cho các chuỗi Prophet không đổi
+
+        Returns:
+        --------
+        tuple: (DataFrame, DataFrame)
+            - Dự báo dạng dài với cột StockCode, Country, ds, yhat, yhat_lower, yhat_upper,
+              recent_avg, delta, pct_change, series_hash, last_month, engine
+            - Trạng thái đã khớp của từng chuỗi, kèm cột refresh cho biết nhóm cập nhật
+        """
+        cube = self.monthly_cube()
+        future = self.future_months(periods)
+        hashes = cube.series_hashes()
+        refresh, prev, prev_cols = self._classify_refresh(cube, engine, previous_state)
+
+        if engine == "holt":
+            yhat, lower, upper, state = self._refresh_holt(cube, periods, refresh, prev, prev_cols)
+        elif engine == "prophet":
+            if not PROPHET_AVAILABLE:
+                raise ValueError("Module 'prophet' không được cài đặt")
+            yhat, lower, upper, state = self._refresh_prophet(cube, future, refresh, prev, previous_forecasts)
+        else:
+            raise ValueError(f"Engine dự báo không hợp lệ: {engine}")
+
+        # Chênh lệch so với trung bình 3 tháng gần nhất, tính cho mọi chuỗi cùng lúc
+        recent_avg = self.recent_average(cube.revenue)[:, None]
+        delta = yhat - recent_avg
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct_change = np.where(recent_avg != 0, delta / recent_avg * 100, np.nan)
+
+        result = cube.keys.loc[cube.keys.index.repeat(periods)].reset_index(drop=True)
+        result["ds"] = np.tile(future, len(cube))
+        result["yhat"] = yhat.ravel()
+        result["yhat_lower"] = lower.ravel()
+        result["yhat_upper"] = upper.ravel()
+        result["recent_avg"] = np.repeat(recent_avg.ravel(), periods)
+        result["delta"] = delta.ravel()
+        result["pct_change"] = pct_change.ravel()
+        result["series_hash"] = np.repeat(hashes, periods)
+        result["last_month"] = cube.months[-1]
+        result["engine"] = engine
+
+        state = pd.concat([cube.keys, state], axis=1)
+        state["series_hash"] = hashes
+        state["last_month"] = cube.months[-1]
+        state["engine"] = engine
+        state["refresh"] = refresh
+        return result.dropna(subset=["yhat"]).reset_index(drop=True), state
+
+    def _classify_refresh(self, cube, engine, previous_state):
+        """Xếp từng chuỗi vào nhóm unchanged / warm / cold so với trạng thái lần chạy trước"""
+        n = len(cube)
+        refresh = np.full(n, "cold", dtype=object)
+        prev_cols = np.zeros(n, dtype=int)
+        if previous_state is None:
+            return refresh, None, prev_cols
+
+        prev = previous_state[previous_state["engine"] == engine].drop_duplicates(["StockCode", "Country"])
+        if prev.empty:
+            return refresh, None, prev_cols
+
+        keys = ["StockCode", "Country"]
+        prev_rows = pd.MultiIndex.from_frame(prev[keys]).get_indexer(pd.MultiIndex.from_frame(cube.keys))
+        found = prev_rows >= 0
+        prev = prev.iloc[np.where(found, prev_rows, 0)].reset_index(drop=True)
+
+        # Số tháng đã có ở lần chạy trước (tính theo lưới tháng của khối hiện tại)
+        prev_cols = np.where(found, cube.months.get_indexer(pd.to_datetime(prev["last_month"])) + 1, 0)
+        prev_hash = prev["series_hash"].to_numpy(dtype=np.uint64)
+
+        for n_months in np.unique(prev_cols[prev_cols > 0]):
+            rows = prev_cols == n_months
+            same_prefix = cube.series_hashes(n_months)[rows] == prev_hash[rows]
+            refresh[np.flatnonzero(rows)[same_prefix]] = "unchanged" if n_months == len(cube.months) else "warm"
+
+        return refresh, prev, prev_cols
+
+    def _refresh_holt(self, cube, periods, refresh, prev, prev_cols):
+        """Cập nhật trạng thái Holt: khớp lại nhóm cold, đệ quy tiếp nhóm warm, giữ nguyên nhóm unchanged"""
+        columns = list(BatchForecastModel.STATE_COLUMNS)
+        state = pd.DataFrame(np.nan, index=range(len(cube)), columns=columns)
+
+        cold = refresh == "cold"
+        if cold.any():
+            state.loc[cold, columns] = BatchForecastModel().fit(cube.revenue[cold]).to_frame().to_numpy()
+
+        kept = ~cold
+        if kept.any():
+            state.loc[kept, columns] = prev.loc[kept, columns].to_numpy(dtype=float)
+
+        warm = refresh == "warm"
+        for n_months in np.unique(prev_cols[warm]):
+            rows = warm & (prev_cols == n_months)
+            model = BatchForecastModel.from_frame(state.loc[rows])
+            model.update(cube.revenue[rows, n_months:])
+            state.loc[rows, columns] = model.to_frame().to_numpy()
+
+        yhat, lower, upper = BatchForecastModel.from_frame(state).forecast(periods)
+        return yhat, lower, upper, state
+
+    def _refresh_prophet(self, cube, future, refresh, prev, previous_forecasts):
+        """
+        Khớp Prophet cho từng chuỗi, khởi động ấm bằng init khi chỉ có tháng mới được nối thêm
+
+        Chuỗi phải khớp lại từ đầu (không có init hoặc khởi động ấm thất bại) được ghi lại thành
+        "cold" trong refresh, để số liệu ấm / lạnh của lần chạy phản ánh đúng cách đã khớp.
+        """
+        periods = len(future)
+        yhat, lower, upper = (np.full((len(cube), periods), np.nan) for _ in range(3))
+        inits = np.full(len(cube), None, dtype=object)
+
+        reusable = {}
+        if previous_forecasts is not None:
+            for key, series in previous_forecasts.groupby(["StockCode", "Country"]):
+                if len(series) >= periods:
+                    reusable[key] = series.sort_values("ds").head(periods)
+
+        for row, values in enumerate(cube.revenue):
+            key = (cube.keys["StockCode"].iat[row], cube.keys["Country"].iat[row])
+            init = prev["prophet_init"].iat[row] if prev is not None and refresh[row] != "cold" else None
+
+            if refresh[row] == "unchanged" and key in reusable:
+                series = reusable[key]
+                yhat[row] = series["yhat"].to_numpy()
+                lower[row] = series["yhat_lower"].to_numpy()
+                upper[row] = series["yhat_upper"].to_numpy()
+                inits[row] = init
+                continue
+
+            # Bỏ các tháng trước lần bán đầu tiên, giống cách lọc khi dự báo từng sản phẩm
+            if np.count_nonzero(values) < 3:
+                continue
+            monthly = self.series_history(row)
+            model, warm_started = self._fit_prophet(monthly, init if isinstance(init, dict) else None)
+            if not warm_started:
+                refresh[row] = "cold"
+            predicted = model.predict(pd.DataFrame({"ds": future}))
+            yhat[row] = predicted["yhat"].to_numpy()
+            lower[row] = predicted["yhat_lower"].to_numpy()
+            upper[row] = predicted["yhat_upper"].to_numpy()
+            inits[row] = self._prophet_params(model)
+
+        return yhat, lower, upper, pd.DataFrame({"prophet_init": inits})
+
+    @staticmethod
+    def _fit_prophet(monthly, init=None):
+        """
+        Khớp Prophet, khởi động ấm từ tham số cũ nếu có
+
+        Chỉ lỗi tối ưu hóa của Stan (RuntimeError, ValueError khi init không khớp mô hình) mới
+        chuyển sang khớp lại từ đầu; các lỗi khác được ném ra.
+
+        Returns:
+        --------
+        tuple: (mô hình đã khớp, True nếu đã khởi động ấm thành công)
+        """
+        if init is not None:
+            try:
+                model = Prophet(n_changepoints=len(init["delta"]))
+                return model.fit(monthly, init=init), True
+            except (RuntimeError, ValueError):
+                pass
+        model = Prophet()
+        return model.fit(monthly), False
+
+    @staticmethod
+    def _prophet_params(model):
+        """Tham số đã khớp của Prophet ở dạng dùng được cho tham số init của lần khớp sau"""
+        params = {name: float(model.params[name][0][0]) for name in ["k", "m", "sigma_obs"]}
+        for name in ["delta", "beta"]:
+            params[name] = model.params[name][0].tolist()
+        return params
+
+    @staticmethod
+    def scan_alerts(forecasts, threshold):
+        """
+        Quét toàn bộ dự báo, giữ lại các chuỗi lệch khỏi trung bình 3 tháng gần nhất vượt ngưỡng
+
+        Parameters:
+        -----------
+        forecasts : DataFrame
+            Dự báo dạng dài (kết quả của forecast_all hoặc đọc từ kho dự báo),
+            cần các cột StockCode, Country, ds, yhat, recent_avg
+        threshold : float
+            Ngưỡng cảnh báo (%) trên giá trị tuyệt đối của mức thay đổi
+
+        Returns:
+        --------
+        DataFrame: Mỗi dòng là một chuỗi vượt ngưỡng, sắp xếp giảm dần theo doanh thu rủi ro
+        (tổng phần dự báo thấp hơn trung bình 3 tháng trong các tháng vượt ngưỡng; tháng dự báo
+        tăng vẫn được cảnh báo nhưng không tính vào doanh thu rủi ro)
+        """
+        yhat = forecasts["yhat"].to_numpy(dtype=float)
+        recent_avg = forecasts["recent_avg"].to_numpy(dtype=float)
+        delta = yhat - recent_avg
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct_change = np.where(recent_avg > 0, delta / recent_avg * 100, np.nan)
+
+        breach = np.abs(pct_change) >= threshold
+        breached = forecasts.loc[breach, ["StockCode", "Country", "ds", "recent_avg"]].assign(
+            delta=delta[breach],
+            pct_change=pct_change[breach],
+            abs_pct=np.abs(pct_change[breach]),
+            at_risk=np.maximum(-delta[breach], 0),
+        )
+        columns = ["StockCode", "Country", "first_breach", "months_breached",
+                   "worst_pct_change", "recent_avg", "revenue_at_risk"]
+        if breached.empty:
+            return pd.DataFrame(columns=columns)
+
+        # Tháng lệch nhiều nhất của mỗi chuỗi, lấy bằng sắp xếp thay vì lặp từng chuỗi
+        worst = breached.sort_values("abs_pct").drop_duplicates(["StockCode", "Country"], keep="last")
+        summary = breached.groupby(["StockCode", "Country"], sort=False).agg(
+            first_breach=("ds", "min"),
+            months_breached=("ds", "size"),
+            recent_avg=("recent_avg", "first"),
+            revenue_at_risk=("at_risk", "sum"),
+        ).reset_index()
+        summary = summary.merge(worst[["StockCode", "Country", "pct_change"]], on=["StockCode", "Country"])
+        summary = summary.rename(columns={"pct_change": "worst_pct_change"})[columns]
+        return summary.sort_values("revenue_at_risk", ascending=False, ignore_index=True)
+
+    def forecast_hierarchy(self, periods, method="mint"):
+        """
+        Dự báo phân cấp SKU -> quốc gia -> tổng và đối soát để các cấp cộng khớp với nhau
+
+        Parameters:
+        -----------
+        periods : int
+            Số tháng cần dự báo
+        method : str
+            "bottom_up": cộng dồn dự báo cấp SKU
+            "ols": đối soát bình phương tối thiểu (W = I)
+            "mint": MinT với ma trận hiệp phương sai chéo từ phương sai phần dư
+
+        Returns:
+        --------
+        DataFrame: Dự báo cho toàn bộ cây với cột level, StockCode, Country, ds, yhat_base, yhat
+        """
+        if method not in self.HIERARCHY_METHODS:
+            raise ValueError(f"Phương pháp đối soát không hợp lệ: {method}")
+
+        cube = self.monthly_cube()
+        bottom = cube.revenue
+        n_bottom = len(cube)
+
+        # Ma trận tổng hợp A (số nút tổng hợp x số chuỗi SKU): dòng 0 là tổng, các dòng sau là quốc gia
+        country_codes, countries = pd.factorize(cube.keys["Country"], sort=True)
+        rows = np.concatenate([np.zeros(n_bottom, dtype=int), country_codes + 1])
+        cols = np.tile(np.arange(n_bottom), 2)
+        agg = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(countries) + 1, n_bottom))
+
+        # Dự báo cơ sở cho mọi nút trong một lần khớp
+        y_all = np.vstack([agg @ bottom, bottom])
+        engine = BatchForecastModel().fit(y_all)
+        base, _, _ = engine.forecast(periods)
+        n_agg = agg.shape[0]
+
+        if method == "bottom_up":
+            reconciled_bottom = base[n_agg:]
+            reconciled = np.vstack([agg @ reconciled_bottom, reconciled_bottom])
+        else:
+            # Đối soát dạng ràng buộc: y~ = y^ - W C' (C W C')^-1 C y^, với C = [I, -A]
+            w = np.ones(len(y_all)) if method == "ols" else np.maximum(engine.sigma2, 1e-9)
+            w_agg, w_bottom = w[:n_agg], w[n_agg:]
+            cwc = np.diag(w_agg) + (agg.multiply(w_bottom) @ agg.T).toarray()
+            gap = base[:n_agg] - agg @ base[n_agg:]
+            lam = np.linalg.solve(cwc, gap)
+            reconciled = base.copy()
+            reconciled[:n_agg] -= w_agg[:, None] * lam
+            reconciled[n_agg:] += w_bottom[:, None] * (agg.T @ lam)
+
+        all_label = "Tất cả"
+        nodes = pd.DataFrame({
+            "level": ["total"] + ["country"] * len(countries) + ["sku"] * n_bottom,
+            "StockCode": [all_label] * n_agg + cube.keys["StockCode"].tolist(),
+            "Country": [all_label] + list(countries) + cube.keys["Country"].tolist(),
+        })
+        future = self.future_months(periods)
 
-        return forecast.tail(periods), monthly
+        result = nodes.loc[nodes.index.repeat(periods)].reset_index(drop=True)
+        result["ds"] = np.tile(future, len(nodes))
+        result["yhat_base"] = base.ravel()
+        result["yhat"] = reconciled.ravel()
+        return result
@@ -3,6 +3,7 @@ import numpy as np
 from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import KMeans
 import datetime
+from models.batch_forecast_model import BatchForecastModel
 
 class RFMModel:
     """Model xử lý dữ liệu RFM và phân cụm khách hàng"""
@@ -351,8 +352,12 @@ class RFMModel:
             else:
                 summary['revenue_ratio'] = 0
             
-            # Thêm cột CLV (Customer Lifetime Value) - giá trị đơn giản hóa
-            summary['clv'] = summary['Monetary_mean'] * summary['Frequency_mean']
+            # Thêm cột CLV (Customer Lifetime Value): trung bình CLV dự báo của từng khách hàng
+            # (BG/NBD + Gamma-Gamma) nếu có, ngược lại dùng giá trị đơn giản hóa
+            if 'CLV' in df.columns:
+                summary['clv'] = df.groupby('Cluster')['CLV'].mean()
+            else:
+                summary['clv'] = summary['Monetary_mean'] * summary['Frequency_mean']
             
             return summary
             
@@ -476,3 +481,123 @@ class RFMModel:
         except Exception as e:
             raise ValueError(f"Lỗi khi tính toán doanh thu theo tháng: {str(e)}")
 
+    def cohort_retention(self, df):
+        """
+        Ma trận giữ chân khách hàng theo nhóm tháng mua đầu tiên (cohort)
+
+        Mỗi khách hàng thuộc cohort là tháng mua đầu tiên; độ lệch là số tháng kể từ tháng đó.
+        Toàn bộ ma trận được tính bằng một lần groupby trên (cohort, độ lệch tháng) dạng số nguyên.
+
+        Parameters:
+        -----------
+        df : DataFrame
+            Dữ liệu giao dịch đã qua tiền xử lý (CustomerID, InvoiceDate, Revenue)
+
+        Returns:
+        --------
+        dict: Các DataFrame (dòng: cohort, cột: số tháng kể từ lần mua đầu)
+            - 'customers': số khách hàng còn mua
+            - 'retention': tỷ lệ khách hàng còn mua so với cỡ cohort
+            - 'revenue': tổng doanh thu
+            - 'cohort_size': số khách hàng của mỗi cohort (Series)
+            - 'observed': True nếu tháng thứ k của cohort nằm trong khoảng dữ liệu (ô False là chưa
+              quan sát được, khác với tỷ lệ giữ chân bằng 0)
+        """
+        try:
+            if df.empty:
+                raise ValueError("Dữ liệu giao dịch rỗng")
+
+            dates = pd.to_datetime(df['InvoiceDate'], errors='coerce')
+            month = (dates.dt.year * 12 + dates.dt.month - 1).to_numpy()
+            customer = pd.to_numeric(df['CustomerID'], errors='coerce').to_numpy()
+            valid = ~np.isnan(month.astype(float)) & ~np.isnan(customer)
+            if not valid.any():
+                raise ValueError("Không có giao dịch hợp lệ để tính cohort")
+
+            frame = pd.DataFrame({
+                'CustomerID': customer[valid],
+                'Month': month[valid].astype(np.int64),
+                'Revenue': df['Revenue'].to_numpy(dtype=float)[valid],
+            })
+            frame['Cohort'] = frame.groupby('CustomerID')['Month'].transform('min')
+            frame['Offset'] = frame['Month'] - frame['Cohort']
+
+            grouped = frame.groupby(['Cohort', 'Offset']).agg(
+                Customers=('CustomerID', 'nunique'), Revenue=('Revenue', 'sum')
+            )
+            # Đủ mọi độ lệch 0..max: tháng không ai quay lại vẫn là một cột (giá trị 0)
+            offsets = np.arange(frame['Offset'].max() + 1)
+            customers = grouped['Customers'].unstack(fill_value=0).reindex(columns=offsets, fill_value=0)
+            revenue = grouped['Revenue'].unstack(fill_value=0.0).reindex(columns=offsets, fill_value=0.0)
+            # Độ lệch lớn nhất quan sát được của mỗi cohort: từ tháng cohort đến tháng cuối của dữ liệu
+            last_offset = frame['Month'].max() - customers.index.to_numpy()
+            observed = pd.DataFrame(customers.columns.to_numpy()[None, :] <= last_offset[:, None],
+                                    index=customers.index, columns=customers.columns)
+
+            # Nhãn cohort dạng tháng (YYYY-MM) từ chỉ số tháng nguyên
+            labels = [f"{cohort // 12}-{cohort % 12 + 1:02d}" for cohort in customers.index]
+            customers.index = revenue.index = observed.index = pd.Index(labels, name='Cohort')
+            customers.columns.name = revenue.columns.name = observed.columns.name = 'Tháng thứ'
+            cohort_size = customers[0]
+
+            return {
+                'customers': customers,
+                'retention': customers.div(cohort_size, axis=0),
+                'revenue': revenue,
+                'cohort_size': cohort_size,
+                'observed': observed,
+            }
+
+        except Exception as e:
+            raise ValueError(f"Lỗi khi tính ma trận cohort: {str(e)}")
+
+    def forecast_monthly_revenue(self, monthly_revenue, periods=3, interval=0.95):
+        """
+        Dự báo doanh thu theo tháng cho tất cả các cụm trong một lần khớp vector hóa
+
+        Parameters:
+        -----------
+        monthly_revenue : dict
+            Kết quả của calculate_monthly_revenue
+        periods : int, mặc định=3
+            Số tháng cần dự báo
+        interval : float, mặc định=0.95
+            Mức tin cậy của khoảng dự báo
+
+        Returns:
+        --------
+        dict: Dictionary chứa dự báo cho mỗi cụm
+        {
+            cluster_id: {
+                'forecast': list doanh thu dự báo,
+                'lower': list cận dưới,
+                'upper': list cận trên
+            }
+        }
+        """
+        try:
+            if not monthly_revenue:
+                raise ValueError("Không có dữ liệu doanh thu theo tháng")
+
+            cluster_ids = sorted(monthly_revenue.keys())
+            revenue = np.array([monthly_revenue[c]['revenue'] for c in cluster_ids], dtype=np.float64)
+
+            if revenue.shape[1] < 2:
+                raise ValueError("Cần ít nhất 2 tháng dữ liệu để dự báo")
+
+            yhat, lower, upper = BatchForecastModel().fit(revenue).forecast(periods, interval)
+
+            # Doanh thu không âm
+            yhat, lower, upper = (np.maximum(a, 0) for a in (yhat, lower, upper))
+
+            return {
+                int(cluster): {
+                    'forecast': yhat[i].tolist(),
+                    'lower': lower[i].tolist(),
+                    'upper': upper[i].tolist()
+                }
+                for i, cluster in enumerate(cluster_ids)
+            }
+
+        except Exception as e:
+            raise ValueError(f"Lỗi khi dự báo doanh thu theo cụm: {str(e)}")
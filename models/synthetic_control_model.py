@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+from scipy.optimize import nnls
+from statistics import NormalDist
+
+
+class SyntheticControlModel:
+    """
+    Ước lượng phản thực tế (counterfactual) cho sản phẩm bị thay đổi giá bằng đối chứng tổng hợp
+
+    Doanh thu của sản phẩm được xấp xỉ bằng tổ hợp lồi (trọng số không âm, tổng bằng 1)
+    của các sản phẩm không bị tác động trong cùng quốc gia, khớp trên giai đoạn trước sự kiện.
+    """
+
+    def __init__(self, cube, max_donors=50):
+        self.cube = cube
+        self.max_donors = max_donors
+        # Ma trận ứng viên theo quốc gia; sống cùng đối tượng (và khối dữ liệu) nên không cần khóa phiên bản
+        self._donor_cache = {}
+
+    def donor_matrix(self, country):
+        """
+        Ma trận doanh thu theo tháng của mọi sản phẩm trong một quốc gia (có cache)
+
+        Returns:
+        --------
+        tuple: (DataFrame khóa, ndarray số sản phẩm x số tháng)
+        """
+        if country not in self._donor_cache:
+            rows = np.flatnonzero((self.cube.keys["Country"] == country).to_numpy())
+            self._donor_cache[country] = (self.cube.keys.iloc[rows].reset_index(drop=True), self.cube.revenue[rows])
+        return self._donor_cache[country]
+
+    def estimate(self, stock_code, country, event_date, treated_codes=None, interval=0.95):
+        """
+        Xây dựng đối chứng tổng hợp và đo chênh lệch sau sự kiện
+
+        Parameters:
+        -----------
+        stock_code : str
+            Sản phẩm bị tác động
+        country : str
+            Quốc gia
+        event_date : datetime
+            Tháng bắt đầu thay đổi giá
+        treated_codes : list, optional
+            Các sản phẩm khác cũng bị tác động, bị loại khỏi nhóm ứng viên
+        interval : float
+            Mức tin cậy của khoảng chênh lệch
+
+        Returns:
+        --------
+        dict hoặc None: series (Month, actual, synthetic, gap, lower, upper), weights,
+        avg_gap, avg_gap_pct, avg_gap_lower, avg_gap_upper, rmspe_pre, rmspe_ratio
+        """
+        keys, revenue = self.donor_matrix(country)
+        event_col = self.cube.month_index(event_date)
+        treated_row = np.flatnonzero((keys["StockCode"] == stock_code).to_numpy())
+        if event_col is None or len(treated_row) == 0 or event_col < 3 or event_col >= revenue.shape[1]:
+            return None
+
+        y = revenue[treated_row[0]]
+        scale = y[:event_col].mean()
+        if scale <= 0:
+            return None
+
+        # Loại sản phẩm bị tác động và các sản phẩm không bán trong giai đoạn trước
+        excluded = {stock_code} | set(treated_codes or [])
+        donor_scale = revenue[:, :event_col].mean(axis=1)
+        candidates = np.flatnonzero(~keys["StockCode"].isin(excluded).to_numpy() & (donor_scale > 0))
+        if len(candidates) == 0:
+            return None
+
+        # Chuẩn hóa theo trung bình giai đoạn trước để các sản phẩm có cùng thang đo
+        donors = revenue[candidates] / donor_scale[candidates, None]
+        target = y / scale
+
+        # Giữ các ứng viên tương quan cao nhất với sản phẩm trong giai đoạn trước
+        pre_donors = donors[:, :event_col] - donors[:, :event_col].mean(axis=1, keepdims=True)
+        pre_target = target[:event_col] - target[:event_col].mean()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = pre_donors @ pre_target / (np.linalg.norm(pre_donors, axis=1) * np.linalg.norm(pre_target))
+        top = np.argsort(-np.nan_to_num(corr, nan=-np.inf))[:self.max_donors]
+        donors = donors[top]
+
+        weights = self._fit_weights(donors[:, :event_col], target[:event_col])
+
+        synthetic = (weights @ donors) * scale
+        gap = y - synthetic
+        pre_gap, post_gap = gap[:event_col], gap[event_col:]
+        rmspe_pre = np.sqrt(np.mean(pre_gap ** 2))
+        rmspe_post = np.sqrt(np.mean(post_gap ** 2))
+
+        # Sai số ngoài mẫu của giai đoạn trước (bỏ từng tháng rồi dự đoán lại tháng đó),
+        # vì với nhiều ứng viên, sai số trong mẫu có thể gần bằng 0.
+        # Thang đo được tính lại trên các tháng còn giữ để tháng bị bỏ không rò rỉ vào phép chuẩn hóa.
+        raw_donors = revenue[candidates[top], :event_col]
+        loo_errors = np.empty(event_col)
+        for month in range(event_col):
+            keep = np.arange(event_col) != month
+            keep_scale = y[:event_col][keep].mean()
+            keep_donor_scale = raw_donors[:, keep].mean(axis=1)
+            usable = keep_donor_scale > 0
+            if keep_scale <= 0 or not usable.any():
+                loo_errors[month] = y[month]
+                continue
+            loo_donors = raw_donors[usable] / keep_donor_scale[usable, None]
+            loo_weights = self._fit_weights(loo_donors[:, keep], y[:event_col][keep] / keep_scale)
+            loo_errors[month] = y[month] - (loo_weights @ loo_donors[:, month]) * keep_scale
+
+        # Khoảng chênh lệch dựa trên sai số ngoài mẫu của giai đoạn trước
+        z = NormalDist().inv_cdf(0.5 + interval / 2)
+        sigma = np.sqrt(np.mean(loo_errors ** 2))
+        avg_gap = post_gap.mean()
+        avg_half_width = z * sigma / np.sqrt(len(post_gap))
+
+        series = pd.DataFrame({
+            "Month": self.cube.months,
+            "actual": y,
+            "synthetic": synthetic,
+            "gap": gap,
+            "lower": gap - z * sigma,
+            "upper": gap + z * sigma,
+            "post": np.arange(len(y)) >= event_col,
+        })
+        donor_keys = keys.iloc[candidates[top]].reset_index(drop=True)
+        weight_table = donor_keys.assign(weight=weights)
+        weight_table = weight_table[weight_table["weight"] > 1e-4].sort_values("weight", ascending=False, ignore_index=True)
+
+        post_synthetic = synthetic[event_col:].mean()
+        return {
+            "series": series,
+            "weights": weight_table,
+            "avg_gap": avg_gap,
+            "avg_gap_pct": avg_gap / post_synthetic * 100 if post_synthetic > 0 else 0.0,
+            "avg_gap_lower": avg_gap - avg_half_width,
+            "avg_gap_upper": avg_gap + avg_half_width,
+            "is_significant": abs(avg_gap) > avg_half_width,
+            "rmspe_pre": rmspe_pre,
+            # So với sai số ngoài mẫu để tỷ lệ không bùng nổ khi khớp trong mẫu gần như hoàn hảo
+            "rmspe_ratio": rmspe_post / sigma if sigma > 0 else np.inf,
+        }
+
+    @staticmethod
+    def _fit_weights(donors_pre, target_pre):
+        """Bình phương tối thiểu với w >= 0 và sum(w) = 1 (ràng buộc tổng được thêm dưới dạng một dòng phạt)"""
+        penalty = 1e3
+        design = np.vstack([donors_pre.T, penalty * np.ones(len(donors_pre))])
+        rhs = np.concatenate([target_pre, [penalty]])
+        weights, _ = nnls(design, rhs)
+        return weights
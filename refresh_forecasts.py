@@ -0,0 +1,63 @@
+"""
+Tác vụ chạy nền: tính trước dự báo doanh thu cho mọi cặp (StockCode, Country)
+sau mỗi lần cập nhật dữ liệu và lưu vào kho dự báo.
+
+Ví dụ chạy hằng đêm:
+    python refresh_forecasts.py --data online_retail.csv --store forecast_store --periods 6
+"""
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+from models.revenue_forecast_model import RevenueForecastModel
+from models.forecast_store import ForecastStore
+
+
+def load_data(path):
+    df = pd.read_csv(path, encoding="ISO-8859-1")
+    if "Date" not in df.columns and "InvoiceDate" in df.columns:
+        df.rename(columns={"InvoiceDate": "Date"}, inplace=True)
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    return df.dropna(subset=["Date", "StockCode", "Country"])
+
+
+def refresh(data_path, store_path, periods, engine, force=False):
+    model = RevenueForecastModel(load_data(data_path))
+    model.process_data()
+    version = model.monthly_cube().version()
+
+    store = ForecastStore(store_path)
+    manifest = store.manifest()
+    if not force and manifest and manifest.get("dataset_version") == version and manifest.get("periods", 0) >= periods:
+        print(f"Kho dự báo đã ở phiên bản {version}, bỏ qua.")
+        return 0
+
+    started = time.time()
+    # Khởi động ấm từ trạng thái lần trước, trừ khi bị yêu cầu tính lại toàn bộ
+    previous_state = None if force else store.load_state()
+    previous_forecasts = None if force else store.load()
+    forecasts, state = model.forecast_all(periods, engine=engine, previous_state=previous_state,
+                                          previous_forecasts=previous_forecasts)
+    store.save(forecasts, version, state=state, engine=engine, periods=periods, source=data_path)
+
+    counts = state["refresh"].value_counts()
+    print(f"Đã lưu {store.manifest()['n_series']} chuỗi (phiên bản {version}) vào {store_path} trong {time.time() - started:.1f}s")
+    print(f"  khớp lại: {counts.get('cold', 0)}, khởi động ấm: {counts.get('warm', 0)}, không đổi: {counts.get('unchanged', 0)}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tính trước dự báo doanh thu cho toàn bộ danh mục")
+    parser.add_argument("--data", default="online_retail.csv", help="Đường dẫn file CSV giao dịch")
+    parser.add_argument("--store", default=ForecastStore.DEFAULT_PATH, help="Thư mục kho dự báo")
+    parser.add_argument("--periods", type=int, default=6, help="Số tháng cần dự báo")
+    parser.add_argument("--engine", choices=["holt", "prophet"], default="holt", help="Mô hình dự báo")
+    parser.add_argument("--force", action="store_true", help="Khớp lại toàn bộ từ đầu kể cả khi dữ liệu không đổi")
+    args = parser.parse_args(argv)
+    return refresh(args.data, args.store, args.periods, args.engine, args.force)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+from collections import Counter
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from models import basket_model
+from models.basket_model import BasketModel, triple_chunks
+
+
+def make_transactions(n_invoices=400, n_products=60, seed=0):
+    """Hóa đơn ngẫu nhiên; sản phẩm có xác suất xuất hiện giảm dần để có đủ cặp và bộ ba phổ biến"""
+    rng = np.random.default_rng(seed)
+    popularity = 0.6 / (1 + np.arange(n_products)) ** 0.5
+    rows = []
+    for invoice in range(n_invoices):
+        items = np.flatnonzero(rng.random(n_products) < popularity)
+        for item in items:
+            rows.append((f"{536000 + invoice}", f"SKU{item:03d}", f"PRODUCT {item}"))
+            # Dòng trùng sản phẩm trong cùng hóa đơn không được đếm hai lần
+            if rng.random() < 0.1:
+                rows.append((f"{536000 + invoice}", f"SKU{item:03d}", f"PRODUCT {item}"))
+    rows.append(("C536999", "SKU000", "PRODUCT 0"))
+    return pd.DataFrame(rows, columns=["InvoiceNo", "StockCode", "Description"])
+
+
+def brute_force_counts(model, df, max_size):
+    """Đếm trực tiếp mọi tập con (theo ProductID) của từng hóa đơn"""
+    codes = pd.Index(model.catalog["StockCode"])
+    df = df[~df["InvoiceNo"].str.startswith("C")]
+    counts = Counter()
+    for _, group in df.groupby("InvoiceNo"):
+        items = sorted(set(codes.get_indexer(group["StockCode"]).tolist()))
+        for size in range(1, max_size + 1):
+            counts.update(combinations(items, size))
+    return counts
+
+
+@pytest.fixture(scope="module")
+def transactions():
+    return make_transactions()
+
+
+@pytest.mark.parametrize("min_support", [0.02, 0.05, 0.15])
+def test_itemset_counts_match_brute_force(transactions, min_support):
+    model = BasketModel(transactions)
+    result = model.frequent_itemsets(min_support=min_support, max_size=3)
+
+    min_count = np.ceil(min_support * model.n_invoices)
+    expected = {items: n for items, n in brute_force_counts(model, transactions, 3).items() if n >= min_count}
+    # Hóa đơn hủy bị loại
+    assert model.n_invoices == transactions.loc[~transactions["InvoiceNo"].str.startswith("C"), "InvoiceNo"].nunique()
+    assert dict(zip(result["items"], result["count"])) == expected
+    assert (result["size"] == result["items"].map(len)).all()
+    assert np.allclose(result["support"], result["count"] / model.n_invoices)
+
+
+def test_chunked_triples_match_unchunked(transactions, monkeypatch):
+    model = BasketModel(transactions)
+    seen = []
+    original = basket_model.triple_chunks
+
+    def spy(pairs, basket, max_entries):
+        bound, chunks = original(pairs, basket, max_entries)
+        seen.append((pairs.nnz, bound, chunks))
+        return bound, chunks
+
+    monkeypatch.setattr(basket_model, "triple_chunks", spy)
+    full = model.frequent_itemsets(min_support=0.02, max_size=3)
+    pair_nnz, bound, chunks = seen[-1]
+    assert len(chunks) == 1
+
+    # Giới hạn vừa đủ cho các bước kiểm tra cặp nhưng nhỏ hơn tổng cận trên, buộc chia nhiều khối
+    n_frequent = int((full["size"] == 1).sum())
+    entries = max(pair_nnz, int(bound.max()), n_frequent ** 2 // 2)
+    assert bound.sum() > 2 * entries
+    max_memory_mb = entries * basket_model.BYTES_PER_ENTRY / 1024 ** 2
+    chunked = model.frequent_itemsets(min_support=0.02, max_size=3, max_memory_mb=max_memory_mb)
+
+    assert len(seen[-1][2]) > 1
+    pd.testing.assert_frame_equal(
+        chunked.sort_values("items").reset_index(drop=True),
+        full.sort_values("items").reset_index(drop=True),
+    )
+
+
+def test_triple_chunks_cover_columns_within_bound(transactions):
+    model = BasketModel(transactions)
+    basket = model.matrix
+    pair_a, pair_b = np.triu_indices(basket.shape[1], k=1)
+    pairs = basket[:, pair_a].multiply(basket[:, pair_b]).tocsc()
+
+    max_entries = 300
+    bound, chunks = triple_chunks(pairs, basket, max_entries)
+
+    # Các khối nối tiếp nhau và phủ đúng mọi cột
+    assert chunks[0][0] == 0 and chunks[-1][1] == pairs.shape[1]
+    assert all(end == next_start for (_, end), (next_start, _) in zip(chunks, chunks[1:]))
+    for start, end in chunks:
+        # Cận trên không nhỏ hơn số phần tử thực tế của tích, và khối nhiều cột không vượt giới hạn
+        nnz = np.diff((pairs[:, start:end].T @ basket).tocsr().indptr)
+        assert (nnz <= bound[start:end]).all()
+        assert end - start == 1 or bound[start:end].sum() <= max_entries
+
+
+def test_memory_limit_raises(transactions):
+    model = BasketModel(transactions)
+    with pytest.raises(ValueError):
+        model.frequent_itemsets(min_support=0.02, max_size=3, max_memory_mb=1e-6)
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from models.inventory_policy_model import policy_grid, simulate_policies
+
+
+def simulate_one(demand, s, S, Q, lead_time):
+    """Mô phỏng tham chiếu cho một sản phẩm và một chính sách: hàng đặt cuối ngày t về đầu ngày t + max(L, 1)"""
+    delay = max(lead_time, 1)
+    on_hand = S if not np.isnan(S) else s + Q
+    arrivals = {}
+    held = lost = orders = 0.0
+    for t, d in enumerate(demand):
+        on_hand += arrivals.pop(t, 0.0)
+        served = min(on_hand, d)
+        lost += d - served
+        on_hand -= served
+        held += on_hand
+        position = on_hand + sum(arrivals.values())
+        qty = Q if np.isnan(S) else S - position
+        if position <= s and qty > 0:
+            arrivals[t + delay] = arrivals.get(t + delay, 0.0) + qty
+            orders += 1
+    return held, lost, orders
+
+
+def run(demand, s, S, Q, lead_time, holding_cost=3.0, ordering_cost=10.0, stockout_cost=5.0):
+    return simulate_policies(np.array([demand], dtype=float), np.array([[s]], dtype=float),
+                             np.array([[S]], dtype=float), np.array([[Q]], dtype=float), lead_time,
+                             holding_cost, ordering_cost, stockout_cost)
+
+
+def test_order_arrives_after_lead_time():
+    # (s, S) = (5, 10), L = 2: đặt 6 cuối ngày 1 -> về đầu ngày 3; đặt 6 cuối ngày 3 -> về đầu ngày 5
+    # Tồn cuối ngày: 7, 4, 1, 4, 1, 7
+    result = run([3, 3, 3, 3, 3, 0], s=5, S=10, Q=0, lead_time=2)
+    assert result["orders"][0, 0] == 2
+    assert result["fill_rate"][0, 0] == 1.0
+    assert result["holding"][0, 0] == pytest.approx(24 * 3.0 / 30)
+    assert result["total"][0, 0] == pytest.approx(24 * 3.0 / 30 + 2 * 10.0)
+
+
+def test_pending_order_counts_in_position():
+    # L = 5: đơn đặt cuối ngày 1 chưa về trong kỳ; vị thế tồn kho (kể cả hàng đang về) = 10 > s
+    # nên không đặt thêm dù tồn kho hết, mất 2 ở ngày 3 và 3 ở ngày 4
+    result = run([3, 3, 3, 3, 3, 0], s=5, S=10, Q=0, lead_time=5)
+    assert result["orders"][0, 0] == 1
+    assert result["stockout"][0, 0] == pytest.approx(5 * 5.0)
+    assert result["holding"][0, 0] == pytest.approx((7 + 4 + 1) * 3.0 / 30)
+
+
+def test_lost_sales_and_fill_rate():
+    # (s, S) = (5, 10), L = 1: ngày 1 chỉ bán được 10/12, đơn 10 về đầu ngày 2
+    result = run([0, 12, 0, 4], s=5, S=10, Q=0, lead_time=1)
+    assert result["stockout"][0, 0] == pytest.approx(2 * 5.0)
+    assert result["fill_rate"][0, 0] == pytest.approx(1 - 2 / 16)
+    assert result["holding"][0, 0] == pytest.approx((10 + 0 + 10 + 6) * 3.0 / 30)
+    assert result["orders"][0, 0] == 1
+
+    # (R, Q) = (5, 3): bắt đầu với 8, mất 4 ở ngày 1 rồi đặt 3 mỗi ngày vì vị thế vẫn <= R
+    result = run([0, 12, 0, 4], s=5, S=np.nan, Q=3, lead_time=1)
+    assert result["stockout"][0, 0] == pytest.approx(4 * 5.0)
+    assert result["fill_rate"][0, 0] == pytest.approx(1 - 4 / 16)
+    assert result["holding"][0, 0] == pytest.approx((8 + 0 + 3 + 2) * 3.0 / 30)
+    assert result["orders"][0, 0] == 3
+
+
+def test_no_demand_gives_full_fill_rate():
+    result = run([0, 0, 0], s=2, S=5, Q=0, lead_time=1)
+    assert result["fill_rate"][0, 0] == 1.0
+    assert result["orders"][0, 0] == 0
+
+
+@pytest.mark.parametrize("lead_time", [0, 1, 3, 7])
+def test_matches_reference_simulation(lead_time):
+    rng = np.random.default_rng(lead_time)
+    demand = rng.poisson(rng.uniform(0.2, 4, (6, 1)), (6, 60)).astype(float)
+    _, reorder_point, order_up_to, order_qty = policy_grid(demand, lead_time, holding_cost=2.0, ordering_cost=15.0)
+    result = simulate_policies(demand, reorder_point, order_up_to, order_qty, lead_time, 2.0, 15.0, 4.0)
+
+    for i in range(demand.shape[0]):
+        for j in range(reorder_point.shape[1]):
+            held, lost, orders = simulate_one(demand[i], reorder_point[i, j], order_up_to[i, j], order_qty[i, j],
+                                              lead_time)
+            assert result["holding"][i, j] == pytest.approx(held * 2.0 / 30)
+            assert result["stockout"][i, j] == pytest.approx(lost * 4.0)
+            assert result["orders"][i, j] == orders
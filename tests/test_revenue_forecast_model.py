@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from models.revenue_forecast_model import RevenueForecastModel
+
+
+@pytest.fixture(scope="module")
+def model():
+    rng = np.random.default_rng(0)
+    n = 3000
+    sku = rng.integers(0, 8, n)
+    country = np.array(["United Kingdom", "France", "Germany"])[rng.integers(0, 3, n)]
+    df = pd.DataFrame({
+        "Date": pd.Timestamp("2010-01-01") + pd.to_timedelta(rng.integers(0, 730, n), unit="D"),
+        "StockCode": np.char.add("SKU", sku.astype(str)),
+        "Country": country,
+        "Quantity": rng.poisson(5, n) + 1,
+        "UnitPrice": np.round(rng.uniform(0.5, 5, 8)[sku] * (1 + 0.3 * (country == "France")), 2),
+    })
+    model = RevenueForecastModel(df)
+    model.process_data()
+    return model
+
+
+@pytest.mark.parametrize("method", RevenueForecastModel.HIERARCHY_METHODS)
+def test_hierarchy_is_coherent(model, method):
+    periods = 4
+    result = model.forecast_hierarchy(periods, method)
+    total = result[result["level"] == "total"].set_index("ds")["yhat"]
+    country = result[result["level"] == "country"]
+    sku = result[result["level"] == "sku"]
+
+    assert len(total) == periods
+    assert len(sku) == len(model.monthly_cube()) * periods
+    np.testing.assert_allclose(sku.groupby("ds")["yhat"].sum().reindex(total.index), total)
+    np.testing.assert_allclose(country.groupby("ds")["yhat"].sum().reindex(total.index), total)
+    # Mỗi quốc gia bằng tổng các SKU của quốc gia đó
+    by_country = sku.groupby(["Country", "ds"])["yhat"].sum()
+    np.testing.assert_allclose(by_country.reindex(pd.MultiIndex.from_frame(country[["Country", "ds"]])),
+                               country["yhat"])
+
+
+def test_bottom_up_keeps_sku_forecasts(model):
+    result = model.forecast_hierarchy(3, "bottom_up")
+    sku = result[result["level"] == "sku"]
+    np.testing.assert_allclose(sku["yhat"], sku["yhat_base"])
+
+
+def test_ols_matches_projection(model):
+    periods = 3
+    result = model.forecast_hierarchy(periods, "ols")
+    # Ma trận tổng hợp S (số nút x số SKU) theo thứ tự nút của kết quả
+    nodes = result.iloc[::periods]
+    skus = nodes[nodes["level"] == "sku"]
+    summing = np.vstack([
+        np.ones(len(skus)),
+        *[(skus["Country"] == c).to_numpy(float) for c in nodes.loc[nodes["level"] == "country", "Country"]],
+        np.eye(len(skus)),
+    ])
+    base = result["yhat_base"].to_numpy().reshape(-1, periods)
+    expected = summing @ np.linalg.solve(summing.T @ summing, summing.T @ base)
+    np.testing.assert_allclose(result["yhat"].to_numpy().reshape(-1, periods), expected, rtol=1e-6, atol=1e-6)
+
+
+def test_invalid_method_raises(model):
+    with pytest.raises(ValueError):
+        model.forecast_hierarchy(3, "top_down")
@@ -0,0 +1,77 @@
+import streamlit as st
+import pandas as pd
+
+from models.basket_model import BasketModel
+from models.data_model import data_version
+
+# Số luật tối đa gửi tới trình duyệt
+MAX_RULES_SHOWN = 500
+
+
+@st.cache_resource(show_spinner="Đang dựng ma trận hóa đơn x sản phẩm...", max_entries=2)
+def _basket_model(_df, dataset_version):
+    """Ma trận hóa đơn x sản phẩm được dựng một lần cho mỗi phiên bản bộ dữ liệu"""
+    return BasketModel(_df)
+
+
+@st.cache_data(show_spinner="Đang tìm luật kết hợp...", max_entries=32)
+def _association_rules(_model, dataset_version, min_support, min_confidence, min_lift, max_size):
+    return _model.association_rules(min_support, min_confidence, min_lift, max_size)
+
+
+def render_basket_analysis(df):
+    st.title("🧺 Phân tích Giỏ hàng (Market Basket)")
+
+    dataset_version = data_version(df)
+    model = _basket_model(df, dataset_version)
+
+    with st.form("basket_form"):
+        st.subheader("⚙️ Ngưỡng luật kết hợp")
+        col1, col2, col3 = st.columns(3)
+        min_support = col1.slider("Độ hỗ trợ tối thiểu (% hóa đơn)", 0.2, 10.0, 1.0, step=0.1) / 100
+        min_confidence = col2.slider("Độ tin cậy tối thiểu (%)", 5, 100, 30, step=5) / 100
+        min_lift = col3.slider("Lift tối thiểu", 1.0, 10.0, 1.5, step=0.5)
+        max_size = st.radio("Số sản phẩm tối đa trong một tập", [2, 3], index=1, horizontal=True)
+        st.form_submit_button("🔍 Tìm luật kết hợp")
+
+    try:
+        rules = _association_rules(model, dataset_version, min_support, min_confidence, min_lift, max_size)
+    except ValueError as e:
+        st.error(f"⚠️ {e}")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Số hóa đơn", f"{model.n_invoices:,}")
+    col2.metric("Số sản phẩm", f"{len(model.catalog):,}")
+    col3.metric("Số luật kết hợp", f"{len(rules):,}")
+
+    if rules.empty:
+        st.info("ℹ️ Không có luật nào thỏa các ngưỡng đã chọn. Hãy giảm độ hỗ trợ hoặc độ tin cậy tối thiểu.")
+        return
+
+    table_columns = {
+        "Antecedent": "Nếu mua",
+        "Consequent": "Thì thường mua thêm",
+        "support": "Độ hỗ trợ",
+        "confidence": "Độ tin cậy",
+        "lift": "Lift",
+        "count": "Số hóa đơn",
+    }
+
+    tab1, tab2 = st.tabs(["📋 Luật kết hợp", "🛒 Gợi ý mua kèm theo sản phẩm"])
+    with tab1:
+        st.caption(f"Hiển thị {min(len(rules), MAX_RULES_SHOWN)} / {len(rules)} luật có lift cao nhất. "
+                   "Lift > 1: hai nhóm sản phẩm được mua cùng nhau nhiều hơn ngẫu nhiên.")
+        st.dataframe(rules.head(MAX_RULES_SHOWN)[list(table_columns)].rename(columns=table_columns),
+                     use_container_width=True, hide_index=True)
+
+    with tab2:
+        # Chỉ liệt kê các sản phẩm có luật để lựa chọn không phụ thuộc số giao dịch
+        product_ids = sorted({item for items in rules["antecedent"] for item in items})
+        labels = model.catalog["Label"].to_numpy()
+        product_id = st.selectbox("Chọn sản phẩm", product_ids, format_func=lambda i: labels[i])
+        related = rules[[product_id in items for items in rules["antecedent"]]]
+        st.dataframe(related[list(table_columns)].rename(columns=table_columns), use_container_width=True, hide_index=True)
+        top = related.iloc[0]
+        st.success(f"✅ Gợi ý bán kèm: khách mua **{top['Antecedent']}** có {top['confidence']:.0%} khả năng mua "
+                   f"**{top['Consequent']}** (gấp {top['lift']:.1f} lần bình thường) → nên trưng bày cạnh nhau hoặc tạo combo.")
@@ -1,3 +1,4 @@
+import os
 import streamlit as st
 import matplotlib.pyplot as plt
 import pandas as pd
@@ -9,6 +10,47 @@ except ImportError:
     CAUSALIMPACT_AVAILABLE = False
 from controllers import causal_impact_controller
 from models.models_causal import RevenueCausalImpactModel
+from models.data_model import data_version
+from views.price_quantity_view import DEFAULT_MONTH_EFFECTS, catalog_prices
+
+PERCENT_OPTIONS = (-40, -30, -20, -10, 10, 20, 30, 40)
+
+
+@st.cache_resource(show_spinner="Đang chuẩn bị dữ liệu...", max_entries=2)
+def _prepare_model(df):
+    """Chuẩn hóa cột và xử lý dữ liệu một lần cho mỗi bộ dữ liệu, dùng chung giữa các lần tương tác"""
+    df = df.copy()
+    # Đổi tên cột cho đúng với model
+    if 'Date' in df.columns:
+        df.rename(columns={'Date': 'InvoiceDate'}, inplace=True)
+    if 'Price' in df.columns:
+        df.rename(columns={'Price': 'UnitPrice'}, inplace=True)
+    if 'Product' in df.columns:
+        df.rename(columns={'Product': 'StockCode'}, inplace=True)
+    # Thêm cột Country mặc định nếu thiếu
+    if 'Country' not in df.columns:
+        df['Country'] = 'Default'
+    df['StockCode'] = df['StockCode'].astype(str)
+    model = RevenueCausalImpactModel(df)
+    model.process_data()
+    model.df = model.df.sort_values('InvoiceDate')
+    return model
+
+
+@st.cache_data(show_spinner="Đang tính toàn bộ kịch bản...", max_entries=64)
+def _scenario_grid(_model, dataset_version, stock_code, country):
+    """Mọi kịch bản (mức thay đổi giá x tháng thay đổi) của chuỗi, tính một lần rồi tra cứu"""
+    return _model.scenario_grid(stock_code, country, list(PERCENT_OPTIONS))
+
+
+def _price_recommendations(df):
+    """Giá đề xuất (tối đa hóa doanh thu) của mọi sản phẩm, dùng chung cache với màn hình giá"""
+    try:
+        prices = catalog_prices(df, data_version(df), DEFAULT_MONTH_EFFECTS, None)
+    except ValueError:
+        return pd.DataFrame()
+    return prices.assign(StockCode=prices['StockCode'].astype(str)).set_index('StockCode')
+
 
 def app(provided_df=None):
     st.title("📉 Phân tích ảnh hưởng của thay đổi giá đến doanh thu (CausalImpact)")
@@ -24,85 +66,91 @@ def app(provided_df=None):
     if uploaded_file:       
         df = pd.read_csv(uploaded_file)
     elif provided_df is not None:
-        df = provided_df.copy()
+        df = provided_df
         st.info("Đang sử dụng dữ liệu có sẵn. Bạn cũng có thể tải lên file CSV khác để phân tích.")
     else:
         st.warning("Vui lòng tải lên file CSV để bắt đầu phân tích.")
         return
-        
-    # Đổi tên cột cho đúng với model
-    if 'Date' in df.columns:
-        df.rename(columns={'Date': 'InvoiceDate'}, inplace=True)
-    if 'Price' in df.columns:
-        df.rename(columns={'Price': 'UnitPrice'}, inplace=True)
-    if 'Product' in df.columns:
-        df.rename(columns={'Product': 'StockCode'}, inplace=True)
-    # Thêm cột Country mặc định nếu thiếu
-    if 'Country' not in df.columns:
-        df['Country'] = 'Default'
-    df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
-    df = df.sort_values('InvoiceDate')
-    # Tính doanh thu nếu chưa có
-    if 'Revenue' not in df.columns:
-        df['Revenue'] = df['UnitPrice'] * df['Quantity']
-    # Tổng hợp theo tháng (nếu dữ liệu theo ngày)
-    df['Month'] = df['InvoiceDate'].dt.to_period('M').dt.to_timestamp()
-    monthly = df.groupby('Month').agg({'Revenue': 'sum', 'UnitPrice': 'mean'}).reset_index()
+
+    model = _prepare_model(df)
+    df = model.df
+
+    # Chọn sản phẩm và quốc gia cần phân tích
+    col1, col2 = st.columns(2)
+    stock_code = col1.selectbox("🛒 Chọn sản phẩm", sorted(df['StockCode'].unique()))
+    country = col2.selectbox("🌎 Chọn quốc gia", sorted(df.loc[df['StockCode'] == stock_code, 'Country'].unique()))
+    series_df = df[(df['StockCode'] == stock_code) & (df['Country'] == country)]
+
+    monthly = series_df.groupby('Month').agg({'Revenue': 'sum', 'UnitPrice': 'mean'}).reset_index()
     st.write("Dữ liệu tổng hợp theo tháng:")
     st.dataframe(monthly)
+    if len(monthly) < 5:
+        st.warning("Sản phẩm này có quá ít tháng dữ liệu để phân tích tác động. Hãy chọn sản phẩm khác.")
+        return
+
+    # Kịch bản mặc định là mức gần nhất với giá đề xuất theo đường cầu ước lượng của sản phẩm
+    dataset_version = model.monthly_cube().version()
+    # Dữ liệu có sẵn được truyền nguyên vẹn để trùng khóa cache với màn hình phân tích giá
+    recommendations = _price_recommendations(df if uploaded_file else provided_df)
+    default_index = 0
+    if stock_code in recommendations.index and recommendations.at[stock_code, 'Is_Significant']:
+        recommended = recommendations.loc[stock_code]
+        default_index = int(np.argmin(np.abs(np.asarray(PERCENT_OPTIONS) - recommended['Price_Change_Pct'])))
+        st.info(f"💡 Giá đề xuất (tối đa hóa doanh thu): {recommended['Optimal_Price']:.2f} "
+                f"({recommended['Price_Change_Pct']:+.1f}% so với {recommended['Current_Price']:.2f}), "
+                f"doanh thu dự kiến {recommended['Revenue_Lift_Pct']:+.1f}%")
 
     # Người dùng chọn mức tăng/giảm giá (chỉ các mức 10, 20, 30, 40%)
-    percent_options = [-40, -30, -20, -10, 10, 20, 30, 40]
     percent_label = st.selectbox(
         "Chọn mức thay đổi giá (%)",
-        [f"Giảm {abs(x)}%" if x < 0 else f"Tăng {x}%" for x in percent_options]
+        [f"Giảm {abs(x)}%" if x < 0 else f"Tăng {x}%" for x in PERCENT_OPTIONS],
+        index=default_index
     )
     percent_change = int(percent_label.replace("Tăng ", "").replace("Giảm ", "-").replace("%", ""))
-    change_factor = 1 + percent_change / 100
 
     # Chọn thời điểm thay đổi giá
     month_labels = monthly['Month'].dt.strftime('%m/%Y').tolist()
     change_month = st.selectbox("📅 Chọn tháng bắt đầu thay đổi giá", month_labels)
     change_idx = month_labels.index(change_month)
-    if change_idx + 1 >= len(monthly):
-        st.error("⚠️ Không có dữ liệu sau tháng thay đổi giá được chọn. Hãy chọn mốc thời gian sớm hơn.")
+    # Giai đoạn sau (từ tháng sự kiện) cần ít nhất 2 tháng, giống lưới kịch bản
+    if change_idx + 2 >= len(monthly):
+        st.error("⚠️ Cần ít nhất 2 tháng dữ liệu sau tháng thay đổi giá được chọn. Hãy chọn mốc thời gian sớm hơn.")
         st.stop()
 
     st.write(f"Giai đoạn trước thay đổi giá: {monthly['Month'].iloc[0].strftime('%Y-%m-%d')} đến {monthly['Month'].iloc[change_idx].strftime('%Y-%m-%d')}")
     st.write(f"Giai đoạn sau thay đổi giá: {monthly['Month'].iloc[change_idx+1].strftime('%Y-%m-%d')} đến {monthly['Month'].iloc[-1].strftime('%Y-%m-%d')}")
 
+    # Toàn bộ kịch bản được tính một lần cho chuỗi; đổi kịch bản chỉ là tra cứu
+    grid = _scenario_grid(model, dataset_version, stock_code, country)
+    event_date = monthly['Month'].iloc[change_idx+1]
+    with st.expander("📊 So sánh tất cả kịch bản"):
+        st.caption("Doanh thu sau thay đổi được nhân với hệ số giá (giả định số lượng bán không đổi).")
+        if grid.empty:
+            st.info("Không đủ dữ liệu để so sánh kịch bản.")
+        else:
+            table = grid.pivot(index='event_date', columns='percent_change', values='impact_pct')
+            table.index = table.index.strftime('%m/%Y')
+            table.columns = [f"{x:+d}%" for x in table.columns]
+            st.write("Chênh lệch doanh thu (%) theo tháng thay đổi giá (dòng) và mức thay đổi giá (cột):")
+            st.dataframe(table.style.format("{:.1f}"))
+
     if st.button("🚀 Phân tích tác động với mức thay đổi giá đã chọn"):
         if change_idx < 2:
             st.error("⚠️ Giai đoạn trước thay đổi giá phải có ít nhất 3 tháng.")
         else:
             st.markdown(f"---\n### Kịch bản: **{'Tăng' if percent_change > 0 else 'Giảm' if percent_change < 0 else 'Không đổi'} {abs(percent_change)}%**")
-            # Áp dụng thay đổi giá vào dữ liệu
-            monthly_adj = monthly.copy()
-            monthly_adj.loc[change_idx+1:, 'UnitPrice'] = monthly_adj.loc[change_idx+1:, 'UnitPrice'] * change_factor
-
-            # Chuẩn bị dữ liệu cho CausalImpact
-            data = monthly_adj[['Revenue', 'UnitPrice']].copy()
-            data = data.set_index(monthly_adj['Month'])
-            data.index = pd.to_datetime(data.index)
-            pre_period = [data.index[0].strftime('%Y-%m-%d'), data.index[change_idx].strftime('%Y-%m-%d')]
-            post_period = [data.index[change_idx+1].strftime('%Y-%m-%d'), data.index[-1].strftime('%Y-%m-%d')]
-
             try:
-                model = RevenueCausalImpactModel(df)
-                model.process_data()
-                # Ví dụ: chọn StockCode, Country, event_date từ giao diện hoặc mặc định
-                stock_code = df['StockCode'].iloc[0]
-                country = df['Country'].iloc[0]
-                event_date = monthly['Month'].iloc[change_idx+1]  # hoặc chọn mốc phù hợp
-                result, monthly = model.causal_impact(stock_code, country, event_date)
-                # Sau khi chạy ci = CausalImpact(...)
+                selected = grid[(grid['percent_change'] == percent_change) & (grid['event_date'] == event_date)] if not grid.empty else grid
+                result = selected.iloc[0] if len(selected) else None
                 if result is not None:
                     st.subheader("Kết quả phân tích tác động (giả lập Causal Impact)")
                     st.write(f"Doanh thu trung bình trước sự kiện: {result['pre_mean']:.2f}")
                     st.write(f"Doanh thu trung bình sau sự kiện: {result['post_mean']:.2f}")
                     st.write(f"Chênh lệch tuyệt đối: {result['impact']:.2f}")
                     st.write(f"Chênh lệch tương đối: {result['impact_pct']:.2f}%")
-                    st.write(f"p-value: {result['p_value']:.4f} {'(Có ý nghĩa)' if result['is_significant'] else '(Không có ý nghĩa)'}")
+                    st.write(f"p-value (Welch): {result['p_value']:.4f} {'(Có ý nghĩa)' if result['is_significant'] else '(Không có ý nghĩa)'}")
+                    st.write(f"p-value giả lập theo thời gian (dời mốc sự kiện trong giai đoạn trước): {result['placebo_p_value']:.4f}")
+                    st.write(f"Khoảng tin cậy bootstrap 95% của chênh lệch: [{result['boot_lower']:.2f}, {result['boot_upper']:.2f}]")
                 else:
                     st.warning("Không đủ dữ liệu để phân tích.")
 
@@ -114,6 +162,30 @@ def app(provided_df=None):
                 ax.legend()
                 st.pyplot(fig)
 
+                # Đối chứng tổng hợp: so với tổ hợp các sản phẩm không bị tác động cùng quốc gia
+                synth = model.synthetic_control(stock_code, country, event_date)
+                if synth is not None:
+                    st.subheader("Đối chứng tổng hợp")
+                    st.write(f"Chênh lệch trung bình sau sự kiện: {synth['avg_gap']:.2f} ({synth['avg_gap_pct']:.2f}%)")
+                    st.write(f"Khoảng tin cậy 95%: [{synth['avg_gap_lower']:.2f}, {synth['avg_gap_upper']:.2f}] {'(Có ý nghĩa)' if synth['is_significant'] else '(Không có ý nghĩa)'}")
+                    series = synth['series']
+                    fig, (ax1, ax2) = plt.subplots(2, 1, sharex=True, figsize=(8, 6))
+                    ax1.plot(series['Month'], series['actual'], marker='o', label='Thực tế')
+                    ax1.plot(series['Month'], series['synthetic'], linestyle='--', label='Đối chứng tổng hợp')
+                    ax1.axvline(event_date, color='red', linestyle='--')
+                    ax1.set_title('Doanh thu thực tế và đối chứng tổng hợp')
+                    ax1.legend()
+                    ax2.plot(series['Month'], series['gap'], marker='o', color='tab:green', label='Chênh lệch')
+                    ax2.fill_between(series['Month'], series['lower'], series['upper'], color='tab:green', alpha=0.2, label='Khoảng tin cậy 95%')
+                    ax2.axhline(0, color='gray', linewidth=0.8)
+                    ax2.axvline(event_date, color='red', linestyle='--')
+                    ax2.legend()
+                    st.pyplot(fig)
+                    st.dataframe(
+                        synth['weights'].head(10).rename(columns={'StockCode': 'Sản phẩm đối chứng', 'weight': 'Trọng số'}),
+                        hide_index=True
+                    )
+
                 # Nhận xét và quyết định (giữ nguyên như trước)
                 summary = model.summary_data if hasattr(model, 'summary_data') else None
                 decision_main = ""
@@ -303,3 +375,48 @@ def app(provided_df=None):
 
     else:
         st.info("Vui lòng tải lên file CSV có các cột: Date, Price, Quantity (và Revenue nếu có).")
+
+    with st.expander("🧪 Sàng lọc hàng loạt tất cả sản phẩm"):
+        event_source = st.radio(
+            "Mốc sự kiện",
+            ["Tháng đã chọn", "Tự động phát hiện thay đổi giá"],
+            horizontal=True
+        )
+        if event_source == "Tháng đã chọn":
+            st.markdown(f"Kiểm định Welch cho mọi sản phẩm tại **{country}** với mốc sự kiện **{monthly['Month'].iloc[change_idx+1].strftime('%m/%Y')}**.")
+        else:
+            min_change = st.slider("Mức thay đổi giá tối thiểu (%)", 5, 50, 10, step=5)
+            st.markdown(f"Tìm các tháng mà trung vị giá của sản phẩm tại **{country}** thay đổi ít nhất {min_change}%, rồi kiểm định từng sự kiện.")
+        if st.button("🚀 Sàng lọc"):
+            if event_source == "Tháng đã chọn":
+                keys = model.monthly_cube().keys
+                events = keys[keys['Country'] == country].assign(event_date=monthly['Month'].iloc[change_idx+1])
+            else:
+                events = model.detect_price_events(min_change=min_change / 100)
+                events = events[events['Country'] == country]
+                st.write(f"Phát hiện {len(events)} lần thay đổi giá.")
+            screened = model.batch_causal_impact(events, n_resamples=2000, n_jobs=os.cpu_count() or 1, seed=0)
+            if 'magnitude' in events.columns:
+                screened[['old_price', 'new_price', 'magnitude']] = events[['old_price', 'new_price', 'magnitude']].to_numpy()
+                screened['magnitude'] = screened['magnitude'] * 100
+            screened = screened[screened['valid']].sort_values(['placebo_p_value', 'p_value'])
+            st.write(f"{int(screened['is_significant'].sum())}/{len(screened)} sản phẩm có thay đổi doanh thu có ý nghĩa thống kê (p < 0.05).")
+            columns = ['StockCode', 'event_date', 'old_price', 'new_price', 'magnitude'] if 'magnitude' in screened.columns else ['StockCode']
+            columns += ['pre_mean', 'post_mean', 'impact', 'impact_pct', 't_stat', 'p_value', 'placebo_p_value', 'boot_lower', 'boot_upper']
+            st.dataframe(
+                screened[columns].rename(columns={
+                    'StockCode': 'Sản phẩm',
+                    'event_date': 'Tháng đổi giá',
+                    'old_price': 'Giá cũ',
+                    'new_price': 'Giá mới',
+                    'magnitude': 'Thay đổi giá (%)',
+                    'pre_mean': 'TB trước',
+                    'post_mean': 'TB sau',
+                    'impact': 'Chênh lệch',
+                    'impact_pct': 'Chênh lệch (%)',
+                    'placebo_p_value': 'p-value giả lập theo thời gian',
+                    'boot_lower': 'Bootstrap (cận dưới)',
+                    'boot_upper': 'Bootstrap (cận trên)',
+                }),
+                hide_index=True
+            )
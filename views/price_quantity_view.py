@@ -1,36 +1,125 @@
 import streamlit as st
 import pandas as pd
 
+from models.data_model import data_version, product_catalog, select_product
+from models.price_model import PriceElasticityModel
+from models.cross_price_model import CrossPriceModel
+
+# Cấu hình mặc định dùng chung với màn hình CausalImpact để hai nơi dùng chung một kết quả cache
+DEFAULT_MONTH_EFFECTS = True
+
+
+@st.cache_data(show_spinner="Đang ước lượng độ co giãn giá cho toàn danh mục...", max_entries=8)
+def catalog_elasticity(_df, dataset_version, month_effects):
+    """Độ co giãn giá của mọi sản phẩm, cache theo (phiên bản bộ dữ liệu, có hiệu ứng cố định tháng)"""
+    return PriceElasticityModel(_df).estimate(month_effects=month_effects)
+
+
+@st.cache_data(show_spinner="Đang tìm giá tối ưu cho toàn danh mục...", max_entries=16)
+def catalog_prices(_df, dataset_version, month_effects, cost_ratio):
+    """Giá đề xuất của mọi sản phẩm, cache theo (phiên bản bộ dữ liệu, hiệu ứng cố định, tỷ lệ giá vốn)"""
+    elasticity = catalog_elasticity(_df, dataset_version, month_effects)
+    return PriceElasticityModel(_df).recommend_prices(elasticity, cost_ratio=cost_ratio)
+
+
+@st.cache_data(show_spinner="Đang ước lượng độ co giãn chéo giữa các sản phẩm mua cùng nhau...", max_entries=4)
+def catalog_cross_elasticity(_df, dataset_version):
+    """Độ co giãn chéo của mọi cặp sản phẩm thường mua cùng nhau, cache theo phiên bản bộ dữ liệu"""
+    return CrossPriceModel(_df).estimate()
+
 
 def render_price_quantity_analysis(df):
     st.subheader("💰 Phân tích Giá và Số lượng")
 
-    df = df.dropna(subset=["UnitPrice", "Quantity", "Description", "StockCode"])
-    df["Label"] = df["Description"].astype(str) + " (" + df["StockCode"].astype(str) + ")"
+    dataset_version = data_version(df)
+    catalog = product_catalog(df, dataset_version)
+    labels = catalog["Label"].to_numpy()
 
     with st.form("price_form"):
         st.markdown("### Thiết lập thông tin phân tích")
-        product = st.selectbox("Chọn sản phẩm", df["Label"].unique())
+        product_id = st.selectbox("Chọn sản phẩm", catalog.index.tolist(), format_func=lambda i: labels[i])
+        month_effects = st.checkbox("Loại bỏ xu hướng / mùa vụ (hiệu ứng cố định theo tháng của từng sản phẩm)",
+                                    value=DEFAULT_MONTH_EFFECTS)
+        objective = st.radio("🎯 Mục tiêu tối ưu giá", ["Doanh thu", "Lợi nhuận gộp"], horizontal=True)
+        cost_ratio = st.slider("Giá vốn (% giá bán hiện tại)", 0, 95, 60, step=5) / 100
         submitted = st.form_submit_button("📊 Phân tích & Hành động")
 
     if submitted:
-        product_df = df[df["Label"] == product]
+        product_df = select_product(df, catalog, product_id).dropna(subset=["UnitPrice", "Quantity"])
 
         if product_df.empty:
             st.error("Không tìm thấy dữ liệu cho sản phẩm đã chọn.")
             return
 
+        stock_code = catalog.at[product_id, "StockCode"]
         product_df = product_df.groupby("UnitPrice")["Quantity"].sum().reset_index()
 
+        elasticity = catalog_elasticity(df, dataset_version, month_effects)
+        estimate = elasticity[elasticity["StockCode"] == stock_code].iloc[0]
+        prices = catalog_prices(df, dataset_version, month_effects, cost_ratio if objective == "Lợi nhuận gộp" else None)
+        recommendation = prices[prices["StockCode"] == stock_code].iloc[0]
+        lift_column = "Margin_Lift_Pct" if objective == "Lợi nhuận gộp" else "Revenue_Lift_Pct"
+
         st.markdown("### 🔍 Phân tích mối quan hệ Giá và Số lượng")
         st.dataframe(product_df)
         st.line_chart(product_df.set_index("UnitPrice"))
 
-        tab1, tab2 = st.tabs(["📊 Kết quả DSS", "💡 Gợi ý hành động"])
+        tab1, tab2, tab3, tab4 = st.tabs(["📊 Kết quả DSS", "💡 Gợi ý hành động", "📚 Toàn danh mục", "🔗 Sản phẩm liên quan"])
         with tab1:
-            st.markdown("#### Dữ liệu cho thấy mối quan hệ giữa giá và số lượng bán")
+            st.markdown("#### Độ co giãn của cầu theo giá (hồi quy log số lượng theo log giá)")
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Độ co giãn", "—" if pd.isna(estimate["Elasticity"]) else f"{estimate['Elasticity']:.2f}")
+            col2.metric("Khoảng tin cậy 95%", "—" if pd.isna(estimate["CI_Lower"]) else f"[{estimate['CI_Lower']:.2f}, {estimate['CI_Upper']:.2f}]")
+            col3.metric("Số quan sát", f"{int(estimate['N_Obs'])} ({int(estimate['N_Prices'])} mức giá)")
+            st.caption("Độ co giãn -1.5 nghĩa là khi giá tăng 1% thì số lượng bán giảm khoảng 1.5%.")
+
+            st.markdown(f"#### Giá đề xuất (tối đa hóa {objective.lower()}, thay đổi tối đa ±20%)")
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Giá hiện tại", f"{recommendation['Current_Price']:.2f}")
+            col2.metric("Giá đề xuất", f"{recommendation['Optimal_Price']:.2f}", f"{recommendation['Price_Change_Pct']:+.1f}%")
+            col3.metric(f"{objective} dự kiến tăng", f"{recommendation[lift_column]:+.1f}%")
         with tab2:
-            if product_df["Quantity"].iloc[-1] < product_df["Quantity"].iloc[0]:
-                st.warning("⚠️ Khi tăng giá thì số lượng giảm → nên xem xét chiến lược giá hợp lý hơn.")
+            if pd.isna(estimate["Elasticity"]):
+                st.info("ℹ️ Chưa đủ dữ liệu (ít quan sát hoặc giá không thay đổi) để ước lượng độ co giãn của sản phẩm này.")
+            elif estimate["CI_Upper"] < -1:
+                st.warning("⚠️ Cầu co giãn mạnh: tăng giá làm doanh thu giảm → nên giữ giá hoặc thử giảm giá / khuyến mãi.")
+            elif estimate["CI_Lower"] > -1 and estimate["CI_Upper"] < 0:
+                st.success("✅ Cầu ít co giãn: số lượng giảm ít hơn mức tăng giá → có thể cân nhắc tăng giá để tăng doanh thu.")
+            elif estimate["CI_Lower"] > 0:
+                st.info("ℹ️ Số lượng tăng cùng giá: nhiều khả năng do yếu tố khác (mùa vụ, khuyến mãi), cần phân tích thêm.")
+            elif estimate["CI_Upper"] < 0:
+                st.info("ℹ️ Tăng giá làm số lượng giảm, nhưng chưa rõ doanh thu tăng hay giảm (khoảng tin cậy chứa -1).")
+            else:
+                st.info("ℹ️ Độ co giãn chưa có ý nghĩa thống kê rõ ràng → thử nghiệm thay đổi giá nhỏ trước khi áp dụng.")
+            if recommendation["Is_Significant"] and abs(recommendation["Price_Change_Pct"]) > 0.5:
+                st.info(f"💡 Đề xuất {'tăng' if recommendation['Price_Change_Pct'] > 0 else 'giảm'} giá "
+                        f"{abs(recommendation['Price_Change_Pct']):.0f}% (từ {recommendation['Current_Price']:.2f} "
+                        f"thành {recommendation['Optimal_Price']:.2f}): {objective.lower()} dự kiến thay đổi "
+                        f"{recommendation[lift_column]:+.1f}%.")
+                if recommendation["At_Limit"]:
+                    st.caption("Giá tối ưu của đường cầu ước lượng nằm ngoài khoảng ±20% nên đề xuất dừng ở giới hạn; "
+                               "nên thay đổi từng bước và đo lại phản ứng của cầu.")
+        with tab3:
+            st.markdown("#### Độ co giãn giá của toàn bộ sản phẩm")
+            estimated = elasticity.dropna(subset=["Elasticity"])
+            st.caption(f"Ước lượng được {len(estimated)} / {len(elasticity)} sản phẩm; "
+                       f"trung vị độ co giãn {estimated['Elasticity'].median():.2f}.")
+            st.dataframe(estimated.sort_values("Elasticity"), use_container_width=True, hide_index=True)
+
+            st.markdown(f"#### Giá đề xuất cho toàn bộ sản phẩm (theo {objective.lower()} dự kiến tăng)")
+            st.dataframe(prices.sort_values(lift_column, ascending=False), use_container_width=True, hide_index=True)
+        with tab4:
+            st.markdown("#### Ảnh hưởng của giá sản phẩm mua kèm lên số lượng bán của sản phẩm này")
+            cross = catalog_cross_elasticity(df, dataset_version)
+            related = cross[cross["StockCode"] == stock_code]
+            if related.empty:
+                st.info("ℹ️ Sản phẩm chưa có đủ cặp mua kèm (đồng xuất hiện trong hóa đơn và đủ số tháng có giá) để ước lượng.")
             else:
-                st.success("✅ Sản phẩm có thể duy trì hoặc tăng giá mà không ảnh hưởng lớn đến doanh số.")
+                st.caption("Độ co giãn chéo dương: sản phẩm thay thế (giá sản phẩm kia tăng thì sản phẩm này bán thêm); "
+                           "âm: sản phẩm bổ sung (thường mua cùng nhau).")
+                st.dataframe(
+                    related[["Related_StockCode", "Related_Description", "Co_Occurrence", "Cross_Elasticity",
+                             "CI_Lower", "CI_Upper", "P_Value", "N_Months", "Relationship"]],
+                    use_container_width=True,
+                    hide_index=True
+                )
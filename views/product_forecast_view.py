@@ -1,11 +1,16 @@
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
-try:
-    from controllers.revenue_forecast_controller import RevenueForecastController
-    from models.revenue_forecast_model import PROPHET_AVAILABLE
-except ImportError:
-    PROPHET_AVAILABLE = False
+from controllers.revenue_forecast_controller import RevenueForecastController
+from models.data_model import data_version
+from models.forecast_store import ForecastStore
+from models.revenue_forecast_model import PROPHET_AVAILABLE
+
+
+@st.cache_resource(show_spinner="Đang chuẩn bị dữ liệu dự báo...", max_entries=2)
+def _forecast_controller(_df, dataset_version, store_modified_at):
+    """Controller (khối doanh thu theo tháng + kho dự báo) dựng một lần cho mỗi phiên bản dữ liệu và kho"""
+    return RevenueForecastController(_df)
 
 class RevenueForecastView:
     def __init__(self, controller):
@@ -13,11 +18,6 @@ class RevenueForecastView:
 
     def display(self):
         st.title("🔮 Dự báo Doanh thu Sản phẩm theo Tháng")
-        
-        if not PROPHET_AVAILABLE:
-            st.error("⚠️ Module 'prophet' không được cài đặt. Vui lòng cài đặt bằng lệnh: pip install prophet")
-            st.info("Các chức năng khác vẫn hoạt động bình thường. Hãy thử các phân tích khác trong ứng dụng.")
-            return
 
         uploaded_file = st.file_uploader("📂 Chọn file CSV dữ liệu", type=["csv"])
         if uploaded_file:
@@ -55,19 +55,42 @@ class RevenueForecastView:
                 st.error("❌ Không có đủ dữ liệu hợp lệ để phân tích.")
                 return
 
-            col1, col2 = st.columns(2)
-            stock_code = col1.selectbox("🎢 Chọn sản phẩm", stock_codes)
-            country = col2.selectbox("🌎 Chọn quốc gia", countries)
+            mode = st.radio(
+                "🧭 Chế độ dự báo",
+                ["Từng sản phẩm", "Phân cấp (SKU → quốc gia → tổng)", "Quét cảnh báo toàn danh mục"],
+                horizontal=True
+            )
             forecast_months = st.number_input("📆 Số tháng cần dự báo", min_value=1, value=3, step=1)
+
+            # Controller được dùng lại giữa các lần chạy lại; dựng lại khi dữ liệu hoặc kho dự báo thay đổi
+            dataset_version = data_version(df, ["StockCode", "Country", "Date", "Revenue"])
+            self.controller = _forecast_controller(df, dataset_version, ForecastStore().modified_at())
+
+            if mode == "Phân cấp (SKU → quốc gia → tổng)":
+                self.display_hierarchy(forecast_months)
+                return
+
             threshold = st.number_input("⚠️ Ngưỡng cảnh báo (%)", min_value=0.0, value=10.0, step=1.0)
 
-            # Khởi tạo controller từ dataframe
-            self.controller = RevenueForecastController(df)
+            if mode == "Quét cảnh báo toàn danh mục":
+                self.display_alert_scan(forecast_months, threshold)
+                return
+
+            # Chỉ dự báo từng sản phẩm cần Prophet (khi kho chưa có hoặc đã cũ); các chế độ khác dùng mô hình Holt
+            if not PROPHET_AVAILABLE:
+                st.warning("⚠️ Module 'prophet' không được cài đặt: chỉ dùng được dự báo có sẵn trong kho. "
+                           "Cài đặt bằng lệnh: pip install prophet")
+
+            col1, col2 = st.columns(2)
+            stock_code = col1.selectbox("🎢 Chọn sản phẩm", stock_codes)
+            country = col2.selectbox("🌎 Chọn quốc gia", countries)
 
             if st.button("🚀 Chạy dự báo"):
-                forecast, monthly = self.controller.get_forecast(stock_code, country, forecast_months)
+                forecast, monthly, source = self.controller.get_forecast(stock_code, country, forecast_months)
 
-                if forecast is None:
+                if forecast is None and not PROPHET_AVAILABLE:
+                    st.error("❌ Kho chưa có dự báo còn mới cho sản phẩm này và không thể khớp trực tiếp khi thiếu 'prophet'.")
+                elif forecast is None:
                     st.error("❌ Không có dữ liệu phù hợp.")
                 else:
                     forecast_result = pd.DataFrame({
@@ -79,6 +102,15 @@ class RevenueForecastView:
 
                     st.subheader("📊 Kết quả Dự báo")
                     st.dataframe(forecast_result)
+                    if source == "store":
+                        manifest = self.controller.store.manifest()
+                        st.caption(f"⚡ Lấy từ kho dự báo tính trước (phiên bản dữ liệu {manifest['dataset_version']}, cập nhật {manifest['created_at']})")
+                    else:
+                        st.caption("🐢 Dự báo được khớp trực tiếp do kho chưa có hoặc đã cũ cho sản phẩm này.")
+
+                    breached = forecast_result[forecast_result["So với TB 3T (%)"].abs() >= threshold]
+                    if not breached.empty:
+                        st.warning(f"⚠️ {len(breached)} tháng dự báo lệch quá {threshold:.1f}% so với trung bình 3 tháng: {', '.join(breached['Tháng dự báo'])}")
 
                     st.subheader("📈 Biểu đồ Dự báo")
                     fig, ax = plt.subplots(figsize=(10, 4))
@@ -89,13 +121,64 @@ class RevenueForecastView:
                     ax.legend()
                     st.pyplot(fig)
 
+    def display_alert_scan(self, forecast_months, threshold):
+        if st.button("🔎 Quét toàn danh mục"):
+            alerts, source = self.controller.scan_alerts(forecast_months, threshold)
+
+            if alerts is None or alerts.empty:
+                st.success(f"✅ Không có sản phẩm nào lệch quá {threshold:.1f}% so với trung bình 3 tháng.")
+                return
+
+            source = "kho dự báo tính trước" if source == "store" else "dự báo hàng loạt trực tiếp"
+            st.subheader(f"🚨 {len(alerts)} sản phẩm vượt ngưỡng {threshold:.1f}%")
+            st.caption(f"Nguồn dự báo: {source}. Sắp xếp theo doanh thu rủi ro (tổng phần doanh thu dự báo giảm so với trung bình 3 tháng trong các tháng vượt ngưỡng).")
+            st.dataframe(
+                alerts.assign(first_breach=alerts["first_breach"].dt.strftime("%m/%Y")).rename(columns={
+                    "StockCode": "Sản phẩm",
+                    "Country": "Quốc gia",
+                    "first_breach": "Tháng vượt đầu tiên",
+                    "months_breached": "Số tháng vượt",
+                    "worst_pct_change": "Lệch lớn nhất (%)",
+                    "recent_avg": "TB 3 tháng",
+                    "revenue_at_risk": "Doanh thu rủi ro",
+                }),
+                hide_index=True
+            )
+
+    def display_hierarchy(self, forecast_months):
+        methods = {
+            "MinT (phương sai phần dư)": "mint",
+            "Bình phương tối thiểu (OLS)": "ols",
+            "Cộng dồn từ dưới lên (bottom-up)": "bottom_up",
+        }
+        method_label = st.selectbox("🧮 Phương pháp đối soát", list(methods))
+
+        if st.button("🚀 Chạy dự báo phân cấp"):
+            result = self.controller.get_hierarchy_forecast(forecast_months, methods[method_label])
+
+            if result is None or result.empty:
+                st.error("❌ Không có dữ liệu phù hợp.")
+                return
+
+            result = result.assign(ds=result["ds"].dt.strftime("%m/%Y"))
+            table_columns = {"ds": "Tháng dự báo", "yhat_base": "Dự báo gốc", "yhat": "Dự báo đối soát"}
+
+            st.subheader("📊 Tổng doanh thu")
+            total = result[result["level"] == "total"]
+            st.dataframe(total[list(table_columns)].rename(columns=table_columns), hide_index=True)
+
+            st.subheader("🌎 Theo quốc gia")
+            by_country = result[result["level"] == "country"].pivot(index="Country", columns="ds", values="yhat")
+            st.dataframe(by_country)
+
+            st.subheader("🛒 Theo sản phẩm")
+            sku = result[result["level"] == "sku"]
+            st.dataframe(
+                sku[["StockCode", "Country"] + list(table_columns)].rename(columns=table_columns),
+                hide_index=True
+            )
+            st.caption("Dự báo đối soát đảm bảo tổng các SKU bằng tổng quốc gia và bằng tổng doanh thu.")
+
 def render_product_forecast_analysis(df):
-    try:
-        from models.revenue_forecast_model import PROPHET_AVAILABLE
-        if not PROPHET_AVAILABLE:
-            st.error("⚠️ Module 'prophet' không được cài đặt. Vui lòng cài đặt bằng lệnh: pip install prophet")
-            return
-        view = RevenueForecastView(None)
-        view.display()
-    except ImportError:
-        st.error("⚠️ Module 'prophet' không được cài đặt. Vui lòng cài đặt bằng lệnh: pip install prophet")
+    view = RevenueForecastView(None)
+    view.display()
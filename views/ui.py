@@ -78,7 +78,7 @@ class UIView:
         
         return k, ref_date, country_filter, revenue_target
         
-    def analysis_page(self, df_rfm, summary_df, revenue_target, latest_date, monthly_revenue):
+    def analysis_page(self, df_rfm, summary_df, revenue_target, latest_date, monthly_revenue, cluster_forecast=None):
         """
         Display the analysis page with cluster insights and action plans
         
@@ -94,6 +94,8 @@ class UIView:
             The latest date in the dataset for forecast reference
         monthly_revenue : dict
             Dictionary containing monthly revenue data for each cluster
+        cluster_forecast : dict, optional
+            Dictionary containing revenue forecasts and intervals for each cluster
         """
         # Phân loại cụm theo số lượng cụm đã chọn
         try:
@@ -173,9 +175,9 @@ class UIView:
         # Điền nội dung cho từng tab
         for idx, cluster_id in enumerate(cluster_ids):
             with tabs[idx]:
-                self.show_cluster_tab(cluster_id, df_rfm, summary_df, revenue_target, latest_date, monthly_revenue)
+                self.show_cluster_tab(cluster_id, df_rfm, summary_df, revenue_target, latest_date, monthly_revenue, cluster_forecast)
         
-    def show_cluster_tab(self, cluster_id, df_rfm, summary_df, revenue_target, latest_date, monthly_revenue):
+    def show_cluster_tab(self, cluster_id, df_rfm, summary_df, revenue_target, latest_date, monthly_revenue, cluster_forecast=None):
         """
         Display content for each cluster tab
         
@@ -193,6 +195,8 @@ class UIView:
             The latest date in the dataset for forecast reference
         monthly_revenue : dict
             Dictionary containing monthly revenue data for each cluster
+        cluster_forecast : dict, optional
+            Dictionary containing revenue forecasts and intervals for each cluster
         """
         # Get cluster data
         cluster_df = df_rfm[df_rfm['Cluster'] == cluster_id].copy()
@@ -214,7 +218,7 @@ class UIView:
             
         # Cột phải: Biểu đồ doanh thu
         with col_right:
-            self.show_forecast_chart(revenue_target, latest_date, cluster_id, monthly_revenue)
+            self.show_forecast_chart(revenue_target, latest_date, cluster_id, monthly_revenue, cluster_forecast)
             
             # Hiển thị giải thích biểu đồ trực tiếp
             st.markdown("""
@@ -232,7 +236,7 @@ class UIView:
                     </li>
                     <li style="display:flex; align-items:center; margin-bottom:8px;">
                         <div style="width:12px; height:12px; background-color:#f39c12; border-radius:50%; margin-right:10px;"></div>
-                        <span>Đường màu cam: Dự báo doanh thu 3 tháng tiếp theo</span>
+                        <span>Đường màu cam: Dự báo doanh thu 3 tháng tiếp theo (vùng tô: khoảng dự báo 95%)</span>
                     </li>
                     <li style="display:flex; align-items:center; margin-bottom:8px;">
                         <div style="width:12px; height:2px; background-color:#e74c3c; margin-right:10px;"></div>
@@ -378,20 +382,41 @@ class UIView:
         """, unsafe_allow_html=True)
         
         try:
-            # Sort customers by Monetary value (descending)
-            sorted_customers = cluster_df.sort_values(by='Monetary', ascending=False)
+            # Sắp xếp theo chi tiêu (mặc định) hoặc theo nguy cơ rời bỏ nếu đã chấm điểm
+            sort_by = 'Monetary'
+            if 'Churn_Risk' in cluster_df.columns:
+                sort_label = st.radio(
+                    "Sắp xếp theo",
+                    ["Tổng chi tiêu", "Nguy cơ rời bỏ"],
+                    horizontal=True,
+                    key=f"customer_sort_{cluster_df['Cluster'].iloc[0]}",
+                )
+                if sort_label == "Nguy cơ rời bỏ":
+                    sort_by = 'Churn_Risk'
+            sorted_customers = cluster_df.sort_values(by=sort_by, ascending=False)
             
             # Prepare data for display - lấy tất cả khách hàng
-            customer_table = sorted_customers[['CustomerID', 'Recency', 'Frequency', 'Monetary']].copy()
+            columns = ['CustomerID', 'Recency', 'Frequency', 'Monetary'] + \
+                [c for c in ['CLV', 'Churn_Risk'] if c in sorted_customers.columns]
+            customer_table = sorted_customers[columns].copy()
             
             # Format columns
             customer_table['CustomerID'] = customer_table['CustomerID'].astype(int)
             customer_table['Recency'] = customer_table['Recency'].round(0).astype(int)
             customer_table['Frequency'] = customer_table['Frequency'].round(1)
             customer_table['Monetary'] = customer_table['Monetary'].round(2)
+            if 'Churn_Risk' in customer_table.columns:
+                customer_table['Churn_Risk'] = (customer_table['Churn_Risk'] * 100).round(1)
             
             # Rename columns for better display
-            customer_table.columns = ['ID Khách hàng', 'Ngày từ lần mua cuối', 'Số lần mua', 'Tổng chi tiêu ($)']
+            customer_table = customer_table.rename(columns={
+                'CustomerID': 'ID Khách hàng',
+                'Recency': 'Ngày từ lần mua cuối',
+                'Frequency': 'Số lần mua',
+                'Monetary': 'Tổng chi tiêu ($)',
+                'CLV': 'CLV dự báo 12 tháng ($)',
+                'Churn_Risk': 'Nguy cơ rời bỏ (%)',
+            })
             
             # Hiển thị tổng số khách hàng
             st.markdown(f"""
@@ -418,7 +443,7 @@ class UIView:
         # Đóng div của khung viền
         st.markdown("</div>", unsafe_allow_html=True)
     
-    def show_forecast_chart(self, revenue_target, latest_date, cluster_id, monthly_revenue):
+    def show_forecast_chart(self, revenue_target, latest_date, cluster_id, monthly_revenue, cluster_forecast=None):
         """
         Display forecast chart for a specific cluster
         
@@ -432,6 +457,8 @@ class UIView:
             Cluster ID to display chart for
         monthly_revenue : dict
             Dictionary containing monthly revenue data for each cluster
+        cluster_forecast : dict, optional
+            Dictionary containing revenue forecasts and intervals for each cluster
         """
         # Tạo tiêu đề với khung viền vừa với nội dung
         st.markdown("""
@@ -456,29 +483,28 @@ class UIView:
         months = cluster_data['months']
         actual_values = np.array(cluster_data['revenue'], dtype=np.float64)
         
-        # Generate forecast values - slight upward trend from the last actual value
-        last_value = actual_values[-1] if len(actual_values) > 0 else 0
-        
-        # Create forecast for 3 months after the last month
-        forecast_values = []
-        for i in range(3):
-            # Progressive increase with some randomness
-            forecast_value = last_value * (1.0 + 0.05 * (i+1)) * (0.9 + 0.2 * np.random.random())
-            forecast_values.append(forecast_value)
+        # Get forecast values and intervals computed together with the clustering result
+        cluster_pred = (cluster_forecast or {}).get(cluster_id)
+        if cluster_pred is None:
+            st.info("Chưa có dự báo cho cụm này, chỉ hiển thị doanh thu thực tế.")
+            forecast_values, forecast_lower, forecast_upper = [], [], []
+        else:
+            forecast_values = cluster_pred['forecast']
+            forecast_lower = cluster_pred['lower']
+            forecast_upper = cluster_pred['upper']
         
         # Add forecast months to the months list
         if latest_date is not None:
-            # Generate forecast period (3 months after latest_date)
-            forecast_end = latest_date + pd.DateOffset(months=3)
-            forecast_period = pd.date_range(start=latest_date + pd.DateOffset(days=1), 
-                                           end=forecast_end, freq='MS')
+            # Generate forecast period (the months after latest_date)
+            forecast_period = pd.date_range(start=latest_date + pd.offsets.MonthBegin(1),
+                                            periods=len(forecast_values), freq='MS')
             
             # Add forecast months to the list
             forecast_months = [d.strftime("%b %Y") for d in forecast_period]
             all_months = months + forecast_months
         else:
             # If no latest_date, just add generic labels
-            forecast_months = ["Next 1", "Next 2", "Next 3"]
+            forecast_months = [f"Next {i + 1}" for i in range(len(forecast_values))]
             all_months = months + forecast_months
         
         # Create arrays for plotting
@@ -495,13 +521,18 @@ class UIView:
         ax.plot(np.arange(len(months)), actual_values, marker='o', linewidth=2.5, 
                 color='#3498db', label='Doanh thu thực tế', markersize=6)
         
-        # Plot prediction values with improved styling
-        forecast_start_idx = len(months) - 1
-        forecast_x = np.arange(forecast_start_idx, forecast_start_idx + len(forecast_values) + 1)
-        forecast_y = np.concatenate(([actual_values[-1]], forecast_values))
-        
-        ax.plot(forecast_x, forecast_y, marker='o', linewidth=2.5, 
-                color='#f39c12', linestyle='--', label='Dự báo', markersize=6)
+        # Plot prediction values and interval with improved styling
+        if forecast_values:
+            forecast_start_idx = len(months) - 1
+            forecast_x = np.arange(forecast_start_idx, forecast_start_idx + len(forecast_values) + 1)
+            forecast_y = np.concatenate(([actual_values[-1]], forecast_values))
+            
+            ax.fill_between(forecast_x,
+                            np.concatenate(([actual_values[-1]], forecast_lower)),
+                            np.concatenate(([actual_values[-1]], forecast_upper)),
+                            color='#f39c12', alpha=0.2, label='Khoảng dự báo 95%')
+            ax.plot(forecast_x, forecast_y, marker='o', linewidth=2.5, 
+                    color='#f39c12', linestyle='--', label='Dự báo', markersize=6)
         
         # Plot target value line with improved styling
         revenue_target_float = float(revenue_target)
@@ -764,6 +795,86 @@ class UIView:
         else:
             return "Phân tích kỹ lưỡng hành vi khách hàng để xây dựng chiến lược phù hợp. Cân nhắc thử nghiệm các phương pháp tiếp thị mới."
 
+    def cohort_page(self, cohorts):
+        """
+        Hiển thị ma trận giữ chân khách hàng theo cohort dưới dạng biểu đồ nhiệt
+
+        Parameters:
+        -----------
+        cohorts : dict
+            Kết quả RFMModel.cohort_retention
+        """
+        if not cohorts:
+            return
+
+        st.markdown("---")
+        st.subheader("🔁 Tỷ lệ giữ chân khách hàng theo cohort")
+        st.caption("Mỗi dòng là nhóm khách hàng có lần mua đầu tiên trong cùng tháng; "
+                   "mỗi cột là số tháng kể từ lần mua đầu tiên.")
+
+        tab_retention, tab_revenue = st.tabs(["👥 Tỷ lệ khách hàng quay lại", "💰 Doanh thu"])
+        for tab, matrix, fmt, cmap in [
+            (tab_retention, cohorts['retention'] * 100, ".0f", "Blues"),
+            (tab_revenue, cohorts['revenue'], ".0f", "Greens"),
+        ]:
+            with tab:
+                n_rows, n_cols = matrix.shape
+                fig, ax = plt.subplots(figsize=(min(2 + n_cols * 0.7, 16), min(1.5 + n_rows * 0.4, 12)))
+                # Chỉ để trống ô chưa quan sát được (cohort chưa đủ số tháng); tỷ lệ 0 thật vẫn hiển thị
+                sns.heatmap(matrix.where(cohorts['observed']), annot=n_rows <= 24 and n_cols <= 24, fmt=fmt,
+                            cmap=cmap, ax=ax, cbar=True)
+                ax.set_xlabel("Số tháng kể từ lần mua đầu")
+                ax.set_ylabel("Cohort (tháng mua đầu tiên)")
+                st.pyplot(fig)
+                plt.close(fig)
+
+        size = cohorts['cohort_size'].rename('Số khách hàng mới').to_frame()
+        size['Giữ chân sau 1 tháng (%)'] = (cohorts['retention'].get(1, np.nan) * 100).round(1)
+        st.dataframe(size, use_container_width=True)
+
+    def lookalike_page(self, index, df_rfm):
+        """
+        Tìm khách hàng tương tự một nhóm khách hàng mẫu (mặc định: nhóm chi tiêu cao nhất)
+
+        Parameters:
+        -----------
+        index : LookalikeIndex
+            Chỉ mục khách hàng đã dựng sẵn
+        df_rfm : DataFrame
+            RFM data with cluster assignments
+        """
+        if index is None:
+            return
+
+        st.markdown("---")
+        st.subheader("🎯 Tìm khách hàng tương tự (Lookalike)")
+        st.caption("So khớp theo RFM và cơ cấu sản phẩm đã mua; độ tương tự là cosine với khách hàng mẫu gần nhất.")
+
+        top_spenders = df_rfm.nlargest(10, 'Monetary')['CustomerID'].astype(int).tolist()
+        col1, col2 = st.columns([3, 1])
+        seeds = col1.multiselect("Khách hàng mẫu (mặc định: 10 khách chi tiêu cao nhất)",
+                                 df_rfm['CustomerID'].astype(int).tolist(), default=top_spenders)
+        k = col2.number_input("Số khách hàng cần tìm", min_value=5, max_value=500, value=20, step=5)
+        if not seeds:
+            st.info("Chọn ít nhất một khách hàng mẫu.")
+            return
+
+        lookalikes = index.query(seeds, k=int(k))
+        clusters = df_rfm.set_index('CustomerID')['Cluster']
+        lookalikes['Cluster'] = lookalikes['CustomerID'].map(clusters)
+        lookalikes = lookalikes.rename(columns={
+            'CustomerID': 'ID Khách hàng',
+            'Similarity': 'Độ tương tự',
+            'Nearest_Seed': 'Giống khách hàng mẫu',
+            'Recency': 'Ngày từ lần mua cuối',
+            'Frequency': 'Số lần mua',
+            'Monetary': 'Tổng chi tiêu ($)',
+            'Cluster': 'Cụm',
+        })
+        st.dataframe(lookalikes, hide_index=True, use_container_width=True)
+        st.download_button("⬇️ Tải danh sách khách hàng tương tự", lookalikes.to_csv(index=False).encode('utf-8'),
+                           file_name="lookalike_customers.csv", mime="text/csv")
+
     def show_error(self, msg):
         """Display error message"""
         st.error(f"❌ Lỗi: {msg}")
@@ -27,7 +27,7 @@ class RevenueForecastView:
             threshold = st.number_input("⚠️ Ngưỡng cảnh báo (%)", min_value=0.0, value=10.0, step=1.0)
 
             if st.button("🚀 Chạy dự báo"):
-                forecast, monthly = self.controller.get_forecast(stock_code, country, forecast_months)
+                forecast, monthly, _ = self.controller.get_forecast(stock_code, country, forecast_months)
 
                 if forecast is None:
                     st.error("❌ Không có dữ liệu phù hợp.")
@@ -1,3 +1,4 @@
+import os
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -5,14 +6,51 @@ import numpy as np
 import seaborn as sns
 import altair as alt
 from io import StringIO
+from models.inventory_model import InventoryModel
+from models.data_model import add_calendar_columns, data_version, product_catalog, select_product
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def classify_window(_df, dataset_key, time_filter, time_value, _catalog=None):
+    """Phân loại ABC/XYZ của toàn danh mục trong một khoảng thời gian, cache theo (bộ dữ liệu, khoảng thời gian)"""
+    return InventoryModel(_df, _catalog).classify()
+
+# Các ngưỡng chia nhóm chênh lệch tồn kho cho biểu đồ nhiệt
+GAP_BINS = [-np.inf, -100, -50, -10, 10, 50, 100, np.inf]
+GAP_BIN_LABELS = ["≤ -100", "-100…-50", "-50…-10", "-10…10", "10…50", "50…100", "> 100"]
+ACTIONS = ["Thiếu hàng", "Dư tồn kho", "Hợp lý"]
+PAGE_SIZE = 50
+
+
+def gap_actions(gap, threshold=10):
+    """Nhóm hành động cho từng sản phẩm theo chênh lệch tồn kho (vector hóa)"""
+    gap = np.asarray(gap)
+    return np.select([gap > threshold, gap < -threshold], ACTIONS[:2], ACTIONS[2])
+
+
+def gap_heatmap_table(top_df):
+    """Số sản phẩm theo (nhóm ABC, khoảng chênh lệch), tổng hợp phía máy chủ cho toàn danh mục"""
+    gap_bin = pd.cut(top_df['Gap'], bins=GAP_BINS, labels=GAP_BIN_LABELS)
+    return pd.crosstab(top_df['ABC'], gap_bin).reindex(index=list("ABC"), columns=GAP_BIN_LABELS, fill_value=0)
+
+
+def paginate(frame, key):
+    """Hiển thị một trang của bảng lớn, chỉ gửi PAGE_SIZE dòng tới trình duyệt"""
+    n_pages = max(1, -(-len(frame) // PAGE_SIZE))
+    page = st.number_input(f"Trang (1-{n_pages})", min_value=1, max_value=n_pages, value=1, key=key) if n_pages > 1 else 1
+    start = (page - 1) * PAGE_SIZE
+    st.dataframe(frame.iloc[start:start + PAGE_SIZE], use_container_width=True, hide_index=True)
+    st.caption(f"Hiển thị {start + 1}-{min(start + PAGE_SIZE, len(frame))} / {len(frame)} sản phẩm")
 
 # Inventory optimization logic (Deterministic)
-def inventory_optimize(df, time_filter, time_value, stock_code, avg_demand, holding_cost, ordering_cost, lead_time):
-    df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'], errors='coerce')
-    df['Month'] = df['InvoiceDate'].dt.month
-    df['Quarter'] = df['InvoiceDate'].dt.quarter
-    df['Year'] = df['InvoiceDate'].dt.year
-    df['Revenue'] = df['Quantity'] * df['UnitPrice']
+def inventory_optimize(df, time_filter, time_value, product_id, avg_demand, holding_cost, ordering_cost, lead_time,
+                       stochastic=False, service_level=0.95, lead_time_std=0.0, abc_filter=None, xyz_filter=None,
+                       simulate_policy=False, stockout_cost=0.0, dataset_key=None):
+    # Dữ liệu dùng chung giữa các phiên chỉ được đọc; cột lịch đã có sẵn từ lúc nạp dữ liệu
+    df = add_calendar_columns(df)
+    if dataset_key is None:
+        dataset_key = data_version(df)
+    # Danh mục của toàn bộ dữ liệu: mô tả chuẩn của mỗi StockCode, giống nhau ở mọi khoảng thời gian
+    catalog = product_catalog(df, dataset_key)
 
     if time_filter == "Tháng":
         df = df[df['Month'] == time_value]
@@ -21,51 +59,69 @@ def inventory_optimize(df, time_filter, time_value, stock_code, avg_demand, hold
     elif time_filter == "Năm":
         df = df[df['Year'] == time_value]
 
-    if stock_code:
-        df = df[df['Description'] == stock_code]
+    if df.empty:
+        return pd.DataFrame()
+
+    # Phân loại trên toàn danh mục của khoảng thời gian, trước khi lọc theo sản phẩm / nhóm
+    classes = classify_window(df, dataset_key, time_filter, time_value, catalog)
+    if abc_filter or xyz_filter:
+        selected = classes[classes['ABC'].isin(abc_filter or list("ABC")) & classes['XYZ'].isin(xyz_filter or list("XYZ"))]
+        df = df[df['StockCode'].isin(selected['StockCode'])]
 
-    summary = df.groupby(['StockCode', 'Description']).agg({
-        'Quantity': 'sum',
-        'Revenue': 'sum'
-    }).reset_index()
+    if product_id is not None:
+        df = select_product(df, catalog, product_id)
 
-    if summary.empty:
+    if df.empty:
         return pd.DataFrame()
 
-    summary['Current_Stock'] = np.random.randint(20, 200, size=len(summary))
+    # EOQ, điểm đặt hàng lại và tồn kho chu kỳ theo nhu cầu quan sát được của từng sản phẩm;
+    # avg_demand chỉ dùng cho sản phẩm không có nhu cầu trong khoảng thời gian đã lọc
+    summary = InventoryModel(df, catalog).plan(
+        holding_cost, ordering_cost, lead_time, default_demand=avg_demand,
+        stochastic=stochastic, service_level=service_level, lead_time_std=lead_time_std, n_draws=5000
+    )
 
-    # EOQ Model for optimal stock (Deterministic)
-    if avg_demand > 0 and holding_cost > 0:
-        eoq = np.sqrt((2 * avg_demand * ordering_cost) / holding_cost)
-    else:
-        eoq = 100
+    summary['Current_Stock'] = np.random.randint(20, 200, size=len(summary))
 
-    summary['Optimal_Stock'] = int(eoq)
+    # Mức tồn kho tối ưu theo mô hình EOQ (Deterministic), cộng tồn kho an toàn ở chế độ ngẫu nhiên
+    summary['Optimal_Stock'] = summary['EOQ'] + summary['Safety_Stock'] if stochastic else summary['EOQ']
     summary['Gap'] = summary['Optimal_Stock'] - summary['Current_Stock']
     summary['Lead_Time'] = lead_time
     summary['Ordering_Cost'] = ordering_cost
     summary['Holding_Cost'] = holding_cost
 
-    return summary
+    if simulate_policy:
+        # Mô phỏng lại nhu cầu theo ngày dưới các chính sách (s, S) / (R, Q), song song theo khối sản phẩm
+        policies = InventoryModel(df, catalog).optimize_policies(holding_cost, ordering_cost, lead_time, stockout_cost,
+                                                                 n_jobs=os.cpu_count() or 1)
+        summary = summary.merge(policies.drop(columns='Description'), on='StockCode', how='left')
+
+    # Ưu tiên theo nhóm (A trước C, X trước Z), sau đó theo độ lớn chênh lệch tồn kho
+    summary = summary.merge(classes[['StockCode', 'ABC', 'XYZ', 'Class']], on='StockCode', how='left')
+    summary = summary.assign(_abs_gap=summary['Gap'].abs()).sort_values(['ABC', 'XYZ', '_abs_gap'], ascending=[True, True, False])
+    return summary.drop(columns='_abs_gap').reset_index(drop=True)
 
 def render_warehouse_analysis(df):
     st.title("📦 Tối ưu tồn kho & Phân tích kho hàng")
 
-    df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'], errors='coerce')
-    df['Month'] = df['InvoiceDate'].dt.month
-    df['Quarter'] = df['InvoiceDate'].dt.quarter
-    df['Year'] = df['InvoiceDate'].dt.year
+    df = add_calendar_columns(df)
 
     unique_months = sorted(df['Month'].dropna().unique())
     unique_quarters = sorted(df['Quarter'].dropna().unique())
     unique_years = sorted(df['Year'].dropna().unique())
-    unique_products = df[['StockCode', 'Description']].drop_duplicates().sort_values(by='StockCode')
+    dataset_key = data_version(df)
+    catalog = product_catalog(df, dataset_key)
 
     with st.expander("📉 Dữ liệu phân tích:", expanded=True):
         st.header("📦 Tối ưu tồn kho & Phân tích kho hàng")
         with st.container():
             st.subheader("⚙️ Cấu hình phân tích")
-            selected_product = st.selectbox("Chọn tên sản phẩm", unique_products['Description'].unique())
+            labels = catalog['Label'].to_numpy()
+            selected_product = st.selectbox("Chọn tên sản phẩm", [None] + catalog.index.tolist(),
+                                            format_func=lambda i: "Tất cả sản phẩm" if i is None else labels[i])
+            col_abc, col_xyz = st.columns(2)
+            abc_filter = col_abc.multiselect("Nhóm ABC (doanh thu)", ["A", "B", "C"], default=["A", "B", "C"])
+            xyz_filter = col_xyz.multiselect("Nhóm XYZ (độ biến động nhu cầu)", ["X", "Y", "Z"], default=["X", "Y", "Z"])
             time_filter = st.radio("Chọn khoảng thời gian phân tích", ["Tháng", "Quý", "Năm"], horizontal=True)
 
             if time_filter == "Tháng":
@@ -76,31 +132,64 @@ def render_warehouse_analysis(df):
                 time_value = st.selectbox("Chọn năm", unique_years)
 
             st.subheader("🔢 Thông số cho mô hình Deterministic")
-            avg_demand = st.number_input("📦 Nhu cầu trung bình (đơn vị/tháng)", min_value=1, value=100)
+            avg_demand = st.number_input("📦 Nhu cầu mặc định khi sản phẩm không có lịch sử (đơn vị/tháng)", min_value=1, value=100)
             holding_cost = st.number_input("💰 Chi phí lưu kho / đơn vị / tháng", min_value=1.0, value=5.0)
             ordering_cost = st.number_input("🛒 Chi phí đặt hàng / lần", min_value=1.0, value=100.0)
             lead_time = st.number_input("⏱️ Thời gian giao hàng (ngày)", min_value=1, value=7)
 
+            simulate_policy = st.checkbox("Mô phỏng chính sách (s, S) / (R, Q) trên nhu cầu lịch sử theo ngày", value=False)
+            stockout_cost = 0.0
+            if simulate_policy:
+                stockout_cost = st.number_input("⚠️ Chi phí thiếu hàng / đơn vị", min_value=0.0, value=10.0)
+
+            st.subheader("🎲 Biến động nhu cầu & thời gian giao hàng")
+            stochastic = st.checkbox("Tính tồn kho an toàn bằng mô phỏng Monte Carlo", value=False)
+            service_level = 0.95
+            lead_time_std = 0.0
+            if stochastic:
+                service_level = st.slider("🎯 Mức phục vụ mục tiêu (%)", 80.0, 99.9, 95.0, step=0.5) / 100
+                lead_time_std = st.number_input("⏱️ Độ lệch chuẩn thời gian giao hàng (ngày)", min_value=0.0, value=2.0)
+
+            # Biểu đồ cột chỉ vẽ top N sản phẩm ưu tiên nhất (theo nhóm ABC/XYZ rồi chênh lệch);
+            # biểu đồ nhiệt và gợi ý được tổng hợp trên toàn danh mục
+            top_n = st.slider("📊 Số sản phẩm ưu tiên hiển thị trên biểu đồ", 10, 100, 30, step=10)
+
             run_analysis = st.button("🚀 Phân tích tồn kho")
 
-    if not run_analysis:
+    config = (time_filter, time_value, selected_product, avg_demand, holding_cost, ordering_cost, lead_time,
+              stochastic, service_level, lead_time_std, tuple(abc_filter), tuple(xyz_filter), simulate_policy, stockout_cost)
+    if run_analysis:
+        top_df = inventory_optimize(df, time_filter, time_value, selected_product, avg_demand, holding_cost, ordering_cost, lead_time,
+                                    stochastic=stochastic, service_level=service_level, lead_time_std=lead_time_std,
+                                    abc_filter=abc_filter, xyz_filter=xyz_filter,
+                                    simulate_policy=simulate_policy, stockout_cost=stockout_cost,
+                                    dataset_key=dataset_key)
+        # Lưu kết quả cùng cấu hình để việc chuyển trang danh sách không phải tính lại
+        st.session_state.warehouse_result = {"config": config, "top_df": top_df}
+    elif st.session_state.get("warehouse_result", {}).get("config") == config:
+        top_df = st.session_state.warehouse_result["top_df"]
+    else:
         st.info("👉 Vui lòng cấu hình và nhấn 'Phân tích tồn kho' để xem kết quả.")
         return
 
-    top_df = inventory_optimize(df, time_filter, time_value, selected_product, avg_demand, holding_cost, ordering_cost, lead_time)
-
     if top_df.empty:
         st.warning("Không có dữ liệu phù hợp với bộ lọc được chọn.")
         return
 
-    tab1, tab2 = st.tabs(["📊 Kết quả DSS", "🛠️ Hành động & Gợi ý"])
+    chart_df = top_df.head(top_n)
+
+    tab_names = ["📊 Kết quả DSS", "🛠️ Hành động & Gợi ý"]
+    if 'Policy' in top_df.columns:
+        tab_names.append("🔁 Chính sách tồn kho")
+    tabs = st.tabs(tab_names)
+    tab1, tab2 = tabs[0], tabs[1]
 
     with tab1:
         st.subheader("📈 So sánh Tồn kho hiện tại và Khuyến nghị")
         col1, col2 = st.columns(2)
 
         with col1:
-            base = alt.Chart(top_df).encode(y=alt.Y('Description:N', sort='-x'))
+            base = alt.Chart(chart_df).encode(y=alt.Y('Description:N', sort='-x'))
 
             bar_current = base.mark_bar(color='#ff7f0e').encode(
                 x='Current_Stock:Q',
@@ -115,42 +204,91 @@ def render_warehouse_analysis(df):
         with col2:
             fig, ax = plt.subplots(figsize=(6, 3))
             sns.heatmap(
-                top_df[['Gap']].T,
+                gap_heatmap_table(top_df),
                 annot=True,
-                fmt=".0f",
+                fmt="d",
                 cmap="coolwarm",
                 cbar=True,
-                xticklabels=top_df['Description'],
-                yticklabels=["Gap tồn kho"],
                 ax=ax
             )
-            ax.set_title("🔥 Chênh lệch tồn kho theo sản phẩm")
+            ax.set_xlabel("Chênh lệch tồn kho (đơn vị)")
+            ax.set_ylabel("Nhóm ABC")
+            ax.set_title(f"🔥 Số sản phẩm theo chênh lệch tồn kho ({len(top_df)} sản phẩm)")
             st.pyplot(fig)
+            plt.close(fig)
 
         st.markdown("""
         - **Thanh cam**: lượng tồn kho thực tế  
         - **Thanh xanh**: mức tồn kho tối ưu theo mô hình EOQ  
-        - **Biểu đồ nhiệt**: thể hiện chênh lệch tồn kho, đỏ là thiếu – xanh là dư
+        - **Biểu đồ nhiệt**: số sản phẩm theo khoảng chênh lệch tồn kho, bên phải là thiếu – bên trái là dư
         """)
 
+        st.subheader("🏷️ Phân loại ABC/XYZ")
+        class_counts = pd.crosstab(top_df['ABC'], top_df['XYZ']).reindex(index=list("ABC"), columns=list("XYZ"), fill_value=0)
+        st.dataframe(class_counts, use_container_width=True)
+        st.caption("A/B/C: nhóm sản phẩm chiếm 80% / 15% / 5% doanh thu. X/Y/Z: hệ số biến thiên nhu cầu theo tháng ≤ 0.5 / ≤ 1 / > 1.")
+
         st.subheader("🧾 Bảng phân tích chi tiết")
-        st.dataframe(top_df[['StockCode', 'Description', 'Current_Stock', 'Optimal_Stock', 'Gap', 'Lead_Time', 'Ordering_Cost', 'Holding_Cost']], use_container_width=True)
+        detail_columns = ['StockCode', 'Description', 'Class', 'Monthly_Demand', 'Current_Stock', 'Optimal_Stock', 'Reorder_Point', 'Cycle_Stock']
+        if 'Safety_Stock' in top_df.columns:
+            detail_columns += ['Daily_Std', 'Safety_Stock']
+            st.caption(f"Tồn kho an toàn và điểm đặt hàng lại được ước lượng từ 5.000 lượt mô phỏng nhu cầu trong thời gian giao hàng cho mức phục vụ {service_level:.1%}.")
+        detail_columns += ['Gap', 'Lead_Time', 'Ordering_Cost', 'Holding_Cost']
+        paginate(top_df[detail_columns], key="warehouse_detail_page")
 
     with tab2:
         st.subheader("🔧 Gợi ý cải thiện tồn kho")
-        for _, row in top_df.iterrows():
-            product = row['Description']
-            gap = row['Gap']
-            lead = row['Lead_Time']
-            order_cost = row['Ordering_Cost']
-            hold_cost = row['Holding_Cost']
-
-            if gap > 10:
-                st.warning(f"🚛 **{product}** đang thiếu hàng **({gap} đơn vị)**.\n\n➡️ Hành động: \n- Tăng tần suất đặt hàng\n- Tăng định mức tồn kho\n- Xem xét nhà cung ứng giao hàng nhanh hơn\n➡️ Gợi ý: \n- Thiết lập cảnh báo khi tồn kho dưới ngưỡng\n- Rút ngắn thời gian giao hàng (hiện tại: {lead} ngày)\n- Tích hợp mô hình Reorder Point\n- Tạo lịch nhập hàng định kỳ hoặc tự động hóa chuỗi cung ứng")
-            elif gap < -10:
-                st.info(f"📦 **{product}** đang tồn kho dư **({-gap} đơn vị)**.\n\n➡️ Hành động: \n- Giảm lượng đặt hàng\n- Kéo giãn chu kỳ nhập hàng\n➡️ Gợi ý: \n- Thực hiện khuyến mãi đẩy hàng\n- Phân loại ABC để ưu tiên\n- Đàm phán giảm chi phí lưu kho (hiện tại: {hold_cost}/đơn vị/tháng)\n- Chuyển hàng sang kho luân chuyển nhanh hoặc giảm giá")
-            else:
-                st.success(f"✅ **{product}** đang có tồn kho hợp lý.\n\n➡️ Hành động: \n- Duy trì kế hoạch nhập hàng\n➡️ Gợi ý: \n- Theo dõi xu hướng bán hàng để điều chỉnh\n- Xây dựng dashboard cảnh báo tự động\n- Xem xét biến động mùa vụ và tăng trưởng để dự báo nâng cao")
+        # Thông điệp được sinh cho cả danh mục bằng phép toán vector; mỗi nhóm hành động chỉ
+        # hiển thị hướng dẫn một lần, kèm danh sách sản phẩm phân trang
+        lead = top_df['Lead_Time'].iloc[0]
+        hold_cost = top_df['Holding_Cost'].iloc[0]
+        guidance = {
+            "Thiếu hàng": (st.warning, f"🚛 **Thiếu hàng**\n\n➡️ Hành động: \n- Tăng tần suất đặt hàng\n- Tăng định mức tồn kho\n- Xem xét nhà cung ứng giao hàng nhanh hơn\n➡️ Gợi ý: \n- Thiết lập cảnh báo khi tồn kho dưới ngưỡng\n- Rút ngắn thời gian giao hàng (hiện tại: {lead} ngày)\n- Tích hợp mô hình Reorder Point\n- Tạo lịch nhập hàng định kỳ hoặc tự động hóa chuỗi cung ứng"),
+            "Dư tồn kho": (st.info, f"📦 **Dư tồn kho**\n\n➡️ Hành động: \n- Giảm lượng đặt hàng\n- Kéo giãn chu kỳ nhập hàng\n➡️ Gợi ý: \n- Thực hiện khuyến mãi đẩy hàng\n- Ưu tiên theo nhóm ABC\n- Đàm phán giảm chi phí lưu kho (hiện tại: {hold_cost}/đơn vị/tháng)\n- Chuyển hàng sang kho luân chuyển nhanh hoặc giảm giá"),
+            "Hợp lý": (st.success, "✅ **Tồn kho hợp lý**\n\n➡️ Hành động: \n- Duy trì kế hoạch nhập hàng\n➡️ Gợi ý: \n- Theo dõi xu hướng bán hàng để điều chỉnh\n- Xây dựng dashboard cảnh báo tự động\n- Xem xét biến động mùa vụ và tăng trưởng để dự báo nâng cao"),
+        }
+
+        actions = gap_actions(top_df['Gap'])
+        gap_text = top_df['Gap'].abs().astype(str)
+        messages = np.select(
+            [actions == "Thiếu hàng", actions == "Dư tồn kho"],
+            ["Thiếu " + gap_text + " đơn vị", "Dư " + gap_text + " đơn vị"],
+            "Trong ngưỡng ±10 đơn vị"
+        )
+        suggestions = pd.DataFrame({
+            'Sản phẩm': top_df['Description'],
+            'Nhóm': top_df['Class'],
+            'Chênh lệch': top_df['Gap'],
+            'Nhận định': messages,
+            'Hành động': actions,
+        })
+
+        counts = suggestions['Hành động'].value_counts().reindex(ACTIONS, fill_value=0)
+        action_tabs = st.tabs([f"{action} ({counts[action]})" for action in ACTIONS])
+        for action, action_tab in zip(ACTIONS, action_tabs):
+            with action_tab:
+                render, text = guidance[action]
+                render(text)
+                group = suggestions[suggestions['Hành động'] == action].drop(columns='Hành động')
+                if group.empty:
+                    st.write("Không có sản phẩm nào.")
+                else:
+                    paginate(group, key=f"warehouse_suggestion_page_{action}")
+
+    if 'Policy' in top_df.columns:
+        with tabs[2]:
+            st.subheader("🔁 Chính sách tồn kho có chi phí thấp nhất")
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Tổng chi phí (chính sách tốt nhất)", f"{top_df['Total_Cost'].sum():,.0f}")
+            col2.metric("Tổng chi phí (chính sách EOQ)", f"{top_df['EOQ_Policy_Cost'].sum():,.0f}")
+            col3.metric("Tiết kiệm", f"{top_df['Saving'].sum():,.0f}")
+            st.caption("Mỗi sản phẩm được mô phỏng lại theo nhu cầu từng ngày trong khoảng thời gian đã chọn, với hàng thiếu bị mất. "
+                       "Chi phí = lưu kho + đặt hàng + thiếu hàng; chính sách EOQ đặt EOQ đơn vị khi tồn kho xuống dưới nhu cầu trong thời gian giao hàng.")
+            paginate(
+                top_df[['StockCode', 'Description', 'Class', 'Policy', 'Reorder_Level', 'Order_Up_To', 'Order_Qty',
+                        'Holding_Cost_Total', 'Ordering_Cost_Total', 'Stockout_Cost_Total', 'Total_Cost', 'Fill_Rate', 'Saving']],
+                key="warehouse_policy_page"
+            )
 
     st.markdown("---")
     st.caption("Dữ liệu phân tích dựa trên tồn kho mô phỏng và doanh thu thực tế theo thời gian. Có thể tích hợp thuật toán nâng cao để tối ưu chi tiết hơn.")